@@ -0,0 +1,93 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from . import metrics
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after `ttl_s` seconds."""
+
+    def __init__(self, ttl_s: float, max_entries: int, name: str = "cache"):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.name = name
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (stored_at, value)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and time.time() - item[0] > self.ttl_s:
+                del self._items[key]
+                item = None
+            if item is None:
+                metrics.inc(f"{self.name}.miss")
+                return None
+            self._items.move_to_end(key)
+        metrics.inc(f"{self.name}.hit")
+        return item[1]
+
+    def age(self, key: Hashable) -> Optional[float]:
+        """Seconds since `key` was stored; None if missing or expired. No LRU bump, no metrics."""
+        with self._lock:
+            item = self._items.get(key)
+        if item is None:
+            return None
+        age = time.time() - item[0]
+        return age if age <= self.ttl_s else None
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._items[key] = (time.time(), value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+            size = len(self._items)
+        metrics.set_gauge(f"{self.name}.entries", size)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._items)
+
+
+_RESULTS: Optional[TTLCache] = None
+
+
+def get_result_cache() -> Optional[TTLCache]:
+    """Final-summary cache (RESULT_CACHE_TTL_S, default 3600; 0 disables)."""
+    global _RESULTS
+    try:
+        ttl = float(os.getenv("RESULT_CACHE_TTL_S", "3600"))
+    except ValueError:
+        ttl = 3600.0
+    if ttl <= 0:
+        return None
+    if _RESULTS is None:
+        _RESULTS = TTLCache(ttl, int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "1000")), name="result_cache")
+    _RESULTS.ttl_s = ttl
+    return _RESULTS
+
+
+_PARTIALS: Optional[TTLCache] = None
+
+
+def get_partial_cache() -> Optional[TTLCache]:
+    """Map-reduce partial summaries by partition content hash (MAPREDUCE_CACHE_TTL_S, default 86400; 0 disables)."""
+    global _PARTIALS
+    try:
+        ttl = float(os.getenv("MAPREDUCE_CACHE_TTL_S", "86400"))
+    except ValueError:
+        ttl = 86400.0
+    if ttl <= 0:
+        return None
+    if _PARTIALS is None:
+        _PARTIALS = TTLCache(ttl, int(os.getenv("MAPREDUCE_CACHE_MAX_ENTRIES", "5000")), name="partial_cache")
+    _PARTIALS.ttl_s = ttl
+    return _PARTIALS
@@ -0,0 +1,33 @@
+import asyncio
+import weakref
+from typing import Dict
+
+import httpx
+
+# Shared, pooled HTTP clients (one per upstream), so requests reuse DNS/TLS/keep-alive
+# connections instead of opening a new client per call. A client's connections belong to
+# the event loop that opened them, so clients are kept per loop: another loop gets its own
+# set and never replaces (and leaks) one still in use. A loop's set goes away with the loop.
+
+_CLIENTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, httpx.AsyncClient]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+_LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=60.0)
+
+
+def get_client(name: str) -> httpx.AsyncClient:
+    """Pooled AsyncClient for an upstream ("github", "llm", "embeddings", ...) on the running loop."""
+    clients = _CLIENTS.setdefault(asyncio.get_running_loop(), {})
+    client = clients.get(name)
+    if client is None or client.is_closed:
+        client = clients[name] = httpx.AsyncClient(limits=_LIMITS)
+    return client
+
+
+async def aclose_clients() -> None:
+    """Close the running loop's clients."""
+    clients = _CLIENTS.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        if not client.is_closed:
+            await client.aclose()
@@ -0,0 +1,100 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Mapping, Optional
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline:
+    """Wall-clock budget of one request (monotonic)."""
+
+    def __init__(self, budget_s: float):
+        self.budget_s = budget_s
+        self.expires_at = time.monotonic() + budget_s
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+# The deadline of the request being served. Tasks and to_thread() calls inherit it, so
+# every outbound call below a deadline_scope() can size its timeout without plumbing.
+_DEADLINE: ContextVar[Optional[Deadline]] = ContextVar("request_deadline", default=None)
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def request_budget(headers: Mapping[str, str]) -> Optional[float]:
+    """Seconds a request may take: REQUEST_DEADLINE_S (default 170, 0 disables).
+
+    A client may ask for less with `X-Request-Deadline: <seconds>` (never more).
+    """
+    return _budget(headers, _env_float("REQUEST_DEADLINE_S", 170.0))
+
+
+def job_budget(headers: Mapping[str, str]) -> Optional[float]:
+    """Seconds a background job may take: JOB_DEADLINE_S (default 900, 0 disables).
+
+    Jobs are polled, not held open, so they don't share the interactive budget;
+    `X-Request-Deadline` can still shorten it.
+    """
+    return _budget(headers, _env_float("JOB_DEADLINE_S", 900.0))
+
+
+def _budget(headers: Mapping[str, str], budget: float) -> Optional[float]:
+    raw = headers.get("x-request-deadline", "").strip()
+    if raw:
+        try:
+            asked = float(raw)
+        except ValueError:
+            asked = 0.0
+        if asked > 0:
+            budget = min(budget, asked) if budget > 0 else asked
+    return budget if budget > 0 else None
+
+
+@contextmanager
+def deadline_scope(budget_s: Optional[float]) -> Iterator[Optional[Deadline]]:
+    deadline = Deadline(budget_s) if budget_s else None
+    token = _DEADLINE.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _DEADLINE.reset(token)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _DEADLINE.get()
+
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current request; None outside a deadline."""
+    deadline = _DEADLINE.get()
+    return None if deadline is None else deadline.remaining()
+
+
+def timeout_for(cap: float) -> float:
+    """Timeout for one outbound call: `cap`, cut to what is left of the request's budget."""
+    left = remaining()
+    if left is None:
+        return cap
+    if left <= 0:
+        raise DeadlineExceeded("Request deadline exceeded.")
+    return min(cap, left)
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
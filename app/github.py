@@ -1,10 +1,18 @@
-import io, re, zipfile, tempfile, httpx
+import io, os, re, time, asyncio, logging, threading, zipfile, tempfile, httpx
 from dataclasses import dataclass
-from pathlib import Path
-from typing import Optional, Tuple
+from pathlib import Path, PurePosixPath
+from urllib.parse import quote, unquote
+from typing import Any, Dict, List, Optional, Tuple
+
+from .clients import get_client
+from .deadline import remaining, timeout_for
+from . import metrics
+
+logger = logging.getLogger(__name__)
 
 GITHUB_REPO_RE = re.compile(
-    r"^https?://github\.com/(?P<owner>[^/]+)/(?P<repo>[^/#?]+)(?:/|$)"
+    r"^https?://github\.com/(?P<owner>[^/]+)/(?P<repo>[^/#?]+)"
+    r"(?:/(?P<kind>tree|blob)/(?P<ref>[^/#?]+)(?:/(?P<path>[^#?]*))?)?(?:[/#?]|$)"
 )
 
 
@@ -32,44 +40,295 @@ class GitHubBadUrl(GitHubError):
 class RepoRef:
     owner: str
     repo: str
+    ref: Optional[str] = None  # branch, tag or commit; None = default branch
+    subpath: str = ""          # directory inside the repo, posix, no leading/trailing "/"
+
+    @property
+    def slug(self) -> str:
+        """owner/repo[@ref][:subpath], for logs, profile labels and job keys."""
+        out = f"{self.owner}/{self.repo}"
+        if self.ref:
+            out += f"@{self.ref}"
+        if self.subpath:
+            out += f":{self.subpath}"
+        return out
 
 
 def parse_github_repo_url(url: str) -> RepoRef:
+    """Parse `https://github.com/<owner>/<repo>[/tree/<ref>[/<path>]]`.
+
+    The first segment after /tree/ is taken as the ref, so branch names containing
+    "/" can't be addressed this way (use the commit sha or a tag instead). A file link
+    (`/blob/<ref>/<path>`) addresses the directory holding that file.
+    """
     m = GITHUB_REPO_RE.match(url.strip())
     if not m:
-        raise GitHubBadUrl("github_url must look like https://github.com/<owner>/<repo>")
+        raise GitHubBadUrl(
+            "github_url must look like https://github.com/<owner>/<repo> or "
+            "https://github.com/<owner>/<repo>/tree/<ref>/<path>"
+        )
     owner = m.group("owner")
     repo = m.group("repo")
     # strip .git if provided
     if repo.endswith(".git"):
         repo = repo[:-4]
-    return RepoRef(owner=owner, repo=repo)
+    ref = unquote(m.group("ref")) if m.group("ref") else None
+    parts = [unquote(p) for p in (m.group("path") or "").split("/") if p]
+    if any(p in (".", "..") for p in parts):
+        raise GitHubBadUrl("github_url path must not contain '.' or '..' segments.")
+    if m.group("kind") == "blob":
+        parts = parts[:-1]
+    return RepoRef(owner=owner, repo=repo, ref=ref, subpath="/".join(parts))
 
 
-async def _github_api_get(client: httpx.AsyncClient, url: str) -> httpx.Response:
-    # No auth required for public repos; rate-limited by GitHub.
-    headers = {
-        "Accept": "application/vnd.github+json",
-        "User-Agent": "repo-summarizer-api",
-    }
-    return await client.get(url, headers=headers, follow_redirects=True, timeout=30.0)
+# --- Token pool and rate-limit tracking ---
 
+ANON_LIMIT = 60      # unauthenticated core quota per hour (per IP)
+TOKEN_LIMIT = 5000   # authenticated core quota per hour (per token)
 
-async def assert_repo_accessible(ref: RepoRef) -> dict:
-    api_url = f"https://api.github.com/repos/{ref.owner}/{ref.repo}"
-    async with httpx.AsyncClient() as client:
-        r = await _github_api_get(client, api_url)
 
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+@dataclass
+class TokenState:
+    """Core-API quota of one credential, as last reported by GitHub's X-RateLimit-* headers."""
+    token: Optional[str]          # None = unauthenticated
+    limit: int
+    remaining: Optional[int] = None  # None until the first response
+    reset: float = 0.0            # epoch seconds when the window resets
+    in_flight: int = 0            # calls sent but not yet reflected in `remaining`
+    next_slot: float = 0.0        # monotonic time of the next paced call (throttling)
+    disabled: bool = False        # token rejected with 401
+
+    @property
+    def label(self) -> str:
+        return f"token:...{self.token[-4:]}" if self.token else "anonymous"
+
+    def headroom(self, now: float) -> int:
+        if self.disabled:
+            return 0
+        if self.remaining is None or (self.reset and now >= self.reset):
+            return self.limit - self.in_flight  # unknown or new window: assume a full quota
+        return self.remaining - self.in_flight
+
+    def snapshot(self, now: float) -> Dict[str, Any]:
+        return {
+            "token": self.label,
+            "limit": self.limit,
+            "remaining": self.remaining,
+            "reset_in_s": max(0, round(self.reset - now)) if self.reset else None,
+            "in_flight": self.in_flight,
+            "disabled": self.disabled,
+        }
+
+
+class TokenPool:
+    """Routes GitHub calls across optional tokens by remaining quota.
+
+    - every call goes out with the credential that has the most headroom
+    - once that headroom drops below GITHUB_THROTTLE_BELOW (fraction of the limit), calls
+      are paced so the rest of the quota lasts until the window resets, instead of
+      burning it and then failing every request until the reset
+    - a call that would have to wait longer than GITHUB_THROTTLE_MAX_WAIT_S fails fast
+      with GitHubRateLimited
+    """
+
+    def __init__(self, tokens: List[str]):
+        self._lock = threading.Lock()
+        if tokens:
+            self.states = [TokenState(token=t, limit=TOKEN_LIMIT) for t in tokens]
+        else:
+            self.states = [TokenState(token=None, limit=ANON_LIMIT)]
+
+    def _pick(self) -> Tuple[TokenState, float]:
+        """Reserve the best credential; returns it and how long to wait before using it."""
+        throttle_below = _env_float("GITHUB_THROTTLE_BELOW", 0.1)
+        max_wait = _env_float("GITHUB_THROTTLE_MAX_WAIT_S", 20.0)
+        left = remaining()
+        if left is not None:
+            max_wait = min(max_wait, left)  # no point queueing past the request's deadline
+        with self._lock:
+            now = time.time()
+            usable = [st for st in self.states if not st.disabled]
+            if not usable:
+                raise GitHubRateLimited("All configured GitHub tokens were rejected (401).")
+            best = max(usable, key=lambda st: st.headroom(now))
+            headroom = best.headroom(now)
+
+            wait = 0.0
+            if headroom <= 0:
+                # exhausted everywhere: queue until the earliest reset
+                wait = min(st.reset for st in usable) - now
+            elif headroom < best.limit * throttle_below and best.reset > now:
+                # spread what is left evenly over the rest of the window (calls already
+                # queued hold earlier slots, so the interval uses the quota before them)
+                interval = (best.reset - now) / (headroom + best.in_flight)
+                mono = time.monotonic()
+                slot = max(mono, best.next_slot)
+                best.next_slot = slot + interval
+                wait = slot - mono
+
+            if wait > max_wait:
+                metrics.inc("github.rate_limited")
+                raise GitHubRateLimited(
+                    f"GitHub API quota exhausted; resets in {int(wait)}s. Try again later."
+                )
+            best.in_flight += 1
+            return best, max(0.0, wait)
+
+    def _update(self, st: TokenState, r: Optional[httpx.Response]) -> None:
+        with self._lock:
+            st.in_flight = max(0, st.in_flight - 1)
+            if r is None:
+                return
+            if r.status_code == 401 and st.token:
+                st.disabled = True
+                logger.warning("GitHub rejected %s (401); removed from the pool", st.label)
+                return
+            h = r.headers
+            retry_after = h.get("Retry-After", "")
+            if r.status_code in (403, 429) and retry_after.isdigit():
+                # secondary rate limit: treat the credential as empty until then
+                st.remaining = 0
+                st.reset = max(st.reset, time.time() + int(retry_after))
+            # zipball redirects end on codeload.github.com, which sends no quota headers
+            elif h.get("X-RateLimit-Resource", "core") == "core" and "X-RateLimit-Remaining" in h:
+                try:
+                    st.remaining = int(h["X-RateLimit-Remaining"])
+                    st.limit = int(h.get("X-RateLimit-Limit", st.limit))
+                    st.reset = float(h.get("X-RateLimit-Reset", st.reset))
+                except ValueError:
+                    pass
+        self.publish()
+
+    def publish(self) -> None:
+        metrics.set_gauge("github.quota", self.snapshot())
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            return [st.snapshot(now) for st in self.states]
+
+    async def get(
+        self,
+        url: str,
+        accept: str = "application/vnd.github+json",
+        timeout: float = 30.0,
+        extra_headers: Optional[Dict[str, str]] = None,
+    ) -> httpx.Response:
+        """GET through the pool; a rate-limited or rejected credential is retried on the next one."""
+        r: Optional[httpx.Response] = None
+        for _ in range(len(self.states)):
+            st, wait = self._pick()
+            if wait > 0:
+                metrics.inc("github.throttled")
+                metrics.inc("github.throttle_wait_s", wait)
+                try:
+                    await asyncio.sleep(wait)
+                except BaseException:
+                    self._update(st, None)
+                    raise
+            headers = {"Accept": accept, "User-Agent": "repo-summarizer-api", **(extra_headers or {})}
+            if st.token:
+                headers["Authorization"] = f"Bearer {st.token}"
+            r = None
+            try:
+                r = await get_client("github").get(
+                    url, headers=headers, follow_redirects=True, timeout=timeout_for(timeout)
+                )
+            finally:
+                self._update(st, r)
+            if not (_is_rate_limited(r) or (r.status_code == 401 and st.token)):
+                return r
+        return r
+
+    async def refresh(self) -> None:
+        """Read the current quota of every credential (GET /rate_limit does not count against it)."""
+        for st in self.states:
+            headers = {"User-Agent": "repo-summarizer-api"}
+            if st.token:
+                headers["Authorization"] = f"Bearer {st.token}"
+            with self._lock:
+                st.in_flight += 1
+            r = None
+            try:
+                r = await get_client("github").get("https://api.github.com/rate_limit", headers=headers, timeout=10.0)
+            finally:
+                self._update(st, r)
+
+
+def _is_rate_limited(r: httpx.Response) -> bool:
+    return r.status_code in (403, 429) and (
+        r.headers.get("X-RateLimit-Remaining") == "0" or "Retry-After" in r.headers
+    )
+
+
+def _configured_tokens() -> List[str]:
+    raw = os.getenv("GITHUB_TOKENS", "") + "," + os.getenv("GITHUB_TOKEN", "")
+    out: List[str] = []
+    for t in raw.split(","):
+        t = t.strip()
+        if t and t not in out:
+            out.append(t)
+    return out
+
+
+_POOL: Optional[TokenPool] = None
+_POOL_TOKENS: Optional[List[str]] = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_token_pool() -> TokenPool:
+    """Process-wide pool from GITHUB_TOKENS (comma-separated) and/or GITHUB_TOKEN; anonymous without either."""
+    global _POOL, _POOL_TOKENS
+    tokens = _configured_tokens()
+    with _POOL_LOCK:
+        if _POOL is None or _POOL_TOKENS != tokens:
+            _POOL, _POOL_TOKENS = TokenPool(tokens), tokens
+        return _POOL
+
+
+def github_authenticated() -> bool:
+    """True when at least one GitHub token is configured (anonymous quota is 60 calls/hour)."""
+    return bool(_configured_tokens())
+
+
+def github_quota() -> List[Dict[str, Any]]:
+    return get_token_pool().snapshot()
+
+
+async def _github_api_get(
+    url: str,
+    accept: str = "application/vnd.github+json",
+    timeout: float = 30.0,
+    extra_headers: Optional[Dict[str, str]] = None,
+) -> httpx.Response:
+    return await get_token_pool().get(url, accept=accept, timeout=timeout, extra_headers=extra_headers)
+
+
+def _raise_for_status(r: httpx.Response, what: str) -> None:
     if r.status_code == 404:
         raise GitHubNotFound("Repository not found (404).")
+    if r.status_code == 429:
+        raise GitHubRateLimited("GitHub API rate limit exceeded. Try again later.")
     if r.status_code in (401, 403):
         # Could be private or rate-limit. Check headers.
-        remaining = r.headers.get("X-RateLimit-Remaining")
-        if remaining == "0":
+        if _is_rate_limited(r):
             raise GitHubRateLimited("GitHub API rate limit exceeded. Try again later.")
         raise GitHubPrivateOrForbidden("Repository is private or access is forbidden (403).")
     if r.status_code >= 400:
-        raise GitHubError(f"GitHub API error ({r.status_code}).")
+        raise GitHubError(f"{what} ({r.status_code}).")
+
+
+async def assert_repo_accessible(ref: RepoRef) -> dict:
+    api_url = f"https://api.github.com/repos/{ref.owner}/{ref.repo}"
+    r = await _github_api_get(api_url)
+    _raise_for_status(r, "GitHub API error")
 
     data = r.json()
     # If GitHub marks it private, treat as forbidden for this task.
@@ -78,42 +337,90 @@ async def assert_repo_accessible(ref: RepoRef) -> dict:
     return data
 
 
-async def download_repo_zip(ref: RepoRef) -> bytes:
-    # zipball works for default branch
+async def download_repo_zip(ref: RepoRef, commit: Optional[str] = None) -> bytes:
+    """Zipball of `commit` if given, else of `ref.ref`, else of the default branch."""
     url = f"https://api.github.com/repos/{ref.owner}/{ref.repo}/zipball"
-    async with httpx.AsyncClient() as client:
-        r = await client.get(
-            url,
-            headers={"Accept": "application/vnd.github+json", "User-Agent": "repo-summarizer-api"},
-            follow_redirects=True,
-            timeout=60.0,
-        )
-
-    if r.status_code == 404:
-        raise GitHubNotFound("Repository not found (404).")
-    if r.status_code in (401, 403):
-        remaining = r.headers.get("X-RateLimit-Remaining")
-        if remaining == "0":
-            raise GitHubRateLimited("GitHub API rate limit exceeded. Try again later.")
-        raise GitHubPrivateOrForbidden("Repository is private or access is forbidden (403).")
-    if r.status_code >= 400:
-        raise GitHubError(f"GitHub ZIP download failed ({r.status_code}).")
+    at = commit or ref.ref
+    if at:
+        url += "/" + quote(at, safe="")
+    r = await _github_api_get(url, timeout=60.0)
 
+    _raise_for_status(r, "GitHub ZIP download failed")
     return r.content
 
 
-def extract_zip_to_tempdir(zip_bytes: bytes) -> Tuple[tempfile.TemporaryDirectory, Path]:
-    tmp = tempfile.TemporaryDirectory(prefix="repozip_")
-    root = Path(tmp.name)
+async def resolve_commit(ref: RepoRef, branch: str) -> str:
+    """SHA of the commit `branch` points to (one small API call, plain-text body)."""
+    url = f"https://api.github.com/repos/{ref.owner}/{ref.repo}/commits/{quote(branch, safe='')}"
+    r = await _github_api_get(url, accept="application/vnd.github.sha")
+    _raise_for_status(r, "GitHub commit lookup failed")
+    sha = r.text.strip()
+    if not re.fullmatch(r"[0-9a-f]{40}", sha):
+        raise GitHubError("GitHub returned an unexpected commit id.")
+    return sha
+
+
+async def head_commit(ref: RepoRef, branch: str, etag: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
+    """Conditional resolve_commit: (None, etag) when the branch hasn't moved since `etag`.
+
+    A 304 answer does not count against the GitHub API quota.
+    """
+    url = f"https://api.github.com/repos/{ref.owner}/{ref.repo}/commits/{quote(branch, safe='')}"
+    extra = {"If-None-Match": etag} if etag else None
+    r = await _github_api_get(url, accept="application/vnd.github.sha", extra_headers=extra)
+    if r.status_code == 304:
+        return None, etag
+    _raise_for_status(r, "GitHub commit lookup failed")
+    sha = r.text.strip()
+    if not re.fullmatch(r"[0-9a-f]{40}", sha):
+        raise GitHubError("GitHub returned an unexpected commit id.")
+    return sha, r.headers.get("ETag")
+
+
+def _scoped_members(zf: zipfile.ZipFile, subpath: str) -> List[zipfile.ZipInfo]:
+    """Entries of a zipball that lie under `subpath` (below its single top-level directory)."""
+    want = PurePosixPath(subpath).parts
+    out = []
+    for info in zf.infolist():
+        parts = PurePosixPath(info.filename).parts
+        if parts[1:1 + len(want)] == want:
+            out.append(info)
+    return out
 
+
+def extract_zip_to_dir(zip_bytes: bytes, dest: Path, subpath: str = "") -> Path:
+    """Extract a zipball into `dest` and return the repo root inside it.
+
+    With `subpath`, only the entries under that directory are written (the rest are
+    skipped without being decompressed) and the returned root is that directory.
+    """
     try:
         with zipfile.ZipFile(io.BytesIO(zip_bytes)) as zf:
-            zf.extractall(root)
+            if subpath:
+                members = _scoped_members(zf, subpath)
+                depth = 1 + len(PurePosixPath(subpath).parts)
+                files = [len(PurePosixPath(m.filename).parts) for m in members if not m.is_dir()]
+                if not any(n > depth for n in files):
+                    if depth in files:
+                        raise GitHubBadUrl(f"Path '{subpath}' is a file, not a directory.")
+                    raise GitHubNotFound(f"Path '{subpath}' not found in the repository.")
+                zf.extractall(dest, members=members)
+            else:
+                zf.extractall(dest)
     except zipfile.BadZipFile as e:
-        tmp.cleanup()
         raise GitHubError("Downloaded archive is not a valid ZIP.") from e
 
     # GitHub zipball contains a single top-level directory
-    children = [p for p in root.iterdir() if p.is_dir()]
-    repo_root = children[0] if children else root
-    return tmp, repo_root
\ No newline at end of file
+    children = [p for p in dest.iterdir() if p.is_dir()]
+    root = children[0] if children else dest
+    return root / subpath if subpath else root
+
+
+def extract_zip_to_tempdir(zip_bytes: bytes, subpath: str = "") -> Tuple[tempfile.TemporaryDirectory, Path]:
+    tmp = tempfile.TemporaryDirectory(prefix="repozip_")
+    try:
+        repo_root = extract_zip_to_dir(zip_bytes, Path(tmp.name), subpath)
+    except GitHubError:
+        tmp.cleanup()
+        raise
+    return tmp, repo_root
@@ -0,0 +1,97 @@
+import time
+import uuid
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Job:
+    """A background /summarize run the client polls via GET /jobs/{id}.
+
+    status: "queued" | "running" | "done" | "error"; `stage` is a human-readable progress step.
+    """
+    id: str
+    key: str
+    status: str = "queued"
+    stage: str = "queued"
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[Dict[str, Any]] = None
+    created: float = field(default_factory=time.time)
+    updated: float = field(default_factory=time.time)
+
+    def progress(self, stage: str) -> None:
+        self.stage = stage
+        self.updated = time.time()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "result": self.result,
+            "error": self.error,
+            "created": self.created,
+            "updated": self.updated,
+        }
+
+
+class JobStore:
+    """In-memory job registry (per process), bounded by count and age.
+
+    Submitting a key that already has a queued/running job returns that job, so repeated
+    clicks for the same repo share one backend run.
+    """
+
+    def __init__(self, max_jobs: int = 500, ttl_s: float = 3600.0):
+        self.max_jobs = max_jobs
+        self.ttl_s = ttl_s
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._prune()
+        return self._jobs.get(job_id)
+
+    def submit(
+        self,
+        key: str,
+        run: Callable[[Job], Awaitable[Dict[str, Any]]],
+        describe_error: Callable[[Exception], Tuple[int, Dict[str, Any]]],
+    ) -> Job:
+        self._prune()
+        for job in self._jobs.values():
+            if job.key == key and job.status in ("queued", "running"):
+                return job
+
+        job = Job(id=uuid.uuid4().hex, key=key)
+        self._jobs[job.id] = job
+
+        async def runner() -> None:
+            job.status = "running"
+            try:
+                job.result = await run(job)
+                job.status = "done"
+                job.progress("done")
+            except Exception as e:
+                status_code, body = describe_error(e)
+                job.error = {"status_code": status_code, **body}
+                job.status = "error"
+                job.progress("error")
+            finally:
+                self._tasks.pop(job.id, None)
+
+        self._tasks[job.id] = asyncio.create_task(runner())
+        return job
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.ttl_s
+        for job_id in list(self._jobs):
+            job = self._jobs[job_id]
+            finished = job.status in ("done", "error")
+            if finished and (job.updated < cutoff or len(self._jobs) > self.max_jobs):
+                del self._jobs[job_id]
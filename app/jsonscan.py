@@ -0,0 +1,69 @@
+import re
+from typing import Optional, Tuple
+
+# Only these characters change the scanner's state; everything between them is skipped.
+_SIGNIFICANT = re.compile(r'[{}"\\]')
+
+
+class JsonObjectScanner:
+    """Incremental scanner for the first top-level JSON object in a stream of text.
+
+    Tracks brace depth plus string/escape state only (no parsing), so it can be fed
+    streamed completion deltas and tell, at the closing brace, that the object is
+    complete. Text before the first "{" (a code fence, a preamble) is ignored.
+    """
+
+    def __init__(self) -> None:
+        self.depth = 0
+        self.start: Optional[int] = None  # offset of the opening brace in the whole stream
+        self.done = False
+        self._in_string = False
+        self._escape = False              # a backslash ended the previous chunk
+        self._offset = 0                  # characters fed so far
+
+    def feed(self, text: str) -> Optional[int]:
+        """Feed the next chunk; returns the index in `text` just past the object's closing brace, once."""
+        if self.done or not text:
+            return None
+        pos = 0
+        if self._escape:
+            self._escape = False
+            pos = 1
+        skip = pos
+        for m in _SIGNIFICANT.finditer(text, pos):
+            i = m.start()
+            if i < skip:
+                continue
+            ch = text[i]
+            if self._in_string:
+                if ch == "\\":
+                    if i + 1 < len(text):
+                        skip = i + 2
+                    else:
+                        self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = self.depth > 0
+            elif ch == "{":
+                if self.depth == 0:
+                    self.start = self._offset + i
+                self.depth += 1
+            elif ch == "}" and self.depth:
+                self.depth -= 1
+                if self.depth == 0:
+                    self.done = True
+                    self._offset += i + 1
+                    return i + 1
+        self._offset += len(text)
+        return None
+
+
+def find_json_object(text: str, pos: int = 0) -> Optional[Tuple[int, int]]:
+    """(start, end) of the first balanced {...} at or after `pos`, or None."""
+    start = text.find("{", pos)
+    if start < 0:
+        return None
+    scanner = JsonObjectScanner()
+    end = scanner.feed(text[start:])
+    return None if end is None else (start, start + end)
@@ -1,20 +1,47 @@
 import os
-from typing import Any, Dict, List, Tuple
+import json
+import time
+import asyncio
+from collections import deque
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
 
 import httpx
 
+from .clients import get_client
+from .deadline import timeout_for
+from .jsonscan import JsonObjectScanner
+from . import metrics
+
+# Statuses worth retrying on another provider / model.
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
 class LLMError(Exception):
     pass
 
+
+class LLMRetryableError(LLMError):
+    """Transient failure (5xx / 429 / transport / invalid answer): the next route entry may succeed."""
+    pass
+
+
 def _provider() -> str:
     return os.getenv("LLM_PROVIDER", "openai").strip().lower()
 
+
+# provider -> (env var, default) of the model used when nothing else picks one
+_DEFAULT_MODELS = {
+    "openai": ("OPENAI_MODEL", "gpt-4o-mini"),
+    "nebius": ("NEBIUS_MODEL", "meta-llama/Meta-Llama-3.1-8B-Instruct-fast"),
+}
+
 def _openai_cfg() -> Tuple[str, str, str]:
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         raise LLMError("OPENAI_API_KEY environment variable is not set.")
     base_url = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1/")
-    model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+    model = os.getenv(*_DEFAULT_MODELS["openai"])
     return api_key, base_url.rstrip("/") + "/", model
 
 def _nebius_cfg() -> Tuple[str, str, str]:
@@ -22,44 +49,353 @@ def _nebius_cfg() -> Tuple[str, str, str]:
     if not api_key:
         raise LLMError("NEBIUS_API_KEY environment variable is not set.")
     base_url = os.getenv("NEBIUS_BASE_URL", "https://api.tokenfactory.nebius.com/v1/")
-    model = os.getenv("NEBIUS_MODEL", "meta-llama/Meta-Llama-3.1-8B-Instruct-fast")
+    model = os.getenv(*_DEFAULT_MODELS["nebius"])
     return api_key, base_url.rstrip("/") + "/", model
 
-async def chat_completion(messages: List[Dict[str, str]], temperature: float = 0.2) -> str:
-    provider = _provider()
 
+# Per-tier model defaults used by performance profiles (app/profiles.py);
+# override with <PROVIDER>_<TIER>_MODEL, e.g. OPENAI_FAST_MODEL / NEBIUS_THOROUGH_MODEL.
+# Nebius' default is already its fast 8B model, so there the fast tier changes nothing.
+TIER_MODELS = {
+    ("openai", "fast"): "gpt-4.1-nano",
+    ("openai", "thorough"): "gpt-4o",
+    ("nebius", "fast"): "meta-llama/Meta-Llama-3.1-8B-Instruct-fast",
+    ("nebius", "thorough"): "meta-llama/Meta-Llama-3.1-70B-Instruct",
+}
+
+
+def tier_model(provider: str, tier: str) -> Optional[str]:
+    """Model for a profile tier; None means the provider's configured default model."""
+    if tier == "default":
+        return None
+    return os.getenv(f"{provider.upper()}_{tier.upper()}_MODEL") or TIER_MODELS.get((provider, tier))
+
+
+def primary_model(model: Optional[str] = None, model_tier: Optional[str] = None) -> Optional[str]:
+    """Model the primary route entry is called with for `model` / `model_tier` (no credentials needed).
+
+    None when LLM_PROVIDER is not a known provider.
+    """
+    provider, _, pinned = _provider().partition(":")
+    provider = provider.strip()
+    if provider not in _DEFAULT_MODELS:
+        return None
+    return model or (tier_model(provider, model_tier) if model_tier else None) or pinned.strip() or os.getenv(*_DEFAULT_MODELS[provider])
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def _timeout_s() -> float:
+    return _env_float("LLM_TIMEOUT_S", 90.0)
+
+
+def _streaming_enabled() -> bool:
+    return os.getenv("LLM_STREAM", "1").strip().lower() not in {"0", "false", "no", "off"}
+
+
+# Rough output sizes used to cap generation (max_tokens) for JSON answers.
+TOKENS_PER_SENTENCE = 40
+TOKENS_PER_ITEM = 8
+
+
+def json_answer_max_tokens(sentences: int, items: int = 0) -> int:
+    """max_tokens for a JSON answer of at most `sentences` prose sentences and `items` short
+    list entries, with 50% slack. LLM_MAX_TOKENS, when set, overrides it."""
+    override = int(_env_float("LLM_MAX_TOKENS", 0))
+    if override > 0:
+        return override
+    return int((sentences * TOKENS_PER_SENTENCE + items * TOKENS_PER_ITEM + 40) * 1.5)
+
+
+# --- Provider targets ---
+
+@dataclass(frozen=True)
+class ProviderTarget:
+    provider: str
+    api_key: str
+    base_url: str
+    model: str
+
+    @property
+    def name(self) -> str:
+        return f"{self.provider}:{self.model}"
+
+
+def _target(spec: str) -> ProviderTarget:
+    """Resolve "provider" or "provider:model" into a concrete endpoint."""
+    provider, _, model = spec.strip().partition(":")
+    provider = provider.strip().lower()
     if provider == "openai":
-        api_key, base_url, model = _openai_cfg()
+        api_key, base_url, default_model = _openai_cfg()
     elif provider == "nebius":
-        api_key, base_url, model = _nebius_cfg()
+        api_key, base_url, default_model = _nebius_cfg()
     else:
         raise LLMError('LLM_PROVIDER must be "openai" or "nebius".')
+    return ProviderTarget(provider, api_key, base_url, model.strip() or default_model)
+
+
+def route(specs: Optional[List[str]] = None) -> List[ProviderTarget]:
+    """Ordered provider route: LLM_PROVIDER first, then LLM_FALLBACKS.
+
+    Fallbacks whose credentials are missing are skipped; the primary must be configured.
+    """
+    if specs is None:
+        fallbacks = [x for x in os.getenv("LLM_FALLBACKS", "").split(",") if x.strip()]
+        specs = [_provider()] + fallbacks
+
+    targets: List[ProviderTarget] = [_target(specs[0])]
+    for spec in specs[1:]:
+        try:
+            t = _target(spec)
+        except LLMError:
+            continue
+        if t not in targets:
+            targets.append(t)
+    return targets
+
 
-    url = base_url + "chat/completions"
+# --- Per-provider latency / error stats (drive the adaptive hedge delay) ---
+
+class ProviderStats:
+    def __init__(self, window: int = 200):
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.successes = 0
+        self.errors = 0
+        self.cancelled = 0
+
+    def record(self, latency_s: float) -> None:
+        self.successes += 1
+        self.latencies.append(latency_s)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        idx = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+        return ordered[idx]
+
+    def snapshot(self) -> Dict[str, Any]:
+        total = self.successes + self.errors
+        return {
+            "successes": self.successes,
+            "errors": self.errors,
+            "cancelled": self.cancelled,
+            "error_rate": round(self.errors / total, 4) if total else 0.0,
+            "p50_s": self.percentile(0.5),
+            "p95_s": self.percentile(0.95),
+        }
+
+
+_STATS: Dict[str, ProviderStats] = {}
+
+
+def _stats_for(target: ProviderTarget) -> ProviderStats:
+    st = _STATS.get(target.name)
+    if st is None:
+        st = _STATS[target.name] = ProviderStats()
+    return st
+
+
+def provider_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: st.snapshot() for name, st in _STATS.items()}
+
+
+def hedge_delay(target: ProviderTarget) -> float:
+    """Seconds to wait on `target` before hedging to the next route entry.
+
+    Uses the LLM_HEDGE_PERCENTILE of recent latencies once LLM_HEDGE_MIN_SAMPLES
+    successes are recorded; LLM_HEDGE_DELAY_S until then.
+    """
+    delay = _env_float("LLM_HEDGE_DELAY_S", 8.0)
+    st = _STATS.get(target.name)
+    if st is not None and len(st.latencies) >= int(_env_float("LLM_HEDGE_MIN_SAMPLES", 20)):
+        delay = st.percentile(_env_float("LLM_HEDGE_PERCENTILE", 0.9)) or delay
+    return max(_env_float("LLM_HEDGE_MIN_DELAY_S", 0.5), min(delay, _timeout_s()))
+
+
+def _hedging_enabled() -> bool:
+    return os.getenv("LLM_HEDGE", "0").strip().lower() in {"1", "true", "yes", "on"}
+
+
+# --- Single attempt ---
+
+async def _read_stream(r: httpx.Response, stop_at_json: bool) -> str:
+    """Collect the content deltas of a server-sent-events completion.
+
+    With `stop_at_json`, reading stops as soon as the first top-level JSON object is
+    complete; leaving the stream context then closes the upstream request, so trailing
+    prose is never generated (nor billed).
+    """
+    parts: List[str] = []
+    scanner = JsonObjectScanner() if stop_at_json else None
+    async for line in r.aiter_lines():
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            break
+        try:
+            choices = json.loads(data).get("choices") or [{}]  # usage-only chunks have none
+            delta = (choices[0].get("delta") or {}).get("content") or ""
+        except (ValueError, AttributeError) as e:
+            raise LLMRetryableError("Unexpected LLM stream format.") from e
+        if not delta:
+            continue
+        end = scanner.feed(delta) if scanner is not None else None
+        if end is not None:
+            parts.append(delta[:end])
+            metrics.inc("llm.stream_stopped_early")
+            break
+        parts.append(delta)
+    return "".join(parts)
+
+
+async def _attempt(
+    target: ProviderTarget,
+    messages: List[Dict[str, str]],
+    temperature: float,
+    validate: Optional[Callable[[str], Any]],
+    max_tokens: Optional[int] = None,
+    stop_at_json: bool = False,
+) -> str:
+    url = target.base_url + "chat/completions"
 
     payload: Dict[str, Any] = {
-        "model": model,
+        "model": target.model,
         "messages": messages,
         "temperature": temperature,
     }
+    if max_tokens:
+        payload["max_tokens"] = max_tokens
+    stream = _streaming_enabled()
+    if stream:
+        payload["stream"] = True
 
     # OpenAI supports JSON mode via response_format on Chat Completions
-    if provider == "openai":
+    if target.provider == "openai":
         payload["response_format"] = {"type": "json_object"}
 
     headers = {
-        "Authorization": f"Bearer {api_key}",
+        "Authorization": f"Bearer {target.api_key}",
         "Content-Type": "application/json",
     }
 
-    async with httpx.AsyncClient() as client:
-        r = await client.post(url, headers=headers, json=payload, timeout=90.0)
+    stats = _stats_for(target)
+    started = time.monotonic()
+    try:
+        request = get_client("llm").build_request(
+            "POST", url, headers=headers, json=payload, timeout=timeout_for(_timeout_s())
+        )
+        r = await get_client("llm").send(request, stream=stream)
+        try:
+            if r.status_code >= 400:
+                await r.aread()
+                cls = LLMRetryableError if r.status_code in RETRYABLE_STATUS else LLMError
+                raise cls(f"{target.provider} API error ({r.status_code}): {r.text[:500]}")
+            if stream and r.headers.get("content-type", "").startswith("text/event-stream"):
+                content = await _read_stream(r, stop_at_json)
+            else:
+                # streaming off, or an endpoint that ignores "stream"
+                await r.aread()
+                try:
+                    content = r.json()["choices"][0]["message"]["content"]
+                except Exception as e:
+                    raise LLMRetryableError("Unexpected LLM response format.") from e
+        finally:
+            await r.aclose()
+    except asyncio.CancelledError:
+        stats.cancelled += 1
+        raise
+    except httpx.HTTPError as e:
+        stats.errors += 1
+        raise LLMRetryableError(f"{target.provider} request failed: {e.__class__.__name__}") from e
+    except LLMError:
+        stats.errors += 1
+        raise
+
+    if validate is not None:
+        try:
+            validate(content)
+        except Exception as e:
+            stats.errors += 1
+            raise LLMRetryableError(f"{target.name} returned an invalid answer.") from e
+
+    stats.record(time.monotonic() - started)
+    return content
+
+
+# --- Router ---
 
-    if r.status_code >= 400:
-        raise LLMError(f"{provider} API error ({r.status_code}): {r.text[:500]}")
+async def chat_completion(
+    messages: List[Dict[str, str]],
+    temperature: float = 0.2,
+    validate: Optional[Callable[[str], Any]] = None,
+    providers: Optional[List[str]] = None,
+    model: Optional[str] = None,
+    model_tier: Optional[str] = None,
+    max_tokens: Optional[int] = None,
+    stop_at_json: bool = False,
+) -> str:
+    """Chat completion over the provider route, with ordered failover and optional hedging.
 
-    data = r.json()
+    - failover: on 5xx/429/transport errors (or an answer rejected by `validate`) the next
+      route entry is tried; other 4xx errors are returned as-is.
+    - hedging (LLM_HEDGE=1): if the in-flight attempt hasn't answered within hedge_delay(),
+      the next route entry is started too. The first valid answer wins; the rest are cancelled.
+
+    `model` (or a `model_tier` of the performance profile) replaces the primary entry's model;
+    fallback entries keep their own.
+
+    Answers are streamed (LLM_STREAM=1, the default); with `stop_at_json` the stream is
+    closed once the first top-level JSON object is complete. `max_tokens` caps generation.
+    """
+    targets = route(providers)
+    primary_model = model or (tier_model(targets[0].provider, model_tier) if model_tier else None)
+    if primary_model:
+        targets[0] = replace(targets[0], model=primary_model)
+    queue = list(targets)
+    hedge = _hedging_enabled()
+    pending: Dict[asyncio.Task, ProviderTarget] = {}
+    last_error: Optional[LLMError] = None
+    fatal = False
+
+    def launch() -> None:
+        t = queue.pop(0)
+        pending[asyncio.ensure_future(_attempt(t, messages, temperature, validate, max_tokens, stop_at_json))] = t
+
+    launch()
     try:
-        return data["choices"][0]["message"]["content"]
-    except Exception as e:
-        raise LLMError("Unexpected LLM response format.") from e
+        while pending:
+            timeout = None
+            if hedge and queue and not fatal:
+                timeout = hedge_delay(next(iter(pending.values())))
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+            if not done:
+                launch()  # hedge
+                continue
+
+            for task in done:
+                pending.pop(task)
+                try:
+                    return task.result()
+                except LLMRetryableError as e:
+                    last_error = e
+                except LLMError as e:
+                    last_error = e
+                    fatal = True
+
+            if not pending and queue and not fatal:
+                launch()  # failover
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    raise last_error or LLMError("No LLM provider returned an answer.")
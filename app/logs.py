@@ -0,0 +1,225 @@
+import os
+import re
+import sys
+import json
+import uuid
+import queue
+import atexit
+import random
+import logging
+import threading
+import logging.handlers
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import metrics
+from .profiling import current_timings
+
+# Id of the request being served; tasks started by it (background jobs) inherit it.
+REQUEST_ID: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    """Keep the head and (mostly) the tail of a long traceback: the tail names the actual error."""
+    if max_chars <= 0 or len(text) <= max_chars:
+        return text
+    head = max_chars // 4
+    tail = max_chars - head
+    return f"{text[:head]}\n... ({len(text) - max_chars} chars truncated) ...\n{text[-tail:]}"
+
+
+class JsonFormatter(logging.Formatter):
+    """Minimal JSON formatter for container-friendly logs.
+
+    Adds the request id and the request's stage timings (ms) captured when the record
+    was logged; tracebacks are cut to LOG_TRACEBACK_MAX_CHARS (default 4000).
+    """
+
+    def __init__(self, traceback_max_chars: Optional[int] = None):
+        super().__init__()
+        if traceback_max_chars is None:
+            traceback_max_chars = _env_int("LOG_TRACEBACK_MAX_CHARS", 4000)
+        self.traceback_max_chars = traceback_max_chars
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            payload["request_id"] = request_id
+        timings = getattr(record, "timings_ms", None)
+        if timings:
+            payload["timings_ms"] = timings
+        if record.exc_info:
+            payload["exc_info"] = _truncate(self.formatException(record.exc_info), self.traceback_max_chars)
+        elif record.exc_text:
+            payload["exc_info"] = _truncate(record.exc_text, self.traceback_max_chars)
+        return json.dumps(payload, ensure_ascii=False)
+
+
+def parse_sample_rates(raw: str) -> List[Tuple[str, float]]:
+    """"httpx=0.1,app.rag=0.5" -> [(logger prefix, keep rate)], longest prefix first."""
+    rates: List[Tuple[str, float]] = []
+    for item in raw.split(","):
+        name, _, value = item.partition("=")
+        try:
+            rate = min(1.0, max(0.0, float(value)))
+        except ValueError:
+            continue
+        if name.strip():
+            rates.append((name.strip(), rate))
+    return sorted(rates, key=lambda r: -len(r[0]))
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of each configured logger's records below WARNING (LOG_SAMPLE_RATES).
+
+    A rate applies to the named logger and its children. Warnings and errors are never sampled out.
+    """
+
+    def __init__(self, rates: List[Tuple[str, float]]):
+        super().__init__()
+        self.rates = rates
+
+    def _rate(self, name: str) -> float:
+        for prefix, rate in self.rates:
+            if name == prefix or name.startswith(prefix + "."):
+                return rate
+        return 1.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self._rate(record.name)
+        if rate >= 1.0 or random.random() < rate:
+            return True
+        metrics.inc("logs.sampled_out")
+        return False
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks the caller.
+
+    The request context (request id, stage timings) is captured here, in the logging
+    thread; formatting and the write to stderr happen in the listener thread. When the
+    bounded queue is full, records below WARNING are dropped; a WARNING or worse evicts
+    the oldest queued record instead. Drops are counted (`dropped`, logs.dropped).
+    """
+
+    def __init__(self, q: "queue.Queue[logging.LogRecord]"):
+        super().__init__(q)
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # freeze the message now: args may be mutated after the call returns
+        record.msg = record.getMessage()
+        record.args = None
+        record.request_id = REQUEST_ID.get()
+        timings = current_timings()
+        record.timings_ms = {k: round(v * 1000, 1) for k, v in timings.items()} if timings else None
+        return record
+
+    def _drop(self) -> None:
+        with self._lock:
+            self.dropped += 1
+        metrics.inc("logs.dropped")
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            pass
+        if record.levelno < logging.WARNING:
+            self._drop()
+            return
+        try:
+            self.queue.get_nowait()
+            self._drop()
+            self.queue.put_nowait(record)
+        except (queue.Empty, queue.Full):
+            self._drop()
+
+
+_LISTENER: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging() -> None:
+    """Root logging: JSON lines on stderr, written by a background thread.
+
+    LOG_LEVEL (default INFO), LOG_QUEUE_SIZE (default 10000), LOG_SAMPLE_RATES
+    (e.g. "httpx=0.1"), LOG_TRACEBACK_MAX_CHARS (default 4000).
+    """
+    global _LISTENER
+    level_name = os.getenv("LOG_LEVEL", "INFO").upper().strip()
+    level = getattr(logging, level_name, logging.INFO)
+
+    root = logging.getLogger()
+    root.setLevel(level)
+
+    # Avoid duplicate handlers in reload mode
+    if root.handlers:
+        return
+
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(JsonFormatter())
+    q: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=max(1, _env_int("LOG_QUEUE_SIZE", 10000)))
+    handler = DroppingQueueHandler(q)
+    handler.addFilter(SamplingFilter(parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", ""))))
+    root.addHandler(handler)
+
+    _LISTENER = logging.handlers.QueueListener(q, stream, respect_handler_level=True)
+    _LISTENER.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Flush what is queued and stop the writer thread."""
+    global _LISTENER
+    listener, _LISTENER = _LISTENER, None
+    if listener is not None:
+        listener.stop()
+
+
+class RequestIdMiddleware:
+    """ASGI middleware: one id per HTTP request, from `X-Request-Id` or generated.
+
+    The id is set for everything logged while serving the request and echoed in the
+    `X-Request-Id` response header.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        incoming = dict(scope.get("headers") or []).get(b"x-request-id", b"").decode("latin-1")
+        request_id = incoming if REQUEST_ID_RE.match(incoming) else uuid.uuid4().hex[:16]
+
+        async def send_with_id(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (b"x-request-id", request_id.encode())]
+            await send(message)
+
+        token = REQUEST_ID.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            REQUEST_ID.reset(token)
@@ -1,7 +1,5 @@
 import os
-import json
 import logging
-from datetime import datetime, timezone
 
 # Load .env only for local development.
 # Set ENV=prod (or anything other than "dev") to disable.
@@ -14,60 +12,91 @@ if os.getenv("ENV", "dev").lower() == "dev":
         pass
     
 
-# --- Structured JSON logging setup ---
-
-class JsonFormatter(logging.Formatter):
-    """Minimal JSON formatter for container-friendly logs."""
-
-    def format(self, record: logging.LogRecord) -> str:
-        payload = {
-            "ts": datetime.now(timezone.utc).isoformat(),
-            "level": record.levelname,
-            "logger": record.name,
-            "msg": record.getMessage(),
-        }
-        if record.exc_info:
-            payload["exc_info"] = self.formatException(record.exc_info)
-        return json.dumps(payload, ensure_ascii=False)
-
-
-def setup_logging() -> None:
-    level_name = os.getenv("LOG_LEVEL", "INFO").upper().strip()
-    level = getattr(logging, level_name, logging.INFO)
-
-    root = logging.getLogger()
-    root.setLevel(level)
-
-    # Avoid duplicate handlers in reload mode
-    if not root.handlers:
-        handler = logging.StreamHandler()
-        handler.setFormatter(JsonFormatter())
-        root.addHandler(handler)
+# --- Structured JSON logging setup (queued; written by a background thread) ---
 
+from .logs import RequestIdMiddleware, setup_logging
 
 setup_logging()
 logger = logging.getLogger(__name__)
 logger.info("Starting Repo Summarizer API")
     
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import Depends, FastAPI, Header, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse
 
-from .schemas import SummarizeRequest, SummarizeResponse, ErrorResponse
+from .schemas import (
+    SummarizeRequest,
+    SummarizeResponse,
+    ErrorResponse,
+    JobAccepted,
+    JobStatus,
+    ResolvedRepo,
+    RefreshRequest,
+    RefreshAccepted,
+)
 from .github import (
+    RepoRef,
     parse_github_repo_url,
     assert_repo_accessible,
     download_repo_zip,
+    extract_zip_to_dir,
     extract_zip_to_tempdir,
+    resolve_commit,
+    github_authenticated,
+    github_quota,
     GitHubBadUrl,
     GitHubNotFound,
     GitHubPrivateOrForbidden,
     GitHubRateLimited,
     GitHubError,
 )
-from .summarize import summarize_repo, SummarizationError
+from .summarize import summarize_repo, SummarizationError, result_key
+from .profiles import PerfProfile, ProfileError, resolve_profile
+from .cache import get_result_cache
+from .llm import provider_stats
+from .clients import aclose_clients
+from .jobs import JobStore
+from .snapshots import SnapshotStore, get_snapshot_store
+from .warmup import READINESS, persist_caches, warm_up, warmup_enabled, warmup_timeout_s
+from .warming import LOAD, Warmer, warming_enabled
+from .deadline import DeadlineExceeded, deadline_scope, expired, job_budget, remaining, request_budget
+from .profiling import PROFILES, RequestProfile, debug_token, server_timing, should_sample, timed
+from . import metrics
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background: the server accepts connections right away, but
+    # /health/ready reports not-ready until pools, caches and query vectors are warm.
+    warmup_task = None
+    if warmup_enabled():
+        warmup_task = asyncio.create_task(warm_up(warmup_timeout_s()))
+    else:
+        READINESS.state = "ready"
+    if warming_enabled():
+        WARMER.start()
 
+    yield
 
-app = FastAPI(title="Repo Summarizer API", version="1.0.0")
+    await WARMER.stop()
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+        await asyncio.gather(warmup_task, return_exceptions=True)
+    try:
+        await asyncio.to_thread(persist_caches)
+    except Exception:
+        logger.exception("Failed to persist caches on shutdown")
+    await aclose_clients()
+
+
+app = FastAPI(title="Repo Summarizer API", version="1.0.0", lifespan=lifespan)
+app.add_middleware(RequestIdMiddleware)
+
+# Background /jobs runs (polled by the Streamlit UI instead of one long blocking request)
+JOBS = JobStore()
 
 @app.get("/")
 async def root():
@@ -88,55 +117,311 @@ async def live():
 
 @app.get("/health/ready")
 async def ready():
-    return {"status": "ready"}
+    body = {**READINESS.snapshot(), "github_quota": github_quota()}
+    if not READINESS.ready:
+        return JSONResponse(status_code=503, content=body)
+    return body
 
-@app.post("/summarize", response_model=SummarizeResponse, responses={400: {"model": ErrorResponse}, 404: {"model": ErrorResponse}, 429: {"model": ErrorResponse}, 500: {"model": ErrorResponse}})
-async def summarize(req: SummarizeRequest):
+@app.get("/metrics")
+async def get_metrics():
+    return {**metrics.snapshot(), "llm_providers": provider_stats(), "github_quota": github_quota()}
+
+def _error_response(e: Exception) -> Tuple[int, Dict[str, Any]]:
+    """Map a pipeline exception to (status_code, error body)."""
+    if isinstance(e, GitHubNotFound):
+        return 404, {"status": "error", "message": str(e)}
+    if isinstance(e, GitHubBadUrl):
+        return 400, {"status": "error", "message": str(e)}
+    if isinstance(e, GitHubPrivateOrForbidden):
+        return 403, {"status": "error", "message": str(e)}
+    if isinstance(e, GitHubRateLimited):
+        return 429, {"status": "error", "message": str(e)}
+    if isinstance(e, DeadlineExceeded):
+        return 504, {"status": "error", "message": "The summary did not finish within the request deadline."}
+    if isinstance(e, (GitHubError, SummarizationError)):
+        return 500, {"status": "error", "message": str(e)}
+
+    # last resort — log full stack trace
+    logger.exception("Unhandled error in /summarize", exc_info=e)
+
+    env = os.getenv("ENV", "prod").lower().strip()
+    if env == "dev":
+        return 500, {"status": "error", "message": "Unexpected server error.", "detail": str(e)}
+
+    # In non-dev environments, avoid leaking internals
+    return 500, {"status": "error", "message": "Unexpected server error."}
+
+
+def _parse_url(github_url: str) -> RepoRef:
     try:
-        ref = parse_github_repo_url(str(req.github_url))
+        return parse_github_repo_url(github_url)
     except GitHubBadUrl as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+
+def _profile(req: SummarizeRequest) -> PerfProfile:
     try:
-        await assert_repo_accessible(ref)
-        zip_bytes = await download_repo_zip(ref)
-        tmp, repo_root = extract_zip_to_tempdir(zip_bytes)
+        return resolve_profile(
+            req.mode,
+            max_files=req.max_files,
+            max_chunks=req.max_chunks,
+            top_k=req.top_k,
+            use_embeddings=req.use_embeddings,
+            model=req.model,
+        )
+    except ProfileError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 
+async def _summarize_tree(
+    ref: RepoRef,
+    sha: Optional[str],
+    profile: PerfProfile,
+    progress: Callable[[str], None],
+) -> Dict[str, Any]:
+    store = get_snapshot_store()
+    if store is None or sha is None:
+        progress("downloading")
+        with timed("download"):
+            zip_bytes = await download_repo_zip(ref, sha)
+        progress("extracting")
+        with timed("extract"):
+            tmp, repo_root = await asyncio.to_thread(extract_zip_to_tempdir, zip_bytes, ref.subpath)
         try:
-            result = await summarize_repo(repo_root)
+            progress("summarizing")
+            return await summarize_repo(repo_root, profile)
         finally:
-            tmp.cleanup()
-
-        return result
-
-    except GitHubNotFound as e:
-        return JSONResponse(status_code=404, content={"status": "error", "message": str(e)})
-    except GitHubPrivateOrForbidden as e:
-        return JSONResponse(status_code=403, content={"status": "error", "message": str(e)})
-    except GitHubRateLimited as e:
-        return JSONResponse(status_code=429, content={"status": "error", "message": str(e)})
-    except (GitHubError, SummarizationError) as e:
-        return JSONResponse(status_code=500, content={"status": "error", "message": str(e)})
+            # deleting the tree is not the client's problem: do it off the request path
+            asyncio.get_running_loop().run_in_executor(None, tmp.cleanup)
+
+    async def populate(dest) -> None:
+        progress("downloading")
+        with timed("download"):
+            zip_bytes = await download_repo_zip(ref, sha)
+        progress("extracting")
+        with timed("extract"):
+            await asyncio.to_thread(extract_zip_to_dir, zip_bytes, dest, ref.subpath)
+
+    snapshot = await store.acquire(SnapshotStore.key(ref.owner, ref.repo, sha, ref.subpath), populate)
+    try:
+        progress("summarizing")
+        return await summarize_repo(snapshot.repo_root / ref.subpath, profile)
+    finally:
+        snapshot.release()
+
+
+async def _run_summarize(
+    ref: RepoRef,
+    profile: PerfProfile,
+    progress: Callable[[str], None] = lambda stage: None,
+    refresh: bool = False,
+    sha: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Summarize `ref` through the result cache; `refresh` recomputes and replaces a cached entry.
+
+    A caller that already resolved the commit (the warmer) passes it as `sha`.
+    """
+    progress("checking repository")
+    with timed("github"):
+        meta = await assert_repo_accessible(ref)
+
+        results = get_result_cache()
+        # the lookup costs one API call per request: not worth it on the anonymous quota
+        if sha is None and (results is not None or get_snapshot_store() is not None) and github_authenticated():
+            try:
+                sha = await resolve_commit(ref, ref.ref or meta.get("default_branch") or "HEAD")
+            except Exception as e:
+                # Best effort: without a commit we just skip the caches (real errors such as
+                # rate limits surface again on the download below).
+                logger.warning("Commit lookup failed; caches bypassed: %s", e)
+
+    key = result_key(ref.owner, ref.repo, sha, profile, ref.subpath)
+    if results is not None and sha is not None and not refresh:
+        hit = results.get(key)
+        if hit is not None:
+            return {**hit, "meta": {**hit["meta"], "cached": True}}
+
+    result = await _summarize_tree(ref, sha, profile, progress)
+    result["meta"].update(commit=sha, cached=False)
+    # a deadline-degraded answer must not stand in for the full profile later
+    if results is not None and sha is not None and not result["meta"].get("degraded"):
+        results.put(key, result)
+    return result
+
+
+async def _within_deadline(coro: Awaitable[Any]) -> Any:
+    """Await `coro`, cut off at the current deadline; any failure past it becomes DeadlineExceeded."""
+    try:
+        return await asyncio.wait_for(coro, timeout=remaining())
     except Exception as e:
-        # last resort — log full stack trace
-        logger.exception("Unhandled error in /summarize")
-
-        env = os.getenv("ENV", "prod").lower().strip()
-        if env == "dev":
-            return JSONResponse(
-                status_code=500,
-                content={
-                    "status": "error",
-                    "message": "Unexpected server error.",
-                    "detail": str(e),
-                },
-            )
-
-        # In non-dev environments, avoid leaking internals
-        return JSONResponse(
-            status_code=500,
-            content={
-                "status": "error",
-                "message": "Unexpected server error.",
-            },
-        )
\ No newline at end of file
+        if expired():
+            metrics.inc("requests.deadline_exceeded")
+            raise DeadlineExceeded("Request deadline exceeded.") from e
+        raise
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+async def _until_disconnected(request: Request, coro: Awaitable[Any]) -> Any:
+    """Await `coro`, cancelling it (and every upstream call under it) if the client goes away."""
+    task = asyncio.ensure_future(coro)
+    poll_s = float(os.getenv("DISCONNECT_POLL_S", "1.0"))
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=poll_s)
+        if done:
+            return task.result()
+        if await request.is_disconnected():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            metrics.inc("requests.client_disconnected")
+            raise ClientDisconnected()
+
+
+async def _refresh(ref: RepoRef, profile: PerfProfile, sha: Optional[str]) -> None:
+    await _run_summarize(ref, profile, refresh=True, sha=sha)
+
+
+# Keeps the most requested repos' summaries fresh in the background (WARM_ENABLED=1)
+WARMER = Warmer(_refresh)
+
+
+def _with_timings(result: Dict[str, Any], prof: RequestProfile) -> Dict[str, Any]:
+    # copy: `result` may be the object held by the result cache
+    return {**result, "meta": {**result["meta"], "timings": prof.timings_ms(), "profile_id": prof.profile_id}}
+
+
+@app.post("/summarize", response_model=SummarizeResponse, responses={400: {"model": ErrorResponse}, 404: {"model": ErrorResponse}, 429: {"model": ErrorResponse}, 500: {"model": ErrorResponse}})
+async def summarize(req: SummarizeRequest, request: Request, response: Response):
+    ref = _parse_url(str(req.github_url))
+    profile = _profile(req)
+    prof = RequestProfile("/summarize", ref.slug, sample=should_sample(request.headers))
+
+    budget = request_budget(request.headers)
+    try:
+        with LOAD, prof, deadline_scope(budget):
+            result = await _until_disconnected(request, _within_deadline(_run_summarize(ref, profile)))
+    except ClientDisconnected:
+        # nobody is listening; 499 only shows up in access logs
+        return Response(status_code=499)
+    except Exception as e:
+        status_code, body = _error_response(e)
+        return JSONResponse(status_code=status_code, content=body, headers=prof.headers())
+    # only repos that were actually summarized count as popular
+    WARMER.record(ref, profile)
+    response.headers.update(prof.headers())
+    return _with_timings(result, prof)
+
+
+@app.post("/jobs", status_code=202, response_model=JobAccepted, responses={400: {"model": ErrorResponse}})
+async def submit_job(req: SummarizeRequest, request: Request):
+    """Start a summarization in the background; poll GET /jobs/{job_id} for progress and the result."""
+    ref = _parse_url(str(req.github_url))
+    profile = _profile(req)
+    sample = should_sample(request.headers)
+    budget = job_budget(request.headers)
+
+    async def run(job) -> Dict[str, Any]:
+        prof = RequestProfile("/jobs", ref.slug, sample=sample)
+        with LOAD, prof, deadline_scope(budget):
+            result = await _within_deadline(_run_summarize(ref, profile, job.progress))
+        WARMER.record(ref, profile)
+        return _with_timings(result, prof)
+
+    job = JOBS.submit(
+        key=ref.slug.lower() + "|" + profile.key(),
+        run=run,
+        describe_error=_error_response,
+    )
+    return {"job_id": job.id, "status": job.status, "deadline_s": budget}
+
+
+@app.get("/jobs/{job_id}", response_model=JobStatus, responses={404: {"model": ErrorResponse}})
+async def get_job(job_id: str, response: Response):
+    job = JOBS.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"status": "error", "message": "Job not found (it may have expired)."})
+    body = job.to_dict()
+    timings = ((job.result or {}).get("meta") or {}).get("timings")
+    if timings:
+        # the job's own timings, so browser devtools show them on the final poll
+        response.headers["Server-Timing"] = server_timing({k: v / 1000 for k, v in timings.items()})
+    return body
+
+
+@app.get("/resolve", response_model=ResolvedRepo, responses={400: {"model": ErrorResponse}, 404: {"model": ErrorResponse}, 429: {"model": ErrorResponse}})
+async def resolve(github_url: str):
+    """Current commit of the repo's default branch (lets clients key caches by commit)."""
+    ref = _parse_url(github_url)
+    try:
+        data = await assert_repo_accessible(ref)
+        branch = ref.ref or data.get("default_branch") or "HEAD"
+        sha = await resolve_commit(ref, branch)
+    except Exception as e:
+        status_code, body = _error_response(e)
+        return JSONResponse(status_code=status_code, content=body)
+    return {"owner": ref.owner, "repo": ref.repo, "branch": branch, "commit": sha}
+
+
+@app.post("/refresh", status_code=202, response_model=RefreshAccepted, responses={400: {"model": ErrorResponse}, 401: {"model": ErrorResponse}, 404: {"model": ErrorResponse}, 503: {"model": ErrorResponse}})
+async def refresh(req: RefreshRequest, x_refresh_token: Optional[str] = Header(None)):
+    """Queue a background re-summarization of a repo (e.g. from a push webhook).
+
+    Every refresh is a paid LLM run that bypasses the cache, so the endpoint only
+    exists when REFRESH_TOKEN is configured. Without a GitHub token nothing is cached
+    per commit, so a refresh would be wasted work: 503.
+    """
+    expected = os.getenv("REFRESH_TOKEN", "").strip()
+    if not expected:
+        raise HTTPException(status_code=404, detail="Not found")
+    if x_refresh_token != expected:
+        return JSONResponse(status_code=401, content={"status": "error", "message": "Missing or invalid X-Refresh-Token."})
+    if not github_authenticated():
+        return JSONResponse(status_code=503, content={"status": "error", "message": "Refreshing needs GITHUB_TOKEN (results are only cached per commit with one)."})
+    ref = _parse_url(str(req.github_url))
+    if req.mode:
+        profiles = [resolve_profile(req.mode)]
+    else:
+        profiles = [t.profile for t in WARMER.tracked_for(ref)] or [resolve_profile("balanced")]
+    for profile in profiles:
+        WARMER.request_refresh(ref, profile)
+    return {"owner": ref.owner, "repo": ref.repo, "modes": [p.name for p in profiles]}
+
+
+# --- Sampled profiles (PROFILE_SAMPLE_RATE, or `X-Profile: 1` with ENV=dev) ---
+
+async def _debug_access(x_debug_token: Optional[str] = Header(None)) -> None:
+    """Profiles expose code paths and repo names: the endpoints only exist when DEBUG_TOKEN is set."""
+    expected = debug_token()
+    if not expected:
+        raise HTTPException(status_code=404, detail="Not found")
+    if x_debug_token != expected:
+        raise HTTPException(status_code=401, detail="Missing or invalid X-Debug-Token.")
+
+
+def _profile_record(profile_id: str):
+    record = PROFILES.get(profile_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Profile not found (it may have been evicted).")
+    return record
+
+
+@app.get("/debug/profiles", dependencies=[Depends(_debug_access)])
+async def list_profiles():
+    return {"profiles": [r.summary() for r in PROFILES.list()]}
+
+
+@app.get("/debug/profiles/{profile_id}", dependencies=[Depends(_debug_access)])
+async def get_profile(profile_id: str):
+    return _profile_record(profile_id).to_dict()
+
+
+@app.get("/debug/profiles/{profile_id}/download", response_class=PlainTextResponse, dependencies=[Depends(_debug_access)])
+async def download_profile(profile_id: str):
+    """Folded stacks (flamegraph.pl / speedscope input)."""
+    record = _profile_record(profile_id)
+    return PlainTextResponse(
+        record.folded,
+        headers={"Content-Disposition": f'attachment; filename="profile-{record.id}.folded"'},
+    )
@@ -0,0 +1,211 @@
+import os
+import asyncio
+import hashlib
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from . import metrics
+from .cache import get_partial_cache
+from .llm import LLMError, chat_completion, json_answer_max_tokens, route, tier_model
+from .selection import IndexedFile, RepoIndex, build_tree, context_char_cap, safe_read_text, select_files
+
+logger = logging.getLogger(__name__)
+
+ROOT_PARTITION = "(root)"
+OTHER_PARTITION = "(other)"
+
+# Bump whenever the map prompt changes: it is part of the partial-summary cache key.
+MAP_PROMPT_VERSION = "1"
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+@dataclass
+class Partition:
+    """A slice of the repo summarized by one map call: a top-level directory or package."""
+    name: str
+    files: List[IndexedFile]
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(f.size for f in self.files)
+
+
+def _group(files: List[IndexedFile], depth: int) -> Dict[str, List[IndexedFile]]:
+    groups: Dict[str, List[IndexedFile]] = defaultdict(list)
+    for f in files:
+        parts = f.rel.parts
+        if len(parts) <= depth:
+            groups[ROOT_PARTITION if depth == 1 else "/".join(parts[:-1])].append(f)
+        else:
+            groups["/".join(parts[:depth])].append(f)
+    return groups
+
+
+def partition_index(index: RepoIndex, max_partitions: Optional[int] = None, min_files: int = 3) -> List[Partition]:
+    """Split the index by top-level directory, largest first.
+
+    A directory holding most of the repo (`src/`, `packages/`) is split one level further
+    so a monorepo yields its packages. Partitions beyond `max_partitions`
+    (MAPREDUCE_MAX_PARTITIONS, default 12) and ones under `min_files` files are merged
+    into "(other)"; repo-root files always stay in "(root)".
+    """
+    if max_partitions is None:
+        max_partitions = _env_int("MAPREDUCE_MAX_PARTITIONS", 12)
+    groups = _group(index.files, 1)
+    total = len(index.files)
+    for name in [n for n, fs in groups.items() if n != ROOT_PARTITION and len(fs) > total / 2]:
+        sub = _group(groups[name], 2)
+        if len(sub) > 1:
+            del groups[name]
+            groups.update(sub)
+
+    root = groups.pop(ROOT_PARTITION, [])
+    ranked = sorted(groups.items(), key=lambda kv: (-len(kv[1]), kv[0]))
+    slots = max(1, max_partitions - (1 if root else 0) - 1)  # one slot kept for "(other)"
+    named: List[Partition] = []
+    other: List[IndexedFile] = []
+    for name, files in ranked:
+        if len(named) < slots and len(files) >= min_files:
+            named.append(Partition(name, files))
+        else:
+            other.extend(files)
+    out = [Partition(ROOT_PARTITION, root)] if root else []
+    out += named
+    if other:
+        out.append(Partition(OTHER_PARTITION, other))
+    return out
+
+
+def partition_context(repo_root: Path, part: Partition, max_chars: int, max_files: int = 8) -> Tuple[str, List[str]]:
+    """Tree + top files of one partition (classic context, scoped). Returns (context, files used)."""
+    parts: List[str] = []
+    if part.name not in (ROOT_PARTITION, OTHER_PARTITION) and (repo_root / part.name).is_dir():
+        parts.append(f"=== DIRECTORY TREE: {part.name}/ (truncated) ===\n" + build_tree(repo_root / part.name, max_depth=3, max_entries=120))
+    else:
+        listing = "\n".join(f"- {f.rel.as_posix()}" for f in part.files[:120])
+        parts.append(f"=== FILES: {part.name} (truncated) ===\n" + listing)
+
+    used: List[str] = []
+    total = len(parts[0])
+    selected = select_files(repo_root, max_files=max_files, index=RepoIndex(root=repo_root, files=part.files))
+    for sf in selected:
+        text = safe_read_text(sf.path, max_chars=context_char_cap(sf.path))
+        if not text.strip():
+            continue
+        rel = sf.path.relative_to(repo_root).as_posix()
+        chunk = f"\n\n=== FILE: {rel} ===\n{text}"
+        if total + len(chunk) > max_chars:
+            continue
+        parts.append(chunk)
+        used.append(rel)
+        total += len(chunk)
+    return "\n".join(parts), used
+
+
+MAP_SYSTEM = (
+    "You are a senior software engineer. "
+    "You are given one part of a larger repository; describe only that part."
+)
+
+MAP_USER = """Return ONLY valid JSON with keys: summary (string), technologies (array of strings), role (string).
+
+Rules:
+- summary: what this part of the repository does (1-3 sentences).
+- technologies: languages, frameworks and libraries visible in this part.
+- role: one of "application", "library", "service", "cli", "tests", "docs", "examples", "tooling", "config", "other".
+
+Part: {name} ({files} files)
+
+{context}
+"""
+
+
+def _map_model_id() -> str:
+    try:
+        provider = route()[0].provider
+    except LLMError:
+        return "unconfigured"
+    return f"{provider}:{tier_model(provider, 'fast')}"
+
+
+async def summarize_partitions(
+    repo_root: Path,
+    partitions: List[Partition],
+    parse: Callable[[str], Dict[str, Any]],
+    max_chars: Optional[int] = None,
+    concurrency: Optional[int] = None,
+) -> List[Tuple[Partition, Dict[str, Any]]]:
+    """Map step: one fast-model summary per partition, concurrently, behind a semaphore.
+
+    Partials are cached by a hash of exactly what the model sees (prompt version, model,
+    partition context), so unchanged packages of a monorepo are not re-summarized when
+    another package changes. Partitions whose call fails are left out.
+    """
+    if max_chars is None:
+        max_chars = _env_int("MAPREDUCE_PARTITION_CHARS", 6000)
+    if concurrency is None:
+        concurrency = _env_int("MAPREDUCE_CONCURRENCY", 6)
+    sem = asyncio.Semaphore(max(1, concurrency))
+    cache = get_partial_cache()
+    model_id = _map_model_id()
+
+    async def one(part: Partition) -> Optional[Dict[str, Any]]:
+        context, used = await asyncio.to_thread(partition_context, repo_root, part, max_chars)
+        key = hashlib.sha1(f"{MAP_PROMPT_VERSION}\n{model_id}\n{context}".encode("utf-8", errors="ignore")).hexdigest()
+        if cache is not None:
+            hit = cache.get(key)
+            if hit is not None:
+                return hit
+        async with sem:
+            metrics.inc("mapreduce.map_calls")
+            try:
+                out = await chat_completion(
+                    messages=[
+                        {"role": "system", "content": MAP_SYSTEM},
+                        {"role": "user", "content": MAP_USER.format(name=part.name, files=len(part.files), context=context).strip()},
+                    ],
+                    temperature=0.2,
+                    validate=parse,
+                    model_tier="fast",
+                    # summary (<= 3 sentences) + role + technologies
+                    max_tokens=json_answer_max_tokens(sentences=4, items=20),
+                    stop_at_json=True,
+                )
+                data = parse(out)
+            except Exception as e:
+                metrics.inc("mapreduce.map_failed")
+                logger.warning("Map step failed for partition %s: %s", part.name, e)
+                return None
+        partial = {
+            "summary": str(data.get("summary", "")).strip(),
+            "technologies": [str(x).strip() for x in data.get("technologies") or [] if str(x).strip()],
+            "role": str(data.get("role", "")).strip(),
+            "evidence": used,
+        }
+        if cache is not None and partial["summary"]:
+            cache.put(key, partial)
+        return partial
+
+    results = await asyncio.gather(*(one(p) for p in partitions))
+    return [(p, r) for p, r in zip(partitions, results) if r and r["summary"]]
+
+
+def reduce_context(tree: str, partials: List[Tuple[Partition, Dict[str, Any]]]) -> str:
+    """Reduce-step context: the top-level tree plus one short section per partition."""
+    parts = ["=== DIRECTORY TREE (truncated) ===\n" + tree]
+    for part, p in partials:
+        tech = ", ".join(p["technologies"]) or "-"
+        parts.append(
+            f"\n\n=== PART: {part.name} ({len(part.files)} files, {part.total_bytes // 1024} KB) ===\n"
+            f"role: {p['role'] or 'unknown'}\ntechnologies: {tech}\n{p['summary']}"
+        )
+    return "\n".join(parts)
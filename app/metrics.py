@@ -0,0 +1,30 @@
+import threading
+from typing import Any, Dict
+
+# Minimal in-process metrics, exposed as JSON at GET /metrics.
+# Counters only ever go up; gauges hold the latest value (any JSON-serializable object).
+
+_LOCK = threading.Lock()
+_COUNTERS: Dict[str, float] = {}
+_GAUGES: Dict[str, Any] = {}
+
+
+def inc(name: str, value: float = 1.0) -> None:
+    with _LOCK:
+        _COUNTERS[name] = _COUNTERS.get(name, 0.0) + value
+
+
+def set_gauge(name: str, value: Any) -> None:
+    with _LOCK:
+        _GAUGES[name] = value
+
+
+def snapshot() -> Dict[str, Any]:
+    with _LOCK:
+        return {"counters": dict(_COUNTERS), "gauges": dict(_GAUGES)}
+
+
+def reset() -> None:
+    with _LOCK:
+        _COUNTERS.clear()
+        _GAUGES.clear()
@@ -0,0 +1,72 @@
+import time
+import asyncio
+import inspect
+import logging
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class Stage:
+    """One node of a stage graph.
+
+    `fn` receives the results of `deps` as keyword arguments. Sync functions run in a
+    worker thread so file-system work doesn't block the event loop. An `optional` stage
+    that fails is logged and yields None to its dependents instead of failing the run.
+    """
+    name: str
+    fn: Callable[..., Any]
+    deps: Tuple[str, ...] = ()
+    optional: bool = False
+
+
+async def run_stages(stages: List[Stage], timings: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    """Run a stage graph, starting every stage as soon as its dependencies are done.
+
+    Stages must be listed after their dependencies (which also rules out cycles).
+    `timings` (if given) receives each stage's own run time in seconds, excluding the
+    time spent waiting on dependencies.
+    """
+    seen = set()
+    for st in stages:
+        missing = [d for d in st.deps if d not in seen]
+        if missing:
+            raise PipelineError(f"Stage {st.name!r} depends on unknown or later stages: {missing}")
+        seen.add(st.name)
+
+    tasks: Dict[str, asyncio.Future] = {}
+
+    async def run(st: Stage) -> Any:
+        kwargs = {d: await tasks[d] for d in st.deps}
+        started = time.perf_counter()
+        try:
+            if inspect.iscoroutinefunction(st.fn):
+                return await st.fn(**kwargs)
+            return await asyncio.to_thread(st.fn, **kwargs)
+        except Exception as e:
+            if not st.optional:
+                raise
+            logger.warning("Stage %s failed; continuing without it: %s", st.name, e)
+            return None
+        finally:
+            if timings is not None:
+                timings[st.name] = time.perf_counter() - started
+
+    for st in stages:
+        tasks[st.name] = asyncio.ensure_future(run(st))
+
+    try:
+        await asyncio.gather(*tasks.values())
+    except BaseException:
+        for t in tasks.values():
+            t.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        raise
+
+    return {name: t.result() for name, t in tasks.items()}
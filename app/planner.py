@@ -0,0 +1,168 @@
+import os
+from dataclasses import dataclass, field, fields
+from typing import Any, Dict, List, Optional
+
+from . import metrics
+from .mapreduce import Partition, partition_index
+from .profiles import PerfProfile, resolve_profile
+from .selection import RepoIndex, SelectedFile, context_char_cap, select_files
+
+# Default budgets (the "balanced" profile); per-request budgets come from app.profiles.
+CLASSIC_BUDGET_CHARS = 22000
+RAG_BUDGET_CHARS = 14000
+RAG_FILE_CHARS = 12000   # safe_read_text cap per file when chunking
+CHUNK_CHARS = 2200
+
+# Rough sizing: ~4 chars per token, ~30 chars per directory-tree line (<= 400 lines).
+CHARS_PER_TOKEN = 4
+TREE_LINE_CHARS = 30
+TREE_MAX_LINES = 400
+
+DEFAULT_MAX_FILES = 28
+DEFAULT_MAX_CHUNKS = 220
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+@dataclass
+class RetrievalPlan:
+    """How summarize_repo should gather context, plus the estimate that led there.
+
+    mode:
+      - "classic": everything selected fits the classic budget; no chunking, no embeddings
+      - "rag": chunk max_files files, embed and keep top_k
+      - "multistage": large repo; wider file/chunk pool, keyword prefilter down to
+        `prefilter` chunks, then embed only that shortlist
+      - "mapreduce": very large repo; one fast-model summary per partition (top-level
+        directory / package), then one reduce call over the partial summaries
+    """
+    mode: str
+    max_files: int = DEFAULT_MAX_FILES
+    max_chunks: int = DEFAULT_MAX_CHUNKS
+    top_k: int = 10
+    prefilter: Optional[int] = None
+    # estimates
+    repo_files: int = 0
+    repo_bytes: int = 0
+    est_content_chars: int = 0
+    est_chunks: int = 0
+    est_cache_hit_ratio: float = 0.0
+    est_embed_inputs: int = 0
+    est_embed_tokens: int = 0
+    est_llm_input_tokens: int = 0
+    est_map_calls: int = 0
+    fingerprints: List[str] = field(default_factory=list, repr=False)
+    # files ranked by select_files while planning; reused for chunking and the classic fallback
+    selected: List[SelectedFile] = field(default_factory=list, repr=False)
+    partitions: List[Partition] = field(default_factory=list, repr=False)
+
+    def summary(self) -> Dict[str, Any]:
+        # repr=False fields are working sets, not estimates
+        return {f.name: getattr(self, f.name) for f in fields(self) if f.repr}
+
+
+def plan_retrieval(
+    index: RepoIndex,
+    embed_model: Optional[str] = None,
+    queries: int = 5,
+    profile: Optional[PerfProfile] = None,
+) -> RetrievalPlan:
+    """Pick classic / rag / multistage / mapreduce from sizes in the repo index.
+
+    File contents are only touched by select_files (its up-to-8 KB sniff of candidate
+    files); everything else is estimated from sizes. Budgets come from `profile`
+    (default: the "balanced" profile). Pass embed_model=None when retrieval will be
+    keyword-only.
+    """
+    if profile is None:
+        profile = resolve_profile()
+    n_files = len(index.files)
+    sizes = {f.path: f.size for f in index.files}
+    tree_chars = min(n_files, TREE_MAX_LINES) * TREE_LINE_CHARS
+
+    selected = select_files(index.root, max_files=profile.max_files, index=index)
+    classic_chars = sum(min(sizes.get(sf.path, 0), context_char_cap(sf.path)) for sf in selected)
+
+    partitions: List[Partition] = []
+    if profile.allow_mapreduce and n_files > _env_int("PLANNER_MAPREDUCE_FILES", 3000):
+        partitions = partition_index(index)
+
+    if tree_chars + classic_chars <= profile.classic_chars:
+        plan = RetrievalPlan(
+            mode="classic",
+            max_files=profile.max_files,
+            max_chunks=profile.max_chunks,
+            est_content_chars=classic_chars,
+            est_llm_input_tokens=(tree_chars + classic_chars) // CHARS_PER_TOKEN,
+        )
+    elif len(partitions) >= 2:
+        # Retrieval would cover a sliver of a repo this size: summarize every partition
+        # concurrently with the fast model, then reduce the partials in one call.
+        map_chars = _env_int("MAPREDUCE_PARTITION_CHARS", 6000)
+        plan = RetrievalPlan(
+            mode="mapreduce",
+            max_files=profile.max_files,
+            max_chunks=profile.max_chunks,
+            est_content_chars=len(partitions) * map_chars,
+            est_map_calls=len(partitions),
+            # reduce call: tree + ~600 chars per partial
+            est_llm_input_tokens=(tree_chars + 600 * len(partitions)) // CHARS_PER_TOKEN,
+        )
+        plan.partitions = partitions
+    else:
+        large = profile.allow_multistage and n_files > _env_int("PLANNER_LARGE_REPO_FILES", 800)
+        if large:
+            # Widen coverage with repo size, but keep the embedded shortlist bounded.
+            max_files = max(profile.max_files, min(_env_int("PLANNER_MAX_FILES", 96), profile.max_files + n_files // 100))
+            selected = select_files(index.root, max_files=max_files, index=index)
+            max_chunks = profile.max_chunks * 3
+            prefilter: Optional[int] = profile.max_chunks
+        else:
+            max_files, max_chunks, prefilter = profile.max_files, profile.max_chunks, None
+
+        content = sum(min(sizes.get(sf.path, 0), RAG_FILE_CHARS) for sf in selected)
+        est_chunks = min(max_chunks, max(1, -(-content // CHUNK_CHARS)))
+        avg_chunk = max(1, min(CHUNK_CHARS, content // est_chunks))
+        top_k = profile.top_k or max(4, min(24, profile.rag_chars // avg_chunk))
+
+        plan = RetrievalPlan(
+            mode="multistage" if large else "rag",
+            max_files=max_files,
+            max_chunks=max_chunks,
+            top_k=top_k,
+            prefilter=prefilter,
+            est_content_chars=content,
+            est_chunks=est_chunks,
+            est_llm_input_tokens=(tree_chars + min(content, profile.rag_chars)) // CHARS_PER_TOKEN,
+        )
+
+        if embed_model:
+            # only reached with embeddings on, i.e. when the optional app.rag imports
+            from .rag import embedded_ratio, file_fingerprint
+
+            plan.fingerprints = [
+                file_fingerprint(embed_model, str(sf.path.relative_to(index.root)), sizes.get(sf.path, 0))
+                for sf in selected
+            ]
+            plan.est_cache_hit_ratio = round(embedded_ratio(plan.fingerprints), 3)
+            embedded = min(est_chunks, prefilter or est_chunks)
+            plan.est_embed_inputs = round(embedded * (1 - plan.est_cache_hit_ratio)) + queries
+            plan.est_embed_tokens = plan.est_embed_inputs * avg_chunk // CHARS_PER_TOKEN
+
+    plan.repo_files = n_files
+    plan.repo_bytes = index.total_bytes
+    plan.selected = selected
+    return plan
+
+
+def record_plan(plan: RetrievalPlan) -> None:
+    metrics.inc(f"planner.mode.{plan.mode}")
+    metrics.inc("planner.est_embed_inputs", plan.est_embed_inputs)
+    metrics.inc("planner.est_llm_input_tokens", plan.est_llm_input_tokens)
+    metrics.inc("planner.est_map_calls", plan.est_map_calls)
+    metrics.set_gauge("planner.last_plan", plan.summary())
@@ -0,0 +1,97 @@
+import os
+from dataclasses import dataclass, fields, replace
+from typing import Any, Dict, List, Optional
+
+
+class ProfileError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class PerfProfile:
+    """Named latency/quality trade-off applied to one /summarize request.
+
+    model_tier picks the LLM model per provider ("fast" / "default" / "thorough",
+    see app.llm.tier_model); `model` pins an explicit one instead.
+    """
+    name: str
+    max_files: int
+    max_chunks: int
+    top_k: Optional[int]          # None: sized by the planner to the RAG budget
+    rag_chars: int
+    classic_chars: int
+    use_embeddings: bool
+    allow_multistage: bool
+    allow_mapreduce: bool
+    model_tier: str
+    model: Optional[str] = None
+
+    def key(self) -> str:
+        """Stable string identifying every knob; part of all result/job cache keys."""
+        return ";".join(f"{f.name}={getattr(self, f.name)}" for f in fields(self))
+
+    def summary(self) -> Dict[str, Any]:
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+
+
+PROFILES: Dict[str, PerfProfile] = {
+    # interactive: no embedding round trips, small budgets, small model
+    "fast": PerfProfile(
+        name="fast",
+        max_files=12,
+        max_chunks=60,
+        top_k=5,
+        rag_chars=8000,
+        classic_chars=12000,
+        use_embeddings=False,
+        allow_multistage=False,
+        allow_mapreduce=False,
+        model_tier="fast",
+    ),
+    # the historical defaults
+    "balanced": PerfProfile(
+        name="balanced",
+        max_files=28,
+        max_chunks=220,
+        top_k=10,
+        rag_chars=14000,
+        classic_chars=22000,
+        use_embeddings=True,
+        allow_multistage=True,
+        allow_mapreduce=True,
+        model_tier="default",
+    ),
+    # batch/catalog jobs: wider retrieval and more context
+    "thorough": PerfProfile(
+        name="thorough",
+        max_files=48,
+        max_chunks=400,
+        top_k=None,
+        rag_chars=24000,
+        classic_chars=30000,
+        use_embeddings=True,
+        allow_multistage=True,
+        allow_mapreduce=True,
+        model_tier="thorough",
+    ),
+}
+
+DEFAULT_MODE = "balanced"
+
+# request fields that may override the named profile
+OVERRIDABLE = ("max_files", "max_chunks", "top_k", "use_embeddings", "model")
+
+
+def allowed_models() -> List[str]:
+    return [m.strip() for m in os.getenv("LLM_ALLOWED_MODELS", "").split(",") if m.strip()]
+
+
+def resolve_profile(mode: Optional[str] = None, **overrides: Any) -> PerfProfile:
+    base = PROFILES.get(mode or DEFAULT_MODE)
+    if base is None:
+        raise ProfileError(f"Unknown mode {mode!r}; expected one of: {', '.join(PROFILES)}.")
+    changes = {k: v for k, v in overrides.items() if k in OVERRIDABLE and v is not None}
+    # clients may only pick models the operator allowed (cost control)
+    if "model" in changes and changes["model"] not in allowed_models():
+        raise ProfileError("model override is not allowed (see LLM_ALLOWED_MODELS).")
+    return replace(base, **changes) if changes else base
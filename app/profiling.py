@@ -0,0 +1,276 @@
+import os
+import re
+import sys
+import time
+import uuid
+import random
+import threading
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Iterator, List, Mapping, Optional
+
+from . import metrics
+
+# Per-request stage timings (seconds), filled by timed() / record_timing() anywhere below
+# a RequestProfile. Tasks and to_thread() calls inherit the dict through the context.
+_TIMINGS: ContextVar[Optional[Dict[str, float]]] = ContextVar("stage_timings", default=None)
+
+# Leaf frames of threads that are merely waiting (idle pool workers, the event loop's select).
+IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def sample_rate() -> float:
+    return min(1.0, max(0.0, _env_float("PROFILE_SAMPLE_RATE", 0.0)))
+
+
+def _dev() -> bool:
+    return os.getenv("ENV", "prod").lower().strip() == "dev"
+
+
+def debug_token() -> str:
+    """DEBUG_TOKEN: /debug/profiles is only served when it is set, and requires it."""
+    return os.getenv("DEBUG_TOKEN", "").strip()
+
+
+def should_sample(headers: Mapping[str, str]) -> bool:
+    """Profile this request? `X-Profile: 1` forces it when ENV=dev; otherwise PROFILE_SAMPLE_RATE."""
+    if _dev() and headers.get("x-profile", "").strip().lower() in {"1", "true", "yes", "on"}:
+        return True
+    rate = sample_rate()
+    return rate > 0 and random.random() < rate
+
+
+# --- Stage timings ---
+
+def record_timing(name: str, seconds: float) -> None:
+    timings = _TIMINGS.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+def current_timings() -> Optional[Dict[str, float]]:
+    """Snapshot of the active request's stage timings (seconds); None outside a request."""
+    timings = _TIMINGS.get()
+    return None if timings is None else dict(timings)
+
+
+@contextmanager
+def timed(name: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(name, time.perf_counter() - started)
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    """Server-Timing header value (durations in ms), e.g. `download;dur=412.0, llm;dur=2310.5`."""
+    return ", ".join(f"{re.sub(r'[^A-Za-z0-9_-]', '_', name)};dur={s * 1000:.1f}" for name, s in timings.items())
+
+
+# --- Sampling profiler ---
+
+class StackSampler:
+    """Samples the Python stacks of all threads every `interval_s` in a daemon thread.
+
+    Cheap enough to leave on for a sampled request, and unlike cProfile it also sees the
+    work done in to_thread() workers. Stacks are aggregated in folded format
+    (`thread;outer;...;leaf count`), ready for flamegraph.pl or speedscope.
+    """
+
+    def __init__(self, interval_s: float = 0.005, max_depth: int = 96):
+        self.interval_s = interval_s
+        self.max_depth = max_depth
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.idle = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval_s):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                leaf = (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name)
+                if leaf in IDLE_LEAVES:
+                    self.idle += 1
+                    continue
+                stack: List[str] = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+                    frame = frame.f_back
+                stack.append(names.get(tid, str(tid)))
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    def folded(self) -> str:
+        return "\n".join(f"{stack} {n}" for stack, n in self.stacks.most_common())
+
+    def top(self, n: int = 15) -> List[Dict[str, Any]]:
+        """Functions by self time (share of busy samples where they are the leaf)."""
+        leaves: Counter = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [{"function": f, "samples": c, "share": round(c / total, 3)} for f, c in leaves.most_common(n)]
+
+
+@dataclass
+class ProfileRecord:
+    id: str
+    path: str
+    label: str
+    started_at: float
+    duration_s: float
+    timings: Dict[str, float]
+    samples: int
+    idle_samples: int
+    interval_s: float
+    top: List[Dict[str, Any]]
+    error: Optional[str] = None
+    folded: str = field(default="", repr=False)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "path": self.path,
+            "label": self.label,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_s * 1000, 1),
+            "timings_ms": {k: round(v * 1000, 1) for k, v in self.timings.items()},
+            "samples": self.samples,
+            "error": self.error,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            **self.summary(),
+            "idle_samples": self.idle_samples,
+            "interval_ms": self.interval_s * 1000,
+            "top": self.top,
+        }
+
+
+class ProfileBuffer:
+    """Bounded ring buffer of recent profiles (oldest dropped first)."""
+
+    def __init__(self, max_entries: int = 20):
+        self._lock = threading.Lock()
+        self._items: Deque[ProfileRecord] = deque(maxlen=max_entries)
+
+    def add(self, record: ProfileRecord) -> None:
+        with self._lock:
+            self._items.append(record)
+
+    def list(self) -> List[ProfileRecord]:
+        with self._lock:
+            return list(reversed(self._items))
+
+    def get(self, profile_id: str) -> Optional[ProfileRecord]:
+        with self._lock:
+            return next((r for r in self._items if r.id == profile_id), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+PROFILES = ProfileBuffer(int(_env_float("PROFILE_BUFFER_SIZE", 20)))
+
+# The sampler sees every thread of the process: profile one request at a time so
+# concurrent profiles don't double the overhead or blur each other.
+_SAMPLER_SLOT = threading.Lock()
+
+
+class RequestProfile:
+    """Stage timings for one request, plus a sampled stack profile when `sample` is set.
+
+    Use as a context manager around the request's work; on exit the profile (if any)
+    lands in PROFILES and `headers()` gives the Server-Timing / X-Profile-Id headers.
+    """
+
+    def __init__(self, path: str, label: str = "", sample: bool = False):
+        self.path = path
+        self.label = label
+        self.sample = sample
+        self.timings: Dict[str, float] = {}
+        self.profile_id: Optional[str] = None
+        self._sampler: Optional[StackSampler] = None
+        self._token = None
+        self._started = 0.0
+        self._wall = 0.0
+
+    def __enter__(self) -> "RequestProfile":
+        self._token = _TIMINGS.set(self.timings)
+        self._started = time.perf_counter()
+        self._wall = time.time()
+        if self.sample:
+            if _SAMPLER_SLOT.acquire(blocking=False):
+                self._sampler = StackSampler(_env_float("PROFILE_INTERVAL_MS", 5.0) / 1000)
+                self._sampler.start()
+            else:
+                metrics.inc("profiles.skipped_busy")
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.timings["total"] = time.perf_counter() - self._started
+        _TIMINGS.reset(self._token)
+        sampler, self._sampler = self._sampler, None
+        if sampler is None:
+            return
+        try:
+            sampler.stop()
+        finally:
+            _SAMPLER_SLOT.release()
+        self.profile_id = uuid.uuid4().hex[:12]
+        PROFILES.add(
+            ProfileRecord(
+                id=self.profile_id,
+                path=self.path,
+                label=self.label,
+                started_at=self._wall,
+                duration_s=self.timings["total"],
+                timings=dict(self.timings),
+                samples=sampler.samples,
+                idle_samples=sampler.idle,
+                interval_s=sampler.interval_s,
+                top=sampler.top(),
+                error=f"{exc_type.__name__}: {exc}" if exc_type is not None else None,
+                folded=sampler.folded(),
+            )
+        )
+        metrics.inc("profiles.captured")
+
+    def timings_ms(self) -> Dict[str, float]:
+        return {k: round(v * 1000, 1) for k, v in self.timings.items()}
+
+    def headers(self) -> Dict[str, str]:
+        headers = {"Server-Timing": server_timing(self.timings)}
+        if self.profile_id:
+            headers["X-Profile-Id"] = self.profile_id
+        return headers
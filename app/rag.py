@@ -2,26 +2,107 @@
 
 import os
 import re
+import ast
+import json
+import zlib
+import asyncio
 import math
 import hashlib
-from dataclasses import dataclass
-from typing import Dict, List, Tuple
+import importlib.util
+from abc import ABC, abstractmethod
+from pathlib import PurePosixPath
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
 import httpx
 
-from .selection import select_files, safe_read_text
+from .clients import get_client
+from .deadline import timeout_for
+from .selection import RepoIndex, SelectedFile, select_files, safe_read_text
+
+
+class SourceText:
+    """UTF-8 buffer of one file's (stripped) text, shared by all chunks cut from it."""
+
+    __slots__ = ("file", "data")
+
+    def __init__(self, file: str, data: bytes):
+        self.file = file
+        self.data = data
 
 
-@dataclass
 class Chunk:
-    file: str
-    text: str
+    """A `[start, end)` byte range of a SourceText.
+
+    Overlapping windows share the file buffer instead of each holding a copy; text is
+    only decoded when needed (embedding, keyword scoring, prompt assembly). Ranges always
+    fall on character boundaries. `Chunk(file, text)` builds a standalone chunk.
+    """
+
+    __slots__ = ("source", "start", "end")
+
+    def __init__(self, file: str, text: str):
+        data = text.encode("utf-8", errors="ignore")
+        self.source = SourceText(file, data)
+        self.start = 0
+        self.end = len(data)
+
+    @classmethod
+    def view(cls, source: SourceText, start: int, end: int) -> "Chunk":
+        c = cls.__new__(cls)
+        c.source, c.start, c.end = source, start, end
+        return c
+
+    @property
+    def file(self) -> str:
+        return self.source.file
+
+    @property
+    def text(self) -> str:
+        return str(memoryview(self.source.data)[self.start:self.end], "utf-8")
+
+    def stripped(self) -> Tuple[int, int]:
+        """Byte range without leading/trailing ASCII whitespace (no copy)."""
+        data, start, end = self.source.data, self.start, self.end
+        while start < end and data[start] in _WS_BYTES:
+            start += 1
+        while end > start and data[end - 1] in _WS_BYTES:
+            end -= 1
+        return start, end
 
+    def stripped_text(self) -> str:
+        start, end = self.stripped()
+        return str(memoryview(self.source.data)[start:end], "utf-8")
 
-# Simple in-memory embedding cache (per-process)
-# key: sha1(model + text) -> vector
+    def digest(self) -> str:
+        """sha1 of the stripped text, hashed straight from the shared buffer."""
+        start, end = self.stripped()
+        return hashlib.sha1(memoryview(self.source.data)[start:end]).hexdigest()
+
+    def __repr__(self) -> str:
+        return f"Chunk({self.file!r}, {self.start}:{self.end})"
+
+
+_WS_BYTES = frozenset(b" \t\n\r\x0b\x0c")
+
+
+# Fixed retrieval questions; their vectors are cached like any other embedding.
+RAG_QUERIES = [
+    "What does this project do?",
+    "How do you install, run, and test this project?",
+    "What is the project structure (src/tests/docs)?",
+    "What API endpoints exist and how are they implemented?",
+    "What are the main dependencies and technologies?",
+]
+
+
+# Simple in-memory embedding cache (per-process), shared by all embedding backends
+# key: sha1(backend model id + text) -> vector
 _EMBED_CACHE: Dict[str, List[float]] = {}
 
+# Fingerprints (model, path, size) of files whose chunks were embedded before.
+# Lets the planner estimate the cache hit ratio from the repo index without reading files.
+_EMBEDDED_FILES: Set[str] = set()
+
 
 class RagError(Exception):
     pass
@@ -51,6 +132,176 @@ def _cosine(a: List[float], b: List[float]) -> float:
     return _dot(a, b) / (na * nb)
 
 
+def _numpy():
+    try:
+        import numpy  # optional: only the local backend and vectorized scoring need it
+    except ImportError as e:  # pragma: no cover
+        raise RagError("numpy is required for the local embedding backend.") from e
+    return numpy
+
+
+def _numpy_available() -> bool:
+    return importlib.util.find_spec("numpy") is not None
+
+
+# --- Embedding backends ---
+
+class EmbeddingBackend(ABC):
+    """Turns texts into vectors. `model` identifies the vector space (cache keys, fingerprints)."""
+
+    name = "base"
+    model = ""
+
+    @abstractmethod
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """One vector per text, in order."""
+
+
+class OpenAIEmbeddings(EmbeddingBackend):
+    """OpenAI /embeddings API (one round trip per batch of cache misses)."""
+
+    name = "openai"
+
+    def __init__(self, api_key: str, base_url: str, model: str):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.model = model
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        url = self.base_url + "embeddings"
+        headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
+
+        r = await get_client("embeddings").post(url, headers=headers, json={"model": self.model, "input": texts}, timeout=timeout_for(90.0))
+
+        if r.status_code >= 400:
+            raise RagError(f"OpenAI embeddings error ({r.status_code}): {r.text[:500]}")
+
+        data = r.json()
+        try:
+            # preserve original order
+            return [item["embedding"] for item in sorted(data["data"], key=lambda x: x["index"])]
+        except Exception as e:
+            raise RagError("Unexpected embeddings response format.") from e
+
+
+# Words too common in both the questions and the code to carry any signal.
+STOPWORDS = {
+    "the", "and", "for", "are", "you", "this", "that", "what", "does", "how", "with",
+    "from", "its", "can", "not", "but", "all", "any", "was", "has", "have", "into",
+}
+
+IDENT_PART_RE = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+")
+
+
+class LocalHashEmbeddings(EmbeddingBackend):
+    """In-process, CPU-only embeddings: signed feature hashing (the "hashing trick").
+
+    Each text becomes a `dim`-sized vector from two hashed feature sets, each normalized
+    then blended: words (identifiers split on camelCase / snake_case, stopwords dropped)
+    and byte trigrams, which match across inflections ("install" / "installation") and
+    partial identifiers. Counts are log-damped. A hash bit picks each feature's sign, so
+    collisions cancel out on average instead of piling up. Trigrams are hashed with NumPy
+    over the whole byte string at once; no network, no model file.
+    """
+
+    name = "local"
+    WORD_WEIGHT = 0.6
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        self.model = f"local-hash-v1-{dim}"
+
+    def _spread(self, np, codes):
+        # splitmix64 finalizer: spreads small / sequential codes over all 64 bits
+        h = codes.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+        h ^= h >> np.uint64(31)
+        h *= np.uint64(0xBF58476D1CE4E5B9)
+        h ^= h >> np.uint64(29)
+        return h
+
+    def _hashed(self, np, codes):
+        vec = np.zeros(self.dim, dtype=np.float64)
+        if len(codes):
+            h = self._spread(np, codes)
+            idx = (h % np.uint64(self.dim)).astype(np.intp)
+            sign = np.where(h >> np.uint64(63), -1.0, 1.0)
+            vec = np.bincount(idx, weights=sign, minlength=self.dim)
+        vec = np.sign(vec) * np.log1p(np.abs(vec))
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def _vector(self, np, text: str):
+        words = [w.lower() for w in IDENT_PART_RE.findall(text)]
+        words = [w for w in words if len(w) > 1 and w not in STOPWORDS]
+        word_codes = np.fromiter((zlib.crc32(w.encode()) for w in words), dtype=np.uint64, count=len(words))
+
+        b = np.frombuffer(text.lower().encode("utf-8", errors="ignore"), dtype=np.uint8).astype(np.uint64)
+        if len(b) >= 3:
+            # offset keeps trigram codes apart from word codes (crc32 < 2**32)
+            tri_codes = (b[:-2] << np.uint64(16) | b[1:-1] << np.uint64(8) | b[2:]) + np.uint64(1 << 32)
+        else:
+            tri_codes = np.zeros(0, dtype=np.uint64)
+
+        vec = self.WORD_WEIGHT * self._hashed(np, word_codes) + (1 - self.WORD_WEIGHT) * self._hashed(np, tri_codes)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def embed_sync(self, texts: List[str]) -> List[List[float]]:
+        np = _numpy()
+        return [self._vector(np, t).astype(np.float32).tolist() for t in texts]
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        # milliseconds per batch, but CPU work all the same: keep it off the event loop
+        return await asyncio.to_thread(self.embed_sync, texts)
+
+
+def _backend_choice() -> str:
+    return os.getenv("EMBEDDING_BACKEND", "auto").strip().lower()
+
+
+def embedding_backend() -> Optional[EmbeddingBackend]:
+    """Backend from EMBEDDING_BACKEND, or None when retrieval is keyword-only.
+
+    - "auto" (default): OpenAI when LLM_PROVIDER=openai and a key is set, else local
+    - "openai" / "local": that backend (None if it isn't usable)
+    - "none": keyword retrieval only
+    """
+    choice = _backend_choice()
+    if choice == "openai" or (choice == "auto" and _provider() == "openai"):
+        try:
+            return OpenAIEmbeddings(*_openai_embed_cfg())
+        except RagError:
+            if choice == "openai":
+                return None
+    if choice in ("local", "auto") and _numpy_available():
+        try:
+            dim = int(os.getenv("LOCAL_EMBEDDING_DIM", "256"))
+        except ValueError:
+            dim = 256
+        return LocalHashEmbeddings(dim=max(16, dim))
+    return None
+
+
+def embedding_model() -> Optional[str]:
+    """Model id of the active embedding backend, or None when retrieval is keyword-only."""
+    backend = embedding_backend()
+    return backend.model if backend is not None else None
+
+
+def file_fingerprint(model: str, rel: str, size: int) -> str:
+    return _sha1(f"{model}\n{rel}\n{size}")
+
+
+def note_embedded(fingerprints: Iterable[str]) -> None:
+    _EMBEDDED_FILES.update(fingerprints)
+
+
+def embedded_ratio(fingerprints: List[str]) -> float:
+    if not fingerprints:
+        return 0.0
+    return sum(1 for f in fingerprints if f in _EMBEDDED_FILES) / len(fingerprints)
+
+
 def _openai_embed_cfg() -> Tuple[str, str, str]:
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
@@ -60,95 +311,323 @@ def _openai_embed_cfg() -> Tuple[str, str, str]:
     return api_key, base_url, model
 
 
-async def _openai_embeddings(texts: List[str]) -> List[List[float]]:
-    api_key, base_url, model = _openai_embed_cfg()
-    url = base_url + "embeddings"
-    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+async def embed_texts(texts: List[str], backend: EmbeddingBackend) -> List[List[float]]:
+    """Embed texts through the per-process cache; only cache misses reach the backend."""
+    keys = [_sha1(backend.model + "\n" + t) for t in texts]
+    need_idx = [i for i, k in enumerate(keys) if k not in _EMBED_CACHE]
+
+    if need_idx:
+        vecs = await backend.embed([texts[i] for i in need_idx])
+        for i, v in zip(need_idx, vecs):
+            _EMBED_CACHE[keys[i]] = v
 
-    async with httpx.AsyncClient() as client:
-        r = await client.post(url, headers=headers, json={"model": model, "input": texts}, timeout=90.0)
+    return [_EMBED_CACHE[k] for k in keys]
 
-    if r.status_code >= 400:
-        raise RagError(f"OpenAI embeddings error ({r.status_code}): {r.text[:500]}")
 
-    data = r.json()
+def best_similarity(chunk_vecs: List[List[float]], query_vecs: List[List[float]]) -> List[float]:
+    """Per chunk, the best cosine similarity to any query (vectorized when numpy is available)."""
+    if not chunk_vecs or not query_vecs:
+        return [0.0] * len(chunk_vecs)
+    if not _numpy_available():
+        return [max(_cosine(cv, qv) for qv in query_vecs) for cv in chunk_vecs]
+    np = _numpy()
+    m = np.asarray(chunk_vecs, dtype=np.float32)
+    q = np.asarray(query_vecs, dtype=np.float32)
+    m_norm = np.linalg.norm(m, axis=1, keepdims=True)
+    q_norm = np.linalg.norm(q, axis=1, keepdims=True)
+    m = np.divide(m, m_norm, out=np.zeros_like(m), where=m_norm > 0)
+    q = np.divide(q, q_norm, out=np.zeros_like(q), where=q_norm > 0)
+    return (m @ q.T).max(axis=1).tolist()
+
+
+async def warm_query_vectors() -> int:
+    """Embed RAG_QUERIES ahead of the first request (no-op for keyword retrieval)."""
+    backend = embedding_backend()
+    if backend is None:
+        return 0
+    await embed_texts(RAG_QUERIES, backend)
+    return len(RAG_QUERIES)
+
+
+def load_embed_cache(path: str) -> int:
+    """Merge a cache persisted by save_embed_cache into memory; returns entries loaded."""
     try:
-        # preserve original order
-        return [item["embedding"] for item in sorted(data["data"], key=lambda x: x["index"])]
-    except Exception as e:
-        raise RagError("Unexpected embeddings response format.") from e
+        with open(path, "r", encoding="utf-8") as fh:
+            data = json.load(fh)
+    except FileNotFoundError:
+        return 0
+    except (OSError, ValueError) as e:
+        raise RagError(f"Could not load embedding cache from {path}: {e}") from e
+    _EMBED_CACHE.update(data)
+    return len(data)
+
+
+def save_embed_cache(path: str) -> int:
+    """Persist the in-memory embedding cache (atomic replace); returns entries written."""
+    snapshot = dict(_EMBED_CACHE)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(snapshot, fh)
+    os.replace(tmp, path)
+    return len(snapshot)
 
 
 def _keyword_score(query: str, text: str) -> float:
+    """Share of the query's words found in `text` (expected lowercased)."""
     q = re.findall(r"[A-Za-z_]{3,}", query.lower())
     if not q:
         return 0.0
-    t = text.lower()
-    hits = sum(1 for w in q if w in t)
+    hits = sum(1 for w in q if w in text)
     return hits / max(1, len(q))
 
 
-def chunk_text(file: str, text: str, chunk_chars: int = 2200, overlap: int = 250) -> List[Chunk]:
-    chunks: List[Chunk] = []
-    s = text.strip()
-    if not s:
-        return chunks
+MARKDOWN_EXTS = {".md", ".markdown", ".mdx"}
+PYTHON_EXTS = {".py", ".pyi"}
+BRACE_EXTS = {
+    ".js", ".jsx", ".mjs", ".cjs", ".ts", ".tsx",
+    ".go", ".java", ".kt", ".scala", ".cs", ".rs", ".swift",
+    ".c", ".h", ".cc", ".cpp", ".hpp", ".php",
+}
+
+MD_HEADING_RE = re.compile(r"^#{1,6}\s", re.MULTILINE)
+MD_FENCE_RE = re.compile(r"^(```|~~~)", re.MULTILINE)
+PY_TOPLEVEL_RE = re.compile(r"^(?:@|(?:async[ \t]+)?def[ \t]|class[ \t])")
+
+
+def _line_offsets(text: str) -> List[int]:
+    """Offset of the first character of every line (index 0 -> line 1)."""
+    offsets = [0]
+    for m in re.finditer("\n", text):
+        offsets.append(m.end())
+    return offsets
+
+
+def _markdown_boundaries(text: str) -> List[int]:
+    fences = [m.start() for m in MD_FENCE_RE.finditer(text)]
+    out: List[int] = []
+    for m in MD_HEADING_RE.finditer(text):
+        # headings inside an open code fence are just code comments
+        if sum(1 for f in fences if f < m.start()) % 2 == 0:
+            out.append(m.start())
+    return out
+
+
+def _python_line_boundaries(text: str) -> List[int]:
+    """Top-level def/class starts (decorators included) by line prefix, for text ast can't parse."""
+    out: List[int] = []
+    offset = 0
+    decorated = False
+    for line in text.splitlines(keepends=True):
+        if PY_TOPLEVEL_RE.match(line):
+            if not decorated:
+                out.append(offset)
+            decorated = line.startswith("@")
+        offset += len(line)
+    return out
+
+
+def _python_boundaries(text: str) -> List[int]:
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError, RecursionError, MemoryError):
+        # e.g. cut mid-statement by safe_read_text's size cap
+        return _python_line_boundaries(text)
+    lines = _line_offsets(text)
+    out: List[int] = []
+    for node in tree.body:
+        first = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+        out.append(lines[first - 1])
+    return out
+
+
+def _brace_boundaries(text: str) -> List[int]:
+    """Line starts that follow a closing brace returning to depth 0.
+
+    Skips string literals and comments so braces inside them don't count.
+    """
+    out: List[int] = []
+    depth = 0
     i = 0
-    n = len(s)
+    n = len(text)
     while i < n:
-        j = min(n, i + chunk_chars)
-        part = s[i:j]
-        chunks.append(Chunk(file=file, text=part))
-        if j == n:
+        ch = text[i]
+        if ch in "\"'`":
+            j = i + 1
+            while j < n and text[j] != ch:
+                if text[j] == "\\":
+                    j += 1
+                elif text[j] == "\n" and ch != "`":
+                    break
+                j += 1
+            i = j + 1
+            continue
+        if text.startswith("//", i):
+            j = text.find("\n", i)
+            i = n if j == -1 else j
+            continue
+        if text.startswith("/*", i):
+            j = text.find("*/", i + 2)
+            i = n if j == -1 else j + 2
+            continue
+        if ch == "{":
+            depth += 1
+        elif ch == "}" and depth > 0:
+            depth -= 1
+            if depth == 0:
+                j = text.find("\n", i)
+                if j != -1:
+                    out.append(j + 1)
+        i += 1
+    return out
+
+
+def _structural_boundaries(file: str, text: str) -> List[int]:
+    ext = PurePosixPath(file).suffix.lower()
+    if ext in MARKDOWN_EXTS:
+        return _markdown_boundaries(text)
+    if ext in PYTHON_EXTS:
+        return _python_boundaries(text)
+    if ext in BRACE_EXTS:
+        return _brace_boundaries(text)
+    return []
+
+
+NON_WS_RE = re.compile(r"\S")
+
+
+def _window(s: str, start: int, end: int, chunk_chars: int, overlap: int) -> List[Tuple[int, int]]:
+    """Fixed-size windows with overlap; used for unstructured text and oversized blocks."""
+    spans: List[Tuple[int, int]] = []
+    i = start
+    while i < end:
+        j = min(end, i + chunk_chars)
+        if NON_WS_RE.search(s, i, j):
+            spans.append((i, j))
+        if j == end:
             break
-        i = max(0, j - overlap)
-    return chunks
+        i = max(start, j - overlap)
+    return spans
+
 
+def _byte_offsets(s: str, offsets: Iterable[int]) -> Dict[int, int]:
+    """Char offset -> UTF-8 byte offset, encoding each stretch between offsets once."""
+    out: Dict[int, int] = {}
+    prev_char = prev_byte = 0
+    for off in sorted(set(offsets)):
+        prev_byte += len(s[prev_char:off].encode("utf-8", errors="ignore"))
+        prev_char = off
+        out[off] = prev_byte
+    return out
+
+
+def chunk_text(file: str, text: str, chunk_chars: int = 2200, overlap: int = 250) -> List[Chunk]:
+    """Split text on syntactic boundaries, packing adjacent blocks up to chunk_chars.
+
+    Markdown splits at headings, Python at top-level statements (via `ast`), and
+    brace languages at blocks closing back to depth 0. Files without structure, and
+    single blocks larger than chunk_chars, fall back to overlapping windows.
+    Sizes are in characters; the chunks are views into one buffer per file.
+    """
+    s = text.strip()
+    if not s:
+        return []
+    n = len(s)
 
-def build_chunks(repo_root) -> List[Chunk]:
-    """Select important files and chunk them."""
-    selected = select_files(repo_root, max_files=28)
+    points = sorted({p for p in _structural_boundaries(file, s) if 0 < p < n})
+    spans: List[Tuple[int, int]] = []
+    if not points:
+        spans = _window(s, 0, n, chunk_chars, overlap)
+    else:
+        bounds = [0] + points + [n]
+        cur = 0  # start of the chunk being packed
+        for a, b in zip(bounds, bounds[1:]):
+            if b - a > chunk_chars:
+                if cur < a:
+                    spans.extend(_window(s, cur, a, chunk_chars, overlap))
+                spans.extend(_window(s, a, b, chunk_chars, overlap))
+                cur = b
+            elif b - cur > chunk_chars:
+                spans.extend(_window(s, cur, a, chunk_chars, overlap))
+                cur = a
+        if cur < n:
+            spans.extend(_window(s, cur, n, chunk_chars, overlap))
+
+    if s.isascii():
+        source = SourceText(file, s.encode("ascii"))
+        return [Chunk.view(source, i, j) for i, j in spans]
+    source = SourceText(file, s.encode("utf-8", errors="ignore"))
+    to_byte = _byte_offsets(s, (x for span in spans for x in span))
+    return [Chunk.view(source, to_byte[i], to_byte[j]) for i, j in spans]
+
+
+def chunk_key(c: Chunk) -> str:
+    """Content hash used to dedupe identical chunks across files."""
+    return c.digest()
+
+
+def build_chunks(
+    repo_root,
+    max_files: int = 28,
+    max_chunks: int = 220,
+    index: Optional[RepoIndex] = None,
+    selected: Optional[List[SelectedFile]] = None,
+) -> List[Chunk]:
+    """Select important files (unless `selected` is given), chunk them and drop duplicate chunks across files."""
+    if selected is None:
+        selected = select_files(repo_root, max_files=max_files, index=index)
     all_chunks: List[Chunk] = []
+    seen = set()
     for sf in selected:
         rel = str(sf.path.relative_to(repo_root))
         txt = safe_read_text(sf.path, max_chars=12000)
-        all_chunks.extend(chunk_text(rel, txt))
-        if len(all_chunks) > 220:
+        for c in chunk_text(rel, txt):
+            # vendored / copied files (LICENSE, shared configs) are embedded and ranked once
+            k = chunk_key(c)
+            if k in seen:
+                continue
+            seen.add(k)
+            all_chunks.append(c)
+        if len(all_chunks) > max_chunks:
             break
-    return all_chunks[:220]
-
-
-async def rag_select(chunks: List[Chunk], queries: List[str], top_k: int = 10) -> List[Chunk]:
-    """OpenAI: embeddings semantic retrieval; otherwise keyword fallback."""
-    provider = _provider()
-
-    if provider == "openai":
-        _, _, model = _openai_embed_cfg()
+    return all_chunks[:max_chunks]
 
-        texts = [c.text for c in chunks]
-        keys = [_sha1(model + "\n" + t) for t in texts]
-        need_idx = [i for i, k in enumerate(keys) if k not in _EMBED_CACHE]
-
-        if need_idx:
-            vecs = await _openai_embeddings([texts[i] for i in need_idx])
-            for i, v in zip(need_idx, vecs):
-                _EMBED_CACHE[keys[i]] = v
-
-        chunk_vecs = [_EMBED_CACHE[k] for k in keys]
-        q_vecs = await _openai_embeddings(queries)
-
-        scored: List[Tuple[float, int]] = []
-        for i, cv in enumerate(chunk_vecs):
-            best = max(_cosine(cv, qv) for qv in q_vecs)
-            scored.append((best, i))
-
-        scored.sort(reverse=True, key=lambda x: x[0])
-        return [chunks[i] for _, i in scored[:top_k]]
 
+def _keyword_rank(chunks: List[Chunk], queries: List[str]) -> List[int]:
     scored: List[Tuple[float, int]] = []
     for i, c in enumerate(chunks):
-        best = max(_keyword_score(q, c.text) for q in queries)
+        text = c.text.lower()
+        best = max(_keyword_score(q, text) for q in queries)
         scored.append((best, i))
-
     scored.sort(reverse=True, key=lambda x: x[0])
-    return [chunks[i] for _, i in scored[:top_k]]
\ No newline at end of file
+    return [i for _, i in scored]
+
+
+async def rag_select(
+    chunks: List[Chunk],
+    queries: List[str],
+    top_k: int = 10,
+    prefilter: Optional[int] = None,
+    use_embeddings: bool = True,
+) -> List[Chunk]:
+    """Semantic retrieval through the embedding backend; keyword ranking without one (or with use_embeddings=False).
+
+    With `prefilter`, a cheap keyword pass first narrows the pool to that many chunks,
+    so only the shortlist is embedded (multi-stage retrieval for large repos).
+    """
+    backend = embedding_backend() if use_embeddings else None
+
+    if backend is not None:
+        if prefilter is not None and len(chunks) > prefilter:
+            chunks = [chunks[i] for i in _keyword_rank(chunks, queries)[:prefilter]]
+
+        # chunk and query embeddings are independent round trips: issue them together
+        chunk_vecs, q_vecs = await asyncio.gather(
+            embed_texts([c.text for c in chunks], backend),
+            embed_texts(queries, backend),
+        )
+
+        scores = best_similarity(chunk_vecs, q_vecs)
+        order = sorted(range(len(chunks)), key=lambda i: scores[i], reverse=True)
+        return [chunks[i] for i in order[:top_k]]
+
+    return [chunks[i] for i in _keyword_rank(chunks, queries)[:top_k]]
@@ -1,13 +1,68 @@
+from typing import Any, Dict, List, Literal, Optional
+
 from pydantic import BaseModel, Field, HttpUrl
 
 class SummarizeRequest(BaseModel):
     github_url: HttpUrl = Field(..., description="URL of a public GitHub repository")
+    mode: Literal["fast", "balanced", "thorough"] = Field(
+        "balanced", description="Performance profile: fast (seconds, no embeddings), balanced, thorough (widest retrieval)"
+    )
+    # Optional overrides on top of the selected profile
+    max_files: Optional[int] = Field(None, ge=1, le=200, description="Files considered for context")
+    max_chunks: Optional[int] = Field(None, ge=1, le=2000, description="Chunk pool size for retrieval")
+    top_k: Optional[int] = Field(None, ge=1, le=50, description="Chunks kept after retrieval")
+    use_embeddings: Optional[bool] = Field(None, description="Semantic (embeddings) vs keyword retrieval")
+    model: Optional[str] = Field(None, max_length=200, description="LLM model (must be in LLM_ALLOWED_MODELS)")
+
+class ResponseMeta(BaseModel):
+    mode: str
+    profile: Dict[str, Any]
+    retrieval_mode: str
+    commit: Optional[str] = None
+    cached: bool = False
+    timings: Optional[Dict[str, float]] = Field(None, description="Per-stage wall time of this request (ms)")
+    profile_id: Optional[str] = Field(None, description="Sampled profile id, see GET /debug/profiles/{id}")
+    degraded: Optional[List[str]] = Field(
+        None, description="Shortcuts taken to meet the request deadline: skip_rag, small_context, fast_model"
+    )
 
 class SummarizeResponse(BaseModel):
     summary: str
     technologies: list[str]
     structure: str
+    meta: Optional[ResponseMeta] = None
 
 class ErrorResponse(BaseModel):
     status: str = "error"
-    message: str
\ No newline at end of file
+    message: str
+
+class JobAccepted(BaseModel):
+    job_id: str
+    status: str
+    deadline_s: Optional[float] = Field(None, description="Budget of the job run (JOB_DEADLINE_S); None = no deadline")
+
+class JobStatus(BaseModel):
+    job_id: str
+    status: str = Field(..., description="queued | running | done | error")
+    stage: str = Field(..., description="Current pipeline step, for progress display")
+    result: Optional[SummarizeResponse] = None
+    error: Optional[Dict[str, Any]] = None
+    created: float
+    updated: float
+
+class ResolvedRepo(BaseModel):
+    owner: str
+    repo: str
+    branch: str
+    commit: str
+
+class RefreshRequest(BaseModel):
+    github_url: HttpUrl = Field(..., description="URL of a public GitHub repository")
+    mode: Optional[Literal["fast", "balanced", "thorough"]] = Field(
+        None, description="Profile to refresh; default: every profile requested for this repo (balanced if none)"
+    )
+
+class RefreshAccepted(BaseModel):
+    owner: str
+    repo: str
+    modes: list[str]
@@ -1,7 +1,7 @@
-import os, re
+import os, re, codecs
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Iterable, List, Tuple
+from typing import Iterable, List, Optional, Tuple
 
 # Ignore bulky / irrelevant folders and files
 IGNORE_DIRS = {
@@ -17,7 +17,9 @@ IGNORE_EXTS = {
     ".mp4", ".mov", ".avi", ".mp3",
     ".exe", ".dll", ".so", ".dylib",
     ".class", ".jar",
-    ".bin",
+    ".bin", ".wasm", ".pb", ".pyc", ".o", ".a",
+    ".woff", ".woff2", ".ttf", ".otf", ".eot",
+    ".sqlite", ".db", ".parquet", ".npy", ".pkl",
 }
 
 IGNORE_FILES_EXACT = {
@@ -44,6 +46,25 @@ IMPORTANT_CONFIG_NAMES = [
 
 CODE_EXTS = {".py", ".js", ".ts", ".tsx", ".java", ".go", ".rs", ".cs", ".rb", ".php"}
 
+# Line-length heuristics only apply here: prose (.md/.rst/.txt) often has one paragraph per line
+MINIFIABLE_EXTS = CODE_EXTS | {".jsx", ".mjs", ".cjs", ".css", ".scss", ".less", ".json", ".html", ".svg", ".xml"}
+
+# Names that are almost always build output even when they slip past IGNORE_DIRS
+MINIFIED_SUFFIXES = (".min.js", ".min.css", ".bundle.js", ".js.map", ".css.map")
+
+# Markers commonly placed in the header of generated sources
+GENERATED_MARKERS = (
+    "@generated", "do not edit", "auto-generated", "autogenerated",
+    "code generated by", "generated by the protocol buffer compiler",
+)
+
+SNIFF_BYTES = 8192
+READ_BLOCK_BYTES = 65536
+
+# Demotion applied by score_file to minified / generated files
+MINIFIED_PENALTY = 700
+GENERATED_PENALTY = 500
+
 
 @dataclass
 class SelectedFile:
@@ -51,6 +72,75 @@ class SelectedFile:
     score: int
 
 
+@dataclass(frozen=True)
+class IndexedFile:
+    path: Path
+    rel: Path
+    size: int
+
+
+@dataclass
+class RepoIndex:
+    """One walk over the repo: every non-ignored file with its size."""
+    root: Path
+    files: List[IndexedFile]
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(f.size for f in self.files)
+
+
+@dataclass(frozen=True)
+class FileSniff:
+    """Signals derived from a small prefix of a file (see sniff_file)."""
+    binary: bool = False
+    minified: bool = False
+    generated: bool = False
+
+
+def _looks_binary(sample: bytes) -> bool:
+    if not sample:
+        return False
+    if b"\x00" in sample:
+        return True
+    # Control bytes other than common whitespace are rare in text files.
+    # UTF-8 multibyte sequences are >= 0x80, so they are not counted here.
+    ctrl = sum(1 for b in sample if b < 32 and b not in (9, 10, 12, 13, 27))
+    return ctrl / len(sample) > 0.10
+
+
+def _looks_minified(sample: str) -> bool:
+    lines = sample.splitlines()
+    if not lines:
+        return False
+    longest = max(len(line) for line in lines)
+    # A full sniff window with (almost) no line breaks, or very long average lines
+    if longest >= 1000:
+        return True
+    return len(sample) >= 2000 and len(sample) / len(lines) > 300
+
+
+def sniff_file(path: Path, sample_bytes: int = SNIFF_BYTES) -> FileSniff:
+    """Classify a file as binary / minified / generated from its first bytes only."""
+    lower_name = path.name.lower()
+    minified_by_name = lower_name.endswith(MINIFIED_SUFFIXES)
+    try:
+        with path.open("rb") as fh:
+            sample = fh.read(sample_bytes)
+    except OSError:
+        return FileSniff(binary=True)
+
+    if _looks_binary(sample):
+        return FileSniff(binary=True)
+
+    text = sample.decode("utf-8", errors="replace")
+    head = text[:2048].lower()
+    return FileSniff(
+        minified=minified_by_name or (path.suffix.lower() in MINIFIABLE_EXTS and _looks_minified(text)),
+        generated=any(m in head for m in GENERATED_MARKERS),
+    )
+
+
 def is_ignored_path(p: Path) -> bool:
     # directory ignore
     for part in p.parts:
@@ -94,7 +184,7 @@ def build_tree(repo_root: Path, max_depth: int = 4, max_entries: int = 400) -> s
     return "\n".join(lines)
 
 
-def score_file(repo_root: Path, f: Path) -> int:
+def score_file(repo_root: Path, f: Path, sniff: Optional[FileSniff] = None) -> int:
     rel = f.relative_to(repo_root)
     name = f.name
     score = 0
@@ -130,11 +220,18 @@ def score_file(repo_root: Path, f: Path) -> int:
     # penalize very deep paths
     score -= 10 * max(0, len(rel.parts) - 5)
 
+    # content signals from the prefix sniff: bundles and generated code carry little signal
+    if sniff is not None:
+        if sniff.minified:
+            score -= MINIFIED_PENALTY
+        if sniff.generated:
+            score -= GENERATED_PENALTY
+
     return score
 
 
-def select_files(repo_root: Path, max_files: int = 28) -> List[SelectedFile]:
-    candidates: List[SelectedFile] = []
+def index_repo(repo_root: Path) -> RepoIndex:
+    files: List[IndexedFile] = []
     for p in repo_root.rglob("*"):
         if not p.is_file():
             continue
@@ -142,42 +239,116 @@ def select_files(repo_root: Path, max_files: int = 28) -> List[SelectedFile]:
         if is_ignored_path(rel):
             continue
         try:
-            # skip huge files
-            if p.stat().st_size > 350_000:
-                continue
+            size = p.stat().st_size
         except OSError:
             continue
+        files.append(IndexedFile(path=p, rel=rel, size=size))
+    return RepoIndex(root=repo_root, files=files)
 
-        candidates.append(SelectedFile(path=p, score=score_file(repo_root, p)))
+
+def select_files(repo_root: Path, max_files: int = 28, index: Optional[RepoIndex] = None) -> List[SelectedFile]:
+    if index is None:
+        index = index_repo(repo_root)
+
+    candidates: List[SelectedFile] = []
+    for f in index.files:
+        # skip huge files
+        if f.size > 350_000:
+            continue
+        candidates.append(SelectedFile(path=f.path, score=score_file(repo_root, f.path)))
 
     candidates.sort(key=lambda x: x.score, reverse=True)
-    return candidates[:max_files]
+    return _rescore_with_sniff(repo_root, candidates, max_files)
+
+
+def _rescore_with_sniff(repo_root: Path, ranked: List[SelectedFile], max_files: int) -> List[SelectedFile]:
+    """Sniff candidates in score order, dropping binaries and demoting minified/generated files.
+
+    Sniffing only ever lowers a score, so once `max_files` files came through clean,
+    nothing further down the list can overtake them and the walk stops early.
+    """
+    kept: List[SelectedFile] = []
+    clean = 0
+    for sf in ranked:
+        if clean >= max_files:
+            break
+        sniff = sniff_file(sf.path)
+        if sniff.binary:
+            continue
+        if sniff.minified or sniff.generated:
+            kept.append(SelectedFile(path=sf.path, score=score_file(repo_root, sf.path, sniff)))
+        else:
+            kept.append(sf)
+            clean += 1
+
+    kept.sort(key=lambda x: x.score, reverse=True)
+    return kept[:max_files]
+
+
+def context_char_cap(p: Path) -> int:
+    """Per-file character budget when a file is pasted whole into the LLM context."""
+    name = p.name.lower()
+    if "readme" in name:
+        return 6000
+    if name in {"pyproject.toml", "requirements.txt", "package.json"}:
+        return 3000
+    if name.startswith(("openapi", "swagger")):
+        return 4000
+    return 2000
+
+
+def _read_decoded(fh, encoding: str, max_chars: int) -> str:
+    """Incrementally decode `fh` until more than `max_chars` characters are available (bad bytes -> U+FFFD)."""
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    parts: List[str] = []
+    total = 0
+    while total <= max_chars:
+        block = fh.read(READ_BLOCK_BYTES)
+        if not block:
+            tail = decoder.decode(b"", final=True)
+            parts.append(tail)
+            total += len(tail)
+            break
+        piece = decoder.decode(block)
+        parts.append(piece)
+        total += len(piece)
+    return "".join(parts)
 
 
 def safe_read_text(path: Path, max_chars: int) -> str:
+    """Read at most ~max_chars characters of text without loading the whole file.
+
+    Decodes UTF-8 incrementally, block by block. Only when more than 1% of the kept
+    prefix is undecodable (a legacy 8-bit file, not a stray byte) is it re-read as
+    latin-1 (which never fails and is 1 byte per char). Binary content is never returned.
+    """
     try:
-        data = path.read_text(encoding="utf-8", errors="replace")
-    except Exception:
-        try:
-            data = path.read_text(encoding="latin-1", errors="replace")
-        except Exception:
-            return ""
+        with path.open("rb") as fh:
+            if _looks_binary(fh.read(SNIFF_BYTES)):
+                return ""
+            fh.seek(0)
+            data = _read_decoded(fh, "utf-8", max_chars)
+            bad = data.count("\ufffd", 0, max_chars)
+            if bad and bad * 100 > min(len(data), max_chars):
+                fh.seek(0)
+                data = fh.read(max_chars + 1).decode("latin-1")
+    except OSError:
+        return ""
     if len(data) > max_chars:
         return data[:max_chars] + "\n... (truncated)"
     return data
 
 
-def detect_languages_and_tools(repo_root: Path) -> List[str]:
+def detect_languages_and_tools(repo_root: Path, index: Optional[RepoIndex] = None) -> List[str]:
     # lightweight detection via extensions + common files
     langs = set()
     exts = set()
 
-    for p in repo_root.rglob("*"):
-        if not p.is_file():
-            continue
-        rel = p.relative_to(repo_root)
-        if is_ignored_path(rel):
-            continue
+    if index is None:
+        index = index_repo(repo_root)
+
+    for f in index.files:
+        p = f.path
         exts.add(p.suffix.lower())
         if p.name == "pyproject.toml" or p.name == "requirements.txt" or p.name == "setup.py":
             langs.add("Python")
@@ -0,0 +1,228 @@
+import os
+import re
+import hashlib
+import time
+import uuid
+import shutil
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+TMP_PREFIX = ".tmp-"
+TRASH_PREFIX = ".trash-"
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _dir_size(path: Path) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def _repo_root(path: Path) -> Path:
+    # GitHub zipball contains a single top-level directory
+    children = [p for p in path.iterdir() if p.is_dir()]
+    return children[0] if len(children) == 1 else path
+
+
+@dataclass
+class _Entry:
+    path: Path
+    size: int
+    refs: int = 0
+    last_used: float = 0.0
+
+
+class Snapshot:
+    """A pinned snapshot: the tree stays on disk until release() is called."""
+
+    def __init__(self, store: "SnapshotStore", key: str, path: Path):
+        self._store = store
+        self.key = key
+        self.path = path
+        self.repo_root = _repo_root(path)
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._store._release(self.key)
+
+
+class SnapshotStore:
+    """Extracted repo trees on local disk, keyed by (owner, repo, sha).
+
+    - LRU eviction once the total size exceeds `max_bytes`; pinned snapshots are never evicted.
+    - Safe under concurrent requests: reference counts pin snapshots in use, concurrent
+      misses for the same key share one download, and new snapshots are populated in a
+      temp dir and published with an atomic rename.
+    - Evicted snapshots are renamed out of the way (atomic) and deleted by a background
+      thread, off the request path.
+    """
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._reaper = ThreadPoolExecutor(max_workers=1, thread_name_prefix="snapshot-reaper")
+        self._load_existing()
+
+    @staticmethod
+    def key(owner: str, repo: str, sha: str, subpath: str = "") -> str:
+        raw = f"{owner}__{repo}__{sha}".lower()
+        if subpath:
+            # scoped snapshots hold only their subtree; the hash keeps distinct paths apart
+            raw += "__" + hashlib.sha1(subpath.encode("utf-8")).hexdigest()[:12]
+        return re.sub(r"[^a-z0-9_.-]", "_", raw)
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(e.size for e in self._entries.values())
+
+    def _load_existing(self) -> None:
+        leftovers = []
+        found = []
+        for p in self.root.iterdir():
+            if not p.is_dir():
+                continue
+            if p.name.startswith((TMP_PREFIX, TRASH_PREFIX)):
+                leftovers.append(p)
+            else:
+                found.append((p.stat().st_mtime, p))
+        # oldest first, so the LRU order survives restarts
+        for mtime, p in sorted(found):
+            self._entries[p.name] = _Entry(path=p, size=_dir_size(p), last_used=mtime)
+        for p in leftovers:
+            self._reaper.submit(shutil.rmtree, p, True)
+        self._publish_metrics()
+
+    async def acquire(self, key: str, populate: Callable[[Path], Awaitable[None]]) -> Snapshot:
+        """Return a pinned snapshot for `key`, calling `populate(tmp_dir)` on a miss."""
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry.refs += 1
+                    entry.last_used = time.time()
+                    self._entries.move_to_end(key)
+                    metrics.inc("snapshots.hit")
+                    return Snapshot(self, key, entry.path)
+                waiter = self._inflight.get(key)
+                if waiter is None:
+                    waiter = asyncio.get_running_loop().create_future()
+                    self._inflight[key] = waiter
+                    break
+            # Another request is populating this key: wait for it, then retry the lookup.
+            try:
+                await asyncio.shield(waiter)
+            except Exception:
+                pass
+
+        metrics.inc("snapshots.miss")
+        tmp = self.root / f"{TMP_PREFIX}{uuid.uuid4().hex}"
+        try:
+            tmp.mkdir()
+            await populate(tmp)
+            size = await asyncio.to_thread(_dir_size, tmp)
+            final = self.root / key
+            try:
+                os.rename(tmp, final)
+            except OSError:
+                # Published concurrently (e.g. by another worker process): keep theirs.
+                self._reaper.submit(shutil.rmtree, tmp, True)
+                size = await asyncio.to_thread(_dir_size, final)
+            with self._lock:
+                self._entries[key] = _Entry(path=final, size=size, refs=1, last_used=time.time())
+            self._evict()
+            waiter.set_result(None)
+            return Snapshot(self, key, final)
+        except BaseException as e:
+            self._reaper.submit(shutil.rmtree, tmp, True)
+            if not waiter.done():
+                waiter.set_exception(SnapshotError(f"Populating snapshot {key} failed: {e}"))
+                waiter.exception()  # mark retrieved; waiters retry on their own
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _release(self, key: str) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.refs > 0:
+                entry.refs -= 1
+        self._evict()
+
+    def _evict(self) -> None:
+        doomed = []
+        with self._lock:
+            total = sum(e.size for e in self._entries.values())
+            for key in list(self._entries):
+                if total <= self.max_bytes:
+                    break
+                entry = self._entries[key]
+                if entry.refs > 0:
+                    continue
+                trash = self.root / f"{TRASH_PREFIX}{uuid.uuid4().hex}"
+                try:
+                    os.rename(entry.path, trash)
+                except OSError:
+                    logger.warning("Could not evict snapshot %s", entry.path)
+                    continue
+                del self._entries[key]
+                total -= entry.size
+                doomed.append(trash)
+        for trash in doomed:
+            metrics.inc("snapshots.evicted")
+            self._reaper.submit(shutil.rmtree, trash, True)
+        self._publish_metrics()
+
+    def _publish_metrics(self) -> None:
+        with self._lock:
+            metrics.set_gauge("snapshots.count", len(self._entries))
+            metrics.set_gauge("snapshots.bytes", sum(e.size for e in self._entries.values()))
+
+    def drain(self) -> None:
+        """Wait for pending background deletions (shutdown / tests)."""
+        self._reaper.submit(lambda: None).result()
+
+
+_STORE: Optional[SnapshotStore] = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_snapshot_store() -> Optional[SnapshotStore]:
+    """Process-wide store from SNAPSHOT_DIR / SNAPSHOT_MAX_BYTES; None when SNAPSHOT_DIR is unset."""
+    global _STORE
+    root = os.getenv("SNAPSHOT_DIR", "").strip()
+    if not root:
+        return None
+    with _STORE_LOCK:
+        if _STORE is None or _STORE.root != Path(root):
+            try:
+                max_bytes = int(os.getenv("SNAPSHOT_MAX_BYTES", str(2 * 1024 ** 3)))
+            except ValueError:
+                max_bytes = 2 * 1024 ** 3
+            _STORE = SnapshotStore(Path(root), max_bytes)
+        return _STORE
@@ -1,51 +1,99 @@
+import os
 import json
-import re
+import asyncio
 import logging
+from dataclasses import replace
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 logger = logging.getLogger(__name__)
 
-from .selection import build_tree, select_files, safe_read_text, detect_languages_and_tools
-from .llm import chat_completion, LLMError
+from .selection import (
+    RepoIndex,
+    SelectedFile,
+    build_tree,
+    context_char_cap,
+    detect_languages_and_tools,
+    index_repo,
+    safe_read_text,
+    select_files,
+)
+from .llm import chat_completion, json_answer_max_tokens, primary_model, LLMError
+from .deadline import DeadlineExceeded, expired, remaining
+from .jsonscan import find_json_object
+from .planner import CLASSIC_BUDGET_CHARS, RAG_BUDGET_CHARS, RetrievalPlan, plan_retrieval, record_plan
+from .mapreduce import Partition, reduce_context, summarize_partitions
+from .pipeline import Stage, run_stages
+from .profiling import record_timing, timed
+from .profiles import PerfProfile, resolve_profile
 
 # RAG chunk retrieval (top-K relevant snippets). If app/rag.py is missing or disabled,
 # summarization will fall back to the classic context builder.
 try:
-    from .rag import build_chunks, rag_select  # type: ignore
+    from .rag import build_chunks, rag_select, embedding_model, note_embedded, RAG_QUERIES  # type: ignore
 except Exception:  # pragma: no cover
+    RAG_QUERIES = []
     build_chunks = None
     rag_select = None
+    embedding_model = None
+    note_embedded = None
 
 
 class SummarizationError(Exception):
     pass
 
 
-JSON_BLOCK_RE = re.compile(r"\{.*\}", re.DOTALL)
+# Bump whenever the prompt changes: it is part of the result cache key.
+PROMPT_VERSION = "1"
 
 
-def build_context(repo_root: Path, max_total_chars: int = 22000) -> str:
+def result_key(owner: str, repo: str, sha: str, profile: PerfProfile, subpath: str = "") -> tuple:
+    """Result cache key. The profile (and prompt version) are part of it: a fast answer never serves a thorough request.
+
+    The commit pins the ref, so only the subpath needs to be added for scoped summaries.
+    """
+    return (owner.lower(), repo.lower(), sha, subpath, profile.key(), PROMPT_VERSION)
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def _low_budget(threshold_env: str, default: float) -> bool:
+    """Is less than `threshold_env` seconds left of the request's deadline?"""
+    left = remaining()
+    return left is not None and left < _env_float(threshold_env, default)
+
+
+def build_context(
+    repo_root: Path,
+    max_total_chars: int = CLASSIC_BUDGET_CHARS,
+    index: Optional[RepoIndex] = None,
+    tree: Optional[str] = None,
+    selected: Optional[List[SelectedFile]] = None,
+    max_files: int = 28,
+) -> str:
+    """Classic context: directory tree + whole (capped) top files.
+
+    `tree` and `selected` let the pipeline pass in work it already did.
+    """
     parts: List[str] = []
-    tree = build_tree(repo_root, max_depth=4)
+    if tree is None:
+        tree = build_tree(repo_root, max_depth=4)
     parts.append("=== DIRECTORY TREE (truncated) ===\n" + tree)
 
-    selected = select_files(repo_root, max_files=28)
-
-    def per_file_cap(p: Path) -> int:
-        name = p.name.lower()
-        if "readme" in name:
-            return 6000
-        if name in {"pyproject.toml", "requirements.txt", "package.json"}:
-            return 3000
-        if name.startswith(("openapi", "swagger")):
-            return 4000
-        return 2000
+    if selected is None:
+        selected = select_files(repo_root, max_files=max_files, index=index)
+    else:
+        selected = selected[:max_files]
 
     total = sum(len(x) for x in parts)
     for sf in selected:
         rel = sf.path.relative_to(repo_root)
-        text = safe_read_text(sf.path, max_chars=per_file_cap(sf.path))
+        text = safe_read_text(sf.path, max_chars=context_char_cap(sf.path))
         if not text.strip():
             continue
         chunk = f"\n\n=== FILE: {rel} ===\n{text}"
@@ -57,7 +105,13 @@ def build_context(repo_root: Path, max_total_chars: int = 22000) -> str:
     return "\n".join(parts)
 
 
-async def build_rag_context(repo_root: Path, max_chars: int = 14000) -> tuple[str, List[str]]:
+async def build_rag_context(
+    repo_root: Path,
+    max_chars: int = RAG_BUDGET_CHARS,
+    plan: Optional[RetrievalPlan] = None,
+    index: Optional[RepoIndex] = None,
+    use_embeddings: bool = True,
+) -> tuple[str, List[str]]:
     """Build a compact context using RAG-selected chunks.
 
     Returns: (context_text, evidence_files)
@@ -68,28 +122,40 @@ async def build_rag_context(repo_root: Path, max_chars: int = 14000) -> tuple[st
 
     # If anything in retrieval fails (embeddings/network/etc.), do NOT crash the request.
     # Return an empty context so caller falls back to classic mode.
+    if plan is None:
+        plan = RetrievalPlan(mode="rag")
+
+    if _low_budget("DEADLINE_SKIP_RAG_S", 45.0):
+        # chunking + embedding round trips won't fit: let the caller use the classic context
+        return "", []
+
     try:
-        chunks = build_chunks(repo_root)
-        queries = [
-            "What does this project do?",
-            "How do you install, run, and test this project?",
-            "What is the project structure (src/tests/docs)?",
-            "What API endpoints exist and how are they implemented?",
-            "What are the main dependencies and technologies?",
-        ]
-        picked = await rag_select(chunks, queries, top_k=10)
+        # chunking reads files: keep it off the event loop
+        chunks = await asyncio.to_thread(
+            build_chunks,
+            repo_root,
+            max_files=plan.max_files,
+            max_chunks=plan.max_chunks,
+            index=index,
+            selected=plan.selected or None,
+        )
+        picked = await rag_select(
+            chunks, RAG_QUERIES, top_k=plan.top_k, prefilter=plan.prefilter, use_embeddings=use_embeddings
+        )
 
         evidence: List[str] = []
         parts: List[str] = []
         total = 0
 
+        # Pieces are joined once at the end; each chunk's text is decoded exactly once.
         for c in picked:
             evidence.append(c.file)
-            chunk = f"\n\n=== RAG CHUNK: {c.file} ===\n{c.text.strip()}"
-            if total + len(chunk) > max_chars:
+            header = f"\n\n=== RAG CHUNK: {c.file} ===\n"
+            text = c.stripped_text()
+            if total + len(header) + len(text) > max_chars:
                 break
-            parts.append(chunk)
-            total += len(chunk)
+            parts += (header if parts else header.lstrip("\n"), text, "\n")
+            total += len(header) + len(text)
 
         # de-dupe evidence preserving order
         seen = set()
@@ -99,7 +165,9 @@ async def build_rag_context(repo_root: Path, max_chars: int = 14000) -> tuple[st
                 seen.add(e)
                 evidence_unique.append(e)
 
-        return "\n".join(parts).strip(), evidence_unique[:50]
+        return "".join(parts[:-1]), evidence_unique[:50]
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         logger.exception("RAG retrieval failed; falling back to classic context. Reason: %s", e)
         return "", []
@@ -111,33 +179,117 @@ def parse_llm_json(text: str) -> Dict:
     except Exception:
         pass
 
-    m = JSON_BLOCK_RE.search(text)
-    if m:
+    # The answer wrapped in a code fence or prose: try the first few balanced {...} blocks.
+    pos = 0
+    for _ in range(5):
+        span = find_json_object(text, pos)
+        if span is None:
+            break
         try:
-            return json.loads(m.group(0))
+            return json.loads(text[span[0]:span[1]])
         except Exception:
-            pass
+            pos = span[0] + 1
 
     raise SummarizationError("LLM response was not valid JSON.")
 
 
-async def summarize_repo(repo_root: Path) -> Dict:
-    langs = detect_languages_and_tools(repo_root)
-
-    # Prefer RAG-selected chunks to fit the context window while keeping high signal.
-    tree_only = "=== DIRECTORY TREE (truncated) ===\n" + build_tree(repo_root, max_depth=4)
-    rag_context, rag_evidence = await build_rag_context(repo_root)
+async def summarize_repo(repo_root: Path, profile: Optional[PerfProfile] = None) -> Dict:
+    if profile is None:
+        profile = resolve_profile()
+    # Under a request deadline the pipeline degrades instead of failing: no retrieval
+    # round trips when the budget is low, then a smaller context and the fast model.
+    degraded: List[str] = []
+    plan_profile = profile
+    if _low_budget("DEADLINE_SKIP_RAG_S", 45.0):
+        degraded.append("skip_rag")
+        plan_profile = replace(profile, use_embeddings=False, allow_multistage=False, allow_mapreduce=False)
+    embed_model = None
+    if plan_profile.use_embeddings and embedding_model is not None:
+        embed_model = embedding_model()
+
+    def plan_stage(index: RepoIndex) -> RetrievalPlan:
+        # Small repos fit the classic budget whole: skip chunking and embedding round trips.
+        plan = plan_retrieval(index, embed_model=embed_model, profile=plan_profile)
+        record_plan(plan)
+        logger.info("Retrieval plan: %s", plan.summary())
+        return plan
+
+    async def rag_stage(plan: RetrievalPlan, index: RepoIndex) -> tuple[str, List[str]]:
+        if plan.mode in ("classic", "mapreduce") or "skip_rag" in degraded:
+            return "", []
+        # Prefer RAG-selected chunks to fit the context window while keeping high signal.
+        return await build_rag_context(
+            repo_root, max_chars=profile.rag_chars, plan=plan, index=index, use_embeddings=profile.use_embeddings
+        )
 
-    if rag_context.strip():
-        context = tree_only + "\n" + rag_context
+    async def map_stage(plan: RetrievalPlan) -> List[tuple[Partition, Dict]]:
+        if plan.mode != "mapreduce":
+            return []
+        return await summarize_partitions(repo_root, plan.partitions, parse=parse_llm_json)
+
+    # Tree and language detection run alongside planning + retrieval; the selected
+    # files from planning are shared with the classic fallback instead of recomputed.
+    timings: Dict[str, float] = {}
+    out = await run_stages(
+        [
+            Stage("index", lambda: index_repo(repo_root)),
+            Stage("tree", lambda: build_tree(repo_root, max_depth=4)),
+            Stage("langs", lambda index: detect_languages_and_tools(repo_root, index=index), deps=("index",)),
+            Stage("plan", plan_stage, deps=("index",)),
+            Stage("rag", rag_stage, deps=("plan", "index")),
+            Stage("map", map_stage, deps=("plan",)),
+        ],
+        timings=timings,
+    )
+    logger.info("Stage timings (s): %s", {k: round(v, 3) for k, v in timings.items()})
+    for name, seconds in timings.items():
+        record_timing(name, seconds)
+
+    langs, tree, plan, index = out["langs"], out["tree"], out["plan"], out["index"]
+    rag_context, rag_evidence = out["rag"]
+    partials = out["map"]
+
+    if partials:
+        # reduce: one call over the per-partition summaries (failed partitions are left out)
+        context = reduce_context(tree, partials)
+        evidence = [part.name for part, _ in partials]
+        retrieval_mode = f"mapreduce-{len(partials)}of{len(plan.partitions)}parts"
+    elif rag_context.strip():
+        context = "=== DIRECTORY TREE (truncated) ===\n" + tree + "\n" + rag_context
         evidence = rag_evidence
-        retrieval_mode = "rag-10chunks"
+        retrieval_mode = f"{plan.mode}-{plan.top_k}chunks"
+        if embed_model and note_embedded is not None:
+            note_embedded(plan.fingerprints)
     else:
         # Fallback to classic (non-RAG) context builder
-        context = build_context(repo_root)
+        context = await asyncio.to_thread(
+            build_context,
+            repo_root,
+            max_total_chars=profile.classic_chars,
+            tree=tree,
+            selected=plan.selected,
+            max_files=profile.max_files,
+        )
         evidence = []
         retrieval_mode = "classic"
 
+    model, model_tier = profile.model, profile.model_tier
+    if _low_budget("DEADLINE_FAST_LLM_S", 25.0):
+        small = profile.classic_chars // 2
+        if len(context) > small:
+            # keep whole lines: a half line reads as a corrupt file to the model
+            cut = context.rfind("\n", 0, small)
+            context = context[:cut if cut > 0 else small]
+            degraded.append("small_context")
+        # only a downgrade when the fast tier really is another model
+        if primary_model(None, "fast") != primary_model(model, model_tier):
+            model, model_tier = None, "fast"
+            degraded.append("fast_model")
+
+    content_desc = "directory tree + RAG-selected snippets"
+    if partials:
+        content_desc = "directory tree + a summary of each part of the repository"
+
     system = (
         "You are a senior software engineer. "
         "Given a GitHub repository snapshot, produce a concise, human-readable summary."
@@ -154,7 +306,7 @@ Rules:
 Repository signals:
 Detected languages/tools (heuristic): {langs}
 
-Repository content (directory tree + RAG-selected snippets; filtered & truncated):
+Repository content ({content_desc}; filtered & truncated):
 - retrieval_mode: {retrieval_mode}
 - evidence_files: {evidence}
 
@@ -162,14 +314,24 @@ Repository content (directory tree + RAG-selected snippets; filtered & truncated
 """.strip()
 
     try:
-        out = await chat_completion(
-            messages=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": user},
-            ],
-            temperature=0.2,
-        )
+        with timed("llm"):
+            out = await chat_completion(
+                messages=[
+                    {"role": "system", "content": system},
+                    {"role": "user", "content": user},
+                ],
+                temperature=0.2,
+                # an unparseable answer counts as a failed attempt so the router can fail over
+                validate=parse_llm_json,
+                model=model,
+                model_tier=model_tier,
+                # summary (<= 6 sentences) + structure (<= 5) + technologies
+                max_tokens=json_answer_max_tokens(sentences=11, items=30),
+                stop_at_json=True,
+            )
     except LLMError as e:
+        if expired():
+            raise DeadlineExceeded("Request deadline exceeded while waiting for the LLM.") from e
         raise SummarizationError(str(e)) from e
 
     data = parse_llm_json(out)
@@ -186,4 +348,14 @@ Repository content (directory tree + RAG-selected snippets; filtered & truncated
         if l not in technologies:
             technologies.append(l)
 
-    return {"summary": summary, "technologies": technologies, "structure": structure}
+    return {
+        "summary": summary,
+        "technologies": technologies,
+        "structure": structure,
+        "meta": {
+            "mode": profile.name,
+            "profile": profile.summary(),
+            "retrieval_mode": retrieval_mode,
+            "degraded": degraded or None,
+        },
+    }
@@ -0,0 +1,239 @@
+import os
+import math
+import time
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .cache import get_result_cache
+from .github import GitHubNotFound, GitHubPrivateOrForbidden, RepoRef, assert_repo_accessible, github_authenticated, head_commit
+from .profiles import PerfProfile, ProfileError, resolve_profile
+from .summarize import result_key
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def warming_enabled() -> bool:
+    # opt-in: every refresh is a real LLM call. Without a GitHub token user requests
+    # skip the commit lookup and the result cache, so warming it would be wasted money.
+    on = os.getenv("WARM_ENABLED", "0").strip().lower() in {"1", "true", "yes", "on"}
+    return on and github_authenticated()
+
+
+class InteractiveLoad:
+    """Number of user requests in flight; the warmer only works while this is low."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.active = 0
+
+    def __enter__(self) -> "InteractiveLoad":
+        with self._lock:
+            self.active += 1
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        with self._lock:
+            self.active -= 1
+
+
+LOAD = InteractiveLoad()
+
+
+@dataclass
+class Tracked:
+    """A (repo, profile) pair users asked for, with its decayed request count."""
+    ref: RepoRef
+    profile: PerfProfile
+    score: float = 0.0
+    last_seen: float = 0.0
+    branch: Optional[str] = None
+    etag: Optional[str] = None   # of the last commit lookup, for conditional requests
+    sha: Optional[str] = None
+    dirty: bool = False          # refresh requested (POST /refresh)
+
+    def decayed(self, now: float, half_life_s: float) -> float:
+        return self.score * math.pow(0.5, (now - self.last_seen) / half_life_s)
+
+
+def _key(ref: RepoRef, profile: PerfProfile) -> Tuple[str, str, str]:
+    return ref.owner.lower(), ref.repo.lower(), ref.slug.lower() + "|" + profile.key()
+
+
+class Warmer:
+    """Keeps the result cache warm for the most requested repos.
+
+    Every user request bumps an exponentially decayed popularity score
+    (WARM_HALF_LIFE_S, default 6h). Every WARM_INTERVAL_S (default 300) the top
+    WARM_TOP_N (default 50) entries are checked with a conditional commit lookup
+    (a 304 is free against the GitHub quota); a repo is re-summarized only when its
+    branch moved or its cached summary is older than 80% of RESULT_CACHE_TTL_S.
+    Work is deferred while more than WARM_BUSY_THRESHOLD user requests are in flight.
+    """
+
+    def __init__(self, summarize: Callable[[RepoRef, PerfProfile, Optional[str]], Awaitable[Any]]):
+        self.summarize = summarize
+        self._items: Dict[Tuple[str, str, str], Tracked] = {}
+        self._lock = threading.Lock()
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._oneoff: Optional[asyncio.Task] = None
+
+    def record(self, ref: RepoRef, profile: PerfProfile) -> None:
+        # only named profiles: one-off overrides are not worth keeping warm
+        try:
+            if profile != resolve_profile(profile.name):
+                return
+        except ProfileError:
+            return
+        half_life = _env_float("WARM_HALF_LIFE_S", 6 * 3600)
+        now = time.time()
+        with self._lock:
+            item = self._track(ref, profile, now)
+            item.score = item.decayed(now, half_life) + 1.0
+            item.last_seen = now
+        self._publish()
+
+    def _track(self, ref: RepoRef, profile: PerfProfile, now: float) -> Tracked:
+        """Entry for (ref, profile), created if needed; the coldest other entry goes beyond WARM_TRACK_MAX.
+
+        Caller holds the lock.
+        """
+        key = _key(ref, profile)
+        item = self._items.get(key)
+        if item is not None:
+            return item
+        item = self._items[key] = Tracked(ref=ref, profile=profile, last_seen=now)
+        if len(self._items) > int(_env_float("WARM_TRACK_MAX", 1000)):
+            half_life = _env_float("WARM_HALF_LIFE_S", 6 * 3600)
+            coldest = min((k for k in self._items if k != key), key=lambda k: self._items[k].decayed(now, half_life))
+            del self._items[coldest]
+        return item
+
+    def _publish(self) -> None:
+        with self._lock:
+            size = len(self._items)
+        metrics.set_gauge("warm.tracked", size)
+
+    def top(self, n: int) -> List[Tracked]:
+        half_life = _env_float("WARM_HALF_LIFE_S", 6 * 3600)
+        now = time.time()
+        with self._lock:
+            items = list(self._items.values())
+        return sorted(items, key=lambda t: -t.decayed(now, half_life))[:n]
+
+    def forget(self, item: Tracked) -> None:
+        with self._lock:
+            self._items.pop(_key(item.ref, item.profile), None)
+        self._publish()
+
+    def tracked_for(self, ref: RepoRef) -> List[Tracked]:
+        with self._lock:
+            return [t for k, t in self._items.items() if k[:2] == (ref.owner.lower(), ref.repo.lower())]
+
+    def request_refresh(self, ref: RepoRef, profile: PerfProfile) -> None:
+        """Queue a refresh for the next tick (and wake the loop)."""
+        with self._lock:
+            self._track(ref, profile, time.time()).dirty = True
+        self._publish()
+        if self._task is not None and self._wake is not None:
+            self._wake.set()
+        elif self._oneoff is None or self._oneoff.done():
+            # scheduler off (WARM_ENABLED=0): still honour explicit refreshes
+            self._oneoff = asyncio.get_running_loop().create_task(self._drain())
+
+    async def _drain(self) -> None:
+        """Run dirty-only passes until no refresh is queued (including ones queued meanwhile)."""
+        while True:
+            with self._lock:
+                if not any(t.dirty for t in self._items.values()):
+                    return
+            await self.tick(dirty_only=True)
+
+    async def _wait_idle(self) -> None:
+        busy = int(_env_float("WARM_BUSY_THRESHOLD", 1))
+        while LOAD.active > busy:
+            metrics.inc("warm.deferred")
+            await asyncio.sleep(1.0)
+
+    async def _check(self, item: Tracked, forced: bool = False) -> bool:
+        """Refresh one entry if needed (always when `forced`); True when it was re-summarized."""
+        metrics.inc("warm.checks")
+        if item.branch is None:
+            meta = await assert_repo_accessible(item.ref)
+            item.branch = item.ref.ref or meta.get("default_branch") or "HEAD"
+        sha, item.etag = await head_commit(item.ref, item.branch, item.etag)
+        # the first sighting only learns the sha: freshness then comes from the cache entry's age
+        moved = sha is not None and item.sha is not None and sha != item.sha
+        if sha is not None:
+            item.sha = sha
+
+        results = get_result_cache()
+        stale = True
+        if results is not None and item.sha is not None:
+            age = results.age(result_key(item.ref.owner, item.ref.repo, item.sha, item.profile, item.ref.subpath))
+            stale = age is None or age > results.ttl_s * 0.8
+        if not (forced or moved or stale):
+            metrics.inc("warm.unchanged")
+            return False
+        # cached under the commit just checked, so the next tick finds it fresh
+        await self.summarize(item.ref, item.profile, item.sha)
+        metrics.inc("warm.refreshed")
+        return True
+
+    async def tick(self, dirty_only: bool = False) -> int:
+        """One warming pass: queued refreshes first, then the most popular entries."""
+        with self._lock:
+            # taken over by this pass: a refresh that fails is logged, not retried in a loop
+            dirty = [t for t in self._items.values() if t.dirty]
+            for t in dirty:
+                t.dirty = False
+        todo = [(t, True) for t in dirty]
+        if not dirty_only:
+            taken = {id(t) for t in dirty}
+            todo += [(t, False) for t in self.top(int(_env_float("WARM_TOP_N", 50))) if id(t) not in taken]
+        refreshed = 0
+        for item, forced in todo:
+            await self._wait_idle()
+            try:
+                refreshed += await self._check(item, forced)
+            except (GitHubNotFound, GitHubPrivateOrForbidden) as e:
+                # gone or private: stop spending quota on it every tick
+                self.forget(item)
+                metrics.inc("warm.dropped")
+                logger.info("Stopped warming %s: %s", item.ref.slug, e)
+            except Exception as e:
+                metrics.inc("warm.errors")
+                logger.warning("Cache warming failed for %s (%s): %s", item.ref.slug, item.profile.name, e)
+        return refreshed
+
+    async def run(self) -> None:
+        self._wake = asyncio.Event()
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=_env_float("WARM_INTERVAL_S", 300))
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.tick()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        tasks = [t for t in (self._task, self._oneoff) if t is not None]
+        self._task = self._oneoff = None
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
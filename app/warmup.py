@@ -0,0 +1,125 @@
+import os
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+from .clients import get_client
+from .github import get_token_pool
+from .llm import LLMError, route
+from . import rag
+
+logger = logging.getLogger(__name__)
+
+
+class Readiness:
+    """Process readiness, reported by GET /health/ready.
+
+    state: "starting" (warm-up not started), "warming", "ready".
+    components: per-component warm-up result ("pending", "ok", "skipped", "timeout", "error: ...").
+    """
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.state = "starting"
+        self.components: Dict[str, str] = {}
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"status": self.state, "components": dict(self.components)}
+
+
+READINESS = Readiness()
+
+
+def warmup_enabled() -> bool:
+    return os.getenv("WARMUP_ENABLED", "1").strip().lower() not in {"0", "false", "no", "off"}
+
+
+def warmup_timeout_s() -> float:
+    try:
+        return float(os.getenv("WARMUP_TIMEOUT_S", "15"))
+    except ValueError:
+        return 15.0
+
+
+async def _preconnect(client_name: str, url: str, headers: Dict[str, str]) -> str:
+    # Any HTTP answer means DNS + TLS are done and a keep-alive connection sits in the pool.
+    await get_client(client_name).get(url, headers=headers, timeout=10.0)
+    return "ok"
+
+
+async def _github() -> str:
+    # /rate_limit does not count against the API quota; it also seeds every token's quota state
+    await get_token_pool().refresh()
+    return "ok"
+
+
+async def _llm() -> str:
+    try:
+        targets = route()
+    except LLMError:
+        return "skipped"
+    seen = set()
+    for t in targets:
+        if t.base_url in seen:
+            continue
+        seen.add(t.base_url)
+        await _preconnect("llm", t.base_url + "models", {"Authorization": f"Bearer {t.api_key}"})
+    return "ok"
+
+
+async def _embeddings() -> str:
+    """Load the persisted embedding cache, then make sure the query vectors exist."""
+    path = os.getenv("EMBED_CACHE_PATH", "").strip()
+    if path:
+        n = await asyncio.to_thread(rag.load_embed_cache, path)
+        logger.info("Loaded %d cached embeddings from %s", n, path)
+    # query vectors are usually in the persisted cache; otherwise this also opens the pool
+    n = await rag.warm_query_vectors()
+    return "ok" if n or path else "skipped"
+
+
+WARMUP_COMPONENTS: Dict[str, Callable[[], Awaitable[str]]] = {
+    "github": _github,
+    "llm": _llm,
+    "embeddings": _embeddings,
+}
+
+
+async def warm_up(timeout_s: float) -> None:
+    """Run all warm-up components concurrently; the process is ready when they finish or time out."""
+    READINESS.state = "warming"
+
+    async def run(name: str, fn: Callable[[], Awaitable[str]]) -> None:
+        READINESS.components[name] = "pending"
+        try:
+            READINESS.components[name] = await fn()
+        except asyncio.CancelledError:
+            READINESS.components[name] = "timeout"
+            raise
+        except Exception as e:
+            logger.warning("Warm-up component %s failed: %s", name, e)
+            READINESS.components[name] = f"error: {e.__class__.__name__}"
+
+    tasks = [asyncio.ensure_future(run(n, fn)) for n, fn in WARMUP_COMPONENTS.items()]
+    _, pending = await asyncio.wait(tasks, timeout=timeout_s)
+    for t in pending:
+        t.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+        logger.warning("Warm-up timed out after %.1fs; serving anyway", timeout_s)
+
+    READINESS.state = "ready"
+    logger.info("Warm-up finished: %s", READINESS.components)
+
+
+def persist_caches() -> None:
+    path = os.getenv("EMBED_CACHE_PATH", "").strip()
+    if path:
+        n = rag.save_embed_cache(path)
+        logger.info("Saved %d cached embeddings to %s", n, path)
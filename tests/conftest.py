@@ -1,6 +1,7 @@
 import io
 import zipfile
 import pytest
+import respx
 
 import sys
 from pathlib import Path
@@ -28,4 +29,33 @@ def sample_repo_zip_bytes() -> bytes:
             "repo-main/app/api.py",
             "from fastapi import APIRouter\nrouter = APIRouter()\n\n@router.post('/summarize')\ndef summarize():\n    return {}\n",
         )
-    return buf.getvalue()
\ No newline at end of file
+    return buf.getvalue()
+
+GITHUB_SHA = "0123456789abcdef0123456789abcdef01234567"
+
+
+@pytest.fixture()
+def github_api(sample_repo_zip_bytes):
+    """Mocked GitHub API for any owner/repo: repo metadata, zipball of the sample repo and
+    commit lookups answering GITHUB_SHA. Routes are named "repo", "zipball" and "commits"."""
+    with respx.mock(assert_all_called=False) as rs:
+        rs.get(url__regex=r"https://api\.github\.com/repos/[^/]+/[^/?#]+/?(\?.*)?$", name="repo").respond(
+            200, json={"default_branch": "main"}
+        )
+        rs.get(url__regex=r"https://api\.github\.com/repos/.+?/.+/zipball.*", name="zipball").respond(
+            200, content=sample_repo_zip_bytes, headers={"Content-Type": "application/zip"}
+        )
+        rs.get(url__regex=r"https://api\.github\.com/repos/.+?/.+/commits/.+", name="commits").respond(200, text=GITHUB_SHA)
+        yield rs
+
+
+@pytest.fixture(autouse=True)
+def _fresh_result_cache():
+    """Summaries cached by one test must not leak into another."""
+    from app import cache
+
+    cache._RESULTS = None
+    cache._PARTIALS = None
+    yield
+    cache._RESULTS = None
+    cache._PARTIALS = None
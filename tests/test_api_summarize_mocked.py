@@ -1,3 +1,6 @@
+import io
+import zipfile
+
 import respx
 from fastapi.testclient import TestClient
 
@@ -55,4 +58,41 @@ def test_summarize_happy_path_mocked(monkeypatch, sample_repo_zip_bytes):
         assert resp.status_code == 200, resp.text
         data = resp.json()
         assert data["summary"] == "demo"
-        assert "Python" in data["technologies"]
\ No newline at end of file
+        assert "Python" in data["technologies"]
+
+def test_summarize_scoped_to_ref_and_subpath(monkeypatch):
+    monkeypatch.setenv("WARMUP_ENABLED", "0")
+    monkeypatch.setenv("GITHUB_TOKEN", "tok-test")
+    monkeypatch.setenv("LLM_PROVIDER", "openai")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    prompts = []
+
+    async def fake_chat_completion(messages, **kwargs):
+        prompts.append(messages[1]["content"])
+        return '{"summary":"billing","technologies":["Python"],"structure":"flat"}'
+
+    monkeypatch.setattr("app.summarize.chat_completion", fake_chat_completion)
+
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as z:
+        z.writestr("o-r-abc/README.md", "# Monorepo\n")
+        z.writestr("o-r-abc/services/billing/invoice.py", "def invoice():\n    return 1\n")
+        z.writestr("o-r-abc/services/search/index.py", "def search():\n    return 2\n")
+    sha = "c" * 40
+
+    with respx.mock(assert_all_called=False) as rs, TestClient(app) as client:
+        rs.get("https://api.github.com/repos/o/r").respond(200, json={"default_branch": "main"})
+        commit = rs.get("https://api.github.com/repos/o/r/commits/v2").respond(200, text=sha)
+        zipball = rs.get(f"https://api.github.com/repos/o/r/zipball/{sha}").respond(200, content=buf.getvalue())
+
+        url = "https://github.com/o/r/tree/v2/services/billing"
+        resp = client.post("/summarize", json={"github_url": url})
+        assert resp.status_code == 200, resp.text
+        assert resp.json()["meta"]["commit"] == sha
+        assert commit.called and zipball.called
+        assert "invoice.py" in prompts[0] and "search" not in prompts[0] and "Monorepo" not in prompts[0]
+
+        # same commit, other subpath: not served from the scoped cache entry
+        resp = client.post("/summarize", json={"github_url": "https://github.com/o/r/tree/v2/services/search"})
+        assert resp.json()["meta"]["cached"] is False
+        assert client.post("/summarize", json={"github_url": url}).json()["meta"]["cached"] is True
@@ -1,4 +1,4 @@
-from app.rag import chunk_text
+from app.rag import build_chunks, chunk_text
 
 
 def test_chunk_text_basic():
@@ -14,4 +14,68 @@ def test_chunk_text_overlap():
     chunks = chunk_text("x.py", text, chunk_chars=500, overlap=50)
     assert len(chunks) > 1
     # overlap means chunk2 starts before chunk1 ends
-    assert chunks[0].text[-50:] == chunks[1].text[:50]
\ No newline at end of file
+    assert chunks[0].text[-50:] == chunks[1].text[:50]
+
+def test_chunk_text_python_splits_on_top_level_defs():
+    funcs = [f"def f{i}():\n" + "    x = 1\n" * 30 for i in range(6)]
+    text = "import os\n\n" + "\n\n".join(funcs)
+    chunks = chunk_text("mod.py", text, chunk_chars=700, overlap=50)
+    assert len(chunks) > 1
+    # every chunk after the first starts exactly at a function definition
+    assert all(c.text.lstrip().startswith("def f") for c in chunks[1:])
+
+
+def test_chunk_text_truncated_python_still_splits_on_defs():
+    funcs = [f"@cache\ndef f{i}():\n" + "    x = 1\n" * 30 for i in range(6)]
+    text = "\n\n".join(funcs) + "\ndef cut(a,\n... (truncated)"
+    chunks = chunk_text("mod.py", text, chunk_chars=700, overlap=50)
+    assert len(chunks) > 1
+    assert all(c.text.lstrip().startswith(("@cache", "def cut")) for c in chunks[1:])
+
+
+def test_chunk_text_markdown_splits_on_headings():
+    text = "# Title\n\nintro\n\n## Install\n\n" + "pip install x\n" * 40 + "\n## Usage\n\n" + "run it\n" * 40
+    chunks = chunk_text("README.md", text, chunk_chars=600, overlap=50)
+    assert len(chunks) > 1
+    assert all(c.text.startswith("#") for c in chunks)
+
+
+def test_chunk_text_braces_keep_blocks_whole():
+    block = "function f%d() {\n  if (x) { return '}'; }\n" + "  y();\n" * 20 + "}\n"
+    text = "".join(block % i for i in range(5))
+    chunks = chunk_text("a.js", text, chunk_chars=400, overlap=50)
+    for c in chunks:
+        assert c.text.startswith("function f")
+        assert c.text.rstrip().endswith("}")
+
+
+def test_build_chunks_dedupes_identical_files(tmp_path):
+    license_text = "MIT License\n\n" + "Permission is hereby granted.\n" * 20
+    (tmp_path / "LICENSE").write_text(license_text, encoding="utf-8")
+    (tmp_path / "vendor").mkdir()
+    (tmp_path / "vendor" / "LICENSE").write_text(license_text, encoding="utf-8")
+
+    chunks = build_chunks(tmp_path)
+    assert len(chunks) == 1
+
+
+def test_chunks_are_views_into_one_buffer_per_file():
+    text = "".join(f"línea {i} — ünïcödé ✓\n" for i in range(400))
+    chunks = chunk_text("notes.txt", text, chunk_chars=500, overlap=50)
+    assert len(chunks) > 2
+    assert all(c.source is chunks[0].source for c in chunks)
+    # byte offsets land on character boundaries and overlaps survive multi-byte text
+    s = text.strip()
+    assert all(c.text in s for c in chunks)
+    assert chunks[0].text[-50:] == chunks[1].text[:50]
+
+
+def test_chunk_key_hashes_the_stripped_view():
+    import hashlib
+
+    from app.rag import Chunk, chunk_key
+
+    c = Chunk("a.md", "\n\n  ## Usage ✓\n\nrun it  \n")
+    assert c.stripped_text() == "## Usage ✓\n\nrun it"
+    assert chunk_key(c) == hashlib.sha1("## Usage ✓\n\nrun it".encode("utf-8")).hexdigest()
+    assert chunk_key(c) == chunk_key(Chunk("b.md", "## Usage ✓\n\nrun it"))
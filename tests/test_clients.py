@@ -0,0 +1,34 @@
+import asyncio
+import threading
+
+from app.clients import aclose_clients, get_client
+
+
+def test_clients_are_pooled_per_loop_and_closed():
+    async def first():
+        client = get_client("github")
+        assert get_client("github") is client
+        assert get_client("llm") is not client
+        return client
+
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        other = asyncio.run_coroutine_threadsafe(first(), loop).result(5)
+
+        async def second():
+            client = get_client("github")
+            await aclose_clients()
+            return client
+
+        mine = asyncio.run(second())
+        # a second loop gets its own client and leaves the first loop's one alone
+        assert mine is not other and mine.is_closed and not other.is_closed
+
+        asyncio.run_coroutine_threadsafe(aclose_clients(), loop).result(5)
+        assert other.is_closed
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(5)
+        loop.close()
@@ -0,0 +1,117 @@
+import re
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.cache import get_result_cache
+from app.deadline import DeadlineExceeded, deadline_scope, job_budget, request_budget, timeout_for
+from app.main import app
+from app.summarize import summarize_repo
+
+
+def test_request_budget_from_config_and_header(monkeypatch):
+    monkeypatch.setenv("REQUEST_DEADLINE_S", "60")
+    assert request_budget({}) == 60
+    assert request_budget({"x-request-deadline": "15"}) == 15
+    assert request_budget({"x-request-deadline": "600"}) == 60  # a client can't extend it
+    monkeypatch.setenv("REQUEST_DEADLINE_S", "0")
+    assert request_budget({}) is None
+    monkeypatch.delenv("JOB_DEADLINE_S", raising=False)
+    assert job_budget({}) == 900  # jobs don't inherit the interactive budget
+    assert job_budget({"x-request-deadline": "30"}) == 30
+
+
+def test_timeout_for_is_cut_to_the_remaining_budget():
+    assert timeout_for(30.0) == 30.0  # no deadline
+    with deadline_scope(5.0):
+        assert 4.0 < timeout_for(30.0) <= 5.0
+    with deadline_scope(0.001):
+        time.sleep(0.01)
+        with pytest.raises(DeadlineExceeded):
+            timeout_for(30.0)
+
+
+def test_low_budget_skips_rag_and_uses_the_fast_model(tmp_path, monkeypatch):
+    (tmp_path / "README.md").write_text("# Demo\n\n" + "Install it and run it.\n" * 2000)
+    for i in range(12):
+        (tmp_path / f"mod{i}.py").write_text(f"def f{i}():\n    return {i}\n" * 400)
+    calls = []
+
+    async def fake_chat_completion(messages, **kwargs):
+        calls.append((kwargs, messages[1]["content"]))
+        return '{"summary":"demo","technologies":[],"structure":"flat"}'
+
+    monkeypatch.setattr("app.summarize.chat_completion", fake_chat_completion)
+
+    async def run():
+        with deadline_scope(10.0):
+            return await summarize_repo(tmp_path)
+
+    result = asyncio.run(run())
+    assert result["meta"]["retrieval_mode"] == "classic"
+    assert result["meta"]["degraded"] == ["skip_rag", "small_context", "fast_model"]
+    kwargs, prompt = calls[0]
+    assert kwargs["model_tier"] == "fast" and kwargs["model"] is None
+    assert len(prompt) < 11000 + 2000  # half of the balanced classic budget, plus the prompt
+    last = prompt.splitlines()[-1]
+    assert re.fullmatch(r"def f\d+\(\):|\s*return \d+|Install it and run it\.|=== .* ===|", last), last  # whole lines only
+
+    # Nebius' default model already is its fast one: no model downgrade to report
+    monkeypatch.setenv("LLM_PROVIDER", "nebius")
+    calls.clear()
+    result = asyncio.run(run())
+    assert result["meta"]["degraded"] == ["skip_rag", "small_context"]
+    assert calls[0][0]["model_tier"] == "default"
+    monkeypatch.delenv("LLM_PROVIDER")
+
+    calls.clear()
+    result = asyncio.run(summarize_repo(tmp_path))  # no deadline: nothing degraded
+    assert result["meta"]["degraded"] is None
+    assert calls[0][0]["model_tier"] == "default"
+
+
+def test_summarize_past_the_deadline_returns_504(monkeypatch, github_api):
+    monkeypatch.setenv("WARMUP_ENABLED", "0")
+    monkeypatch.setenv("LLM_PROVIDER", "openai")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+
+    async def slow_chat_completion(*args, **kwargs):
+        await asyncio.sleep(5)
+
+    monkeypatch.setattr("app.summarize.chat_completion", slow_chat_completion)
+
+    with TestClient(app) as client:
+        started = time.monotonic()
+        resp = client.post(
+            "/summarize", json={"github_url": "https://github.com/o/r"}, headers={"X-Request-Deadline": "0.5"}
+        )
+
+    assert resp.status_code == 504, resp.text
+    assert time.monotonic() - started < 3
+    assert len(get_result_cache()) == 0
+
+
+class _GoneRequest:
+    """Stands in for a Starlette request whose client disconnected."""
+
+    async def is_disconnected(self) -> bool:
+        return True
+
+
+def test_client_disconnect_cancels_the_work(monkeypatch):
+    monkeypatch.setenv("DISCONNECT_POLL_S", "0.01")
+    cancelled = []
+
+    async def work():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    with pytest.raises(main.ClientDisconnected):
+        asyncio.run(main._until_disconnected(_GoneRequest(), work()))
+    assert cancelled == [True]
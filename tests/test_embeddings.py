@@ -0,0 +1,75 @@
+import asyncio
+import math
+
+import pytest
+
+from app import rag
+from app.rag import Chunk, EmbeddingBackend, LocalHashEmbeddings, best_similarity, embedding_backend, rag_select
+
+
+def test_local_embeddings_are_deterministic_unit_vectors():
+    backend = LocalHashEmbeddings(dim=128)
+    a, b = backend.embed_sync(["pip install -r requirements.txt", "pip install -r requirements.txt"])
+    assert a == b
+    assert len(a) == 128
+    assert math.isclose(math.sqrt(sum(x * x for x in a)), 1.0, rel_tol=1e-5)
+
+
+def test_local_embeddings_rank_related_text_higher():
+    backend = LocalHashEmbeddings()
+    query, install, license_ = backend.embed_sync([
+        "How do you install and run this project?",
+        "## Installation\n\nRun `pip install myproject`, then start it with `myproject run`.",
+        "Permission is hereby granted, free of charge, to any person obtaining a copy of this software",
+    ])
+    install_score, license_score = best_similarity([install, license_], [query])
+    assert install_score > license_score
+
+
+def test_embedding_backend_is_abstract():
+    class NoEmbed(EmbeddingBackend):
+        name = "broken"
+
+    with pytest.raises(TypeError):
+        NoEmbed()
+
+
+def test_best_similarity_matches_pure_python_cosine():
+    chunks = [[1.0, 0.0, 2.0], [0.0, 3.0, 0.0], [0.0, 0.0, 0.0]]
+    queries = [[1.0, 1.0, 0.0], [0.0, 0.0, 1.0]]
+    expected = [max(rag._cosine(c, q) for q in queries) for c in chunks]
+    assert [round(x, 5) for x in best_similarity(chunks, queries)] == [round(x, 5) for x in expected]
+
+
+def test_backend_selection(monkeypatch):
+    monkeypatch.setenv("LLM_PROVIDER", "nebius")
+    monkeypatch.delenv("EMBEDDING_BACKEND", raising=False)
+    assert embedding_backend().name == "local"
+
+    monkeypatch.setenv("LLM_PROVIDER", "openai")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    assert embedding_backend().name == "openai"
+
+    monkeypatch.setenv("EMBEDDING_BACKEND", "local")
+    monkeypatch.setenv("LOCAL_EMBEDDING_DIM", "64")
+    assert rag.embedding_model() == "local-hash-v1-64"
+
+    monkeypatch.setenv("EMBEDDING_BACKEND", "none")
+    assert embedding_backend() is None
+
+
+def test_rag_select_with_local_backend_needs_no_network(monkeypatch):
+    monkeypatch.setenv("LLM_PROVIDER", "nebius")
+    monkeypatch.setenv("EMBEDDING_BACKEND", "local")
+    monkeypatch.setattr(rag, "_EMBED_CACHE", {})
+    chunks = [
+        Chunk("LICENSE", "Permission is hereby granted, free of charge, to any person obtaining a copy"),
+        Chunk("README.md", "## Installation\n\nInstall with `pip install demo` and run the server with `demo serve`."),
+        Chunk("app/util.py", "def clamp(x, lo, hi):\n    return max(lo, min(x, hi))\n"),
+    ]
+
+    picked = asyncio.run(rag_select(chunks, ["How do you install and run this project?"], top_k=1))
+
+    assert picked[0].file == "README.md"
+    # chunk and query vectors went through the shared cache
+    assert len(rag._EMBED_CACHE) == 4
@@ -0,0 +1,88 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+import respx
+
+from app.github import GitHubRateLimited, TokenPool, _github_api_get, github_quota
+
+REPO_URL = "https://api.github.com/repos/o/r"
+
+
+def _quota(remaining: int, status: int = 200) -> httpx.Response:
+    headers = {
+        "X-RateLimit-Limit": "5000",
+        "X-RateLimit-Remaining": str(remaining),
+        "X-RateLimit-Reset": str(int(time.time()) + 3600),
+    }
+    return httpx.Response(status, json={"default_branch": "main"}, headers=headers)
+
+
+def test_calls_go_to_the_token_with_most_headroom(monkeypatch):
+    monkeypatch.setenv("GITHUB_TOKENS", "tok-aaaa,tok-bbbb")
+    remaining = {"Bearer tok-aaaa": 10, "Bearer tok-bbbb": 4000}
+    used = []
+
+    def answer(request):
+        auth = request.headers["Authorization"]
+        used.append(auth)
+        remaining[auth] -= 1
+        return _quota(remaining[auth])
+
+    with respx.mock as rs:
+        rs.get(REPO_URL).mock(side_effect=answer)
+
+        async def run():
+            for _ in range(3):
+                await _github_api_get(REPO_URL)
+
+        asyncio.run(run())
+
+    # first call: nothing known yet; afterwards the fuller token wins
+    assert used == ["Bearer tok-aaaa", "Bearer tok-bbbb", "Bearer tok-bbbb"]
+    quota = {q["token"]: q["remaining"] for q in github_quota()}
+    assert quota == {"token:...aaaa": 9, "token:...bbbb": 3998}
+
+
+def test_rate_limited_token_is_retried_on_the_next(monkeypatch):
+    monkeypatch.setenv("GITHUB_TOKENS", "tok-cccc,tok-dddd")
+
+    def answer(request):
+        if request.headers["Authorization"] == "Bearer tok-cccc":
+            return _quota(0, status=403)
+        return _quota(4999)
+
+    with respx.mock as rs:
+        route = rs.get(REPO_URL).mock(side_effect=answer)
+        r = asyncio.run(_github_api_get(REPO_URL))
+
+    assert r.status_code == 200
+    assert route.call_count == 2
+
+
+def test_exhausted_quota_fails_fast_instead_of_calling_github(monkeypatch):
+    monkeypatch.setenv("GITHUB_THROTTLE_MAX_WAIT_S", "5")
+    pool = TokenPool([])
+    pool.states[0].remaining = 0
+    pool.states[0].reset = time.time() + 600
+
+    with respx.mock as rs:
+        route = rs.get(REPO_URL).respond(200)
+        with pytest.raises(GitHubRateLimited):
+            asyncio.run(pool.get(REPO_URL))
+    assert not route.called
+
+
+def test_low_quota_is_paced_until_the_reset(monkeypatch):
+    monkeypatch.setenv("GITHUB_THROTTLE_BELOW", "0.1")
+    monkeypatch.setenv("GITHUB_THROTTLE_MAX_WAIT_S", "60")
+    pool = TokenPool([])
+    st = pool.states[0]
+    st.remaining = 4  # of 60: below the 10% watermark
+    st.reset = time.time() + 40
+
+    waits = [pool._pick()[1] for _ in range(3)]
+
+    # 4 calls left for 40s: one every ~10s
+    assert waits == [pytest.approx(w, abs=0.5) for w in (0, 10, 20)]
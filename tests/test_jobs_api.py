@@ -0,0 +1,47 @@
+import time
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from conftest import GITHUB_SHA as SHA
+
+
+def test_job_submit_and_poll(monkeypatch, github_api):
+    monkeypatch.setenv("WARMUP_ENABLED", "0")
+    monkeypatch.setenv("LLM_PROVIDER", "openai")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+
+    async def fake_chat_completion(*args, **kwargs):
+        return '{"summary":"demo","technologies":["Python"],"structure":"app/"}'
+
+    monkeypatch.setattr("app.summarize.chat_completion", fake_chat_completion)
+
+    with TestClient(app) as client:
+        resp = client.post("/jobs", json={"github_url": "https://github.com/Khab40/nebius-test"})
+        assert resp.status_code == 202, resp.text
+        job_id = resp.json()["job_id"]
+        assert resp.json()["deadline_s"] == 900  # JOB_DEADLINE_S: what the UI waits for
+
+        # a second submit for the same repo joins the running job
+        again = client.post("/jobs", json={"github_url": "https://github.com/khab40/nebius-test"})
+        assert again.json()["job_id"] == job_id
+
+        deadline = time.monotonic() + 5
+        job = client.get(f"/jobs/{job_id}").json()
+        while job["status"] not in ("done", "error") and time.monotonic() < deadline:
+            time.sleep(0.02)
+            job = client.get(f"/jobs/{job_id}").json()
+
+        assert job["status"] == "done", job
+        assert job["result"]["summary"] == "demo"
+
+        assert client.get("/jobs/does-not-exist").status_code == 404
+
+
+def test_resolve_returns_commit(monkeypatch, github_api):
+    monkeypatch.setenv("WARMUP_ENABLED", "0")
+    with TestClient(app) as client:
+        resp = client.get("/resolve", params={"github_url": "https://github.com/o/r"})
+
+    assert resp.status_code == 200, resp.text
+    assert resp.json() == {"owner": "o", "repo": "r", "branch": "main", "commit": SHA}
@@ -9,4 +9,19 @@ def test_parse_llm_json_plain():
 def test_parse_llm_json_code_fence():
     text = """```json\n{\"summary\":\"x\",\"technologies\":[\"Python\"],\"structure\":\"y\"}\n```"""
     out = parse_llm_json(text)
-    assert out["structure"] == "y"
\ No newline at end of file
+    assert out["structure"] == "y"
+
+def test_parse_llm_json_ignores_trailing_prose_and_earlier_braces():
+    text = 'Use {placeholders} like so:\n{"summary":"a } in a string","technologies":[],"structure":"y"}\nHope that helps! }'
+    out = parse_llm_json(text)
+    assert out["summary"] == "a } in a string"
+
+
+def test_scanner_finds_the_end_across_chunks():
+    from app.jsonscan import JsonObjectScanner
+
+    chunks = ['```json\n{"summary": "say \\', '"hi\\"", "n": {"x": "}"}', '}\n```\nDone.']
+    scanner = JsonObjectScanner()
+    ends = [scanner.feed(c) for c in chunks]
+    assert ends == [None, None, 1]
+    assert scanner.start == len("```json\n")
@@ -0,0 +1,126 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+import respx
+
+from app import llm
+
+OPENAI_URL = "https://api.openai.com/v1/chat/completions"
+NEBIUS_URL = "https://api.tokenfactory.nebius.com/v1/chat/completions"
+
+
+def _answer(text: str) -> dict:
+    return {"choices": [{"message": {"content": text}}]}
+
+
+@pytest.fixture(autouse=True)
+def _providers(monkeypatch):
+    monkeypatch.setenv("LLM_PROVIDER", "openai")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("NEBIUS_API_KEY", "test")
+    monkeypatch.setenv("LLM_FALLBACKS", "nebius")
+    llm._STATS.clear()
+
+
+def test_failover_on_5xx():
+    with respx.mock() as rs:
+        rs.post(OPENAI_URL).respond(503, text="overloaded")
+        rs.post(NEBIUS_URL).respond(200, json=_answer('{"ok": true}'))
+        out = asyncio.run(llm.chat_completion([{"role": "user", "content": "hi"}]))
+
+    assert out == '{"ok": true}'
+    stats = llm.provider_stats()
+    assert stats["openai:gpt-4o-mini"]["errors"] == 1
+    assert stats["nebius:meta-llama/Meta-Llama-3.1-8B-Instruct-fast"]["successes"] == 1
+
+
+def test_no_failover_on_client_error():
+    with respx.mock(assert_all_called=False) as rs:
+        rs.post(OPENAI_URL).respond(400, text="bad request")
+        nebius = rs.post(NEBIUS_URL).respond(200, json=_answer("{}"))
+        with pytest.raises(llm.LLMError):
+            asyncio.run(llm.chat_completion([{"role": "user", "content": "hi"}]))
+    assert not nebius.called
+
+
+def test_hedged_request_first_answer_wins(monkeypatch):
+    monkeypatch.setenv("LLM_HEDGE", "1")
+    monkeypatch.setenv("LLM_HEDGE_DELAY_S", "0.05")
+    monkeypatch.setenv("LLM_HEDGE_MIN_DELAY_S", "0.01")
+
+    async def slow(request):
+        await asyncio.sleep(2)
+        return httpx.Response(200, json=_answer('{"who": "openai"}'))
+
+    with respx.mock(assert_all_called=False) as rs:
+        rs.post(OPENAI_URL).mock(side_effect=slow)
+        rs.post(NEBIUS_URL).respond(200, json=_answer('{"who": "nebius"}'))
+        started = time.monotonic()
+        out = asyncio.run(llm.chat_completion([{"role": "user", "content": "hi"}]))
+
+    assert out == '{"who": "nebius"}'
+    assert time.monotonic() - started < 1.5
+    assert llm.provider_stats()["openai:gpt-4o-mini"]["cancelled"] == 1
+
+
+def test_invalid_answer_fails_over():
+    def must_be_json(text: str) -> None:
+        import json
+        json.loads(text)
+
+    with respx.mock(assert_all_called=False) as rs:
+        rs.post(OPENAI_URL).respond(200, json=_answer("not json"))
+        rs.post(NEBIUS_URL).respond(200, json=_answer('{"a": 1}'))
+        out = asyncio.run(llm.chat_completion([{"role": "user", "content": "hi"}], validate=must_be_json))
+    assert out == '{"a": 1}'
+
+
+def _sse(*deltas: str) -> bytes:
+    return b"".join(
+        b"data: " + json.dumps({"choices": [{"delta": {"content": d}}]}).encode() + b"\n\n" for d in deltas
+    )
+
+
+def test_stream_is_closed_once_the_json_object_is_complete(monkeypatch):
+    monkeypatch.delenv("LLM_FALLBACKS")
+    closed = []
+    payloads = []
+
+    async def body():
+        try:
+            yield _sse("```json\n{\"summary\": \"a {brace}\",", " \"structure\": \"x\"}")
+            yield _sse("\n```\nLet me know if you need anything else!")
+            await asyncio.sleep(5)  # the model would keep going
+            yield b"data: [DONE]\n\n"
+        finally:
+            closed.append(True)
+
+    def answer(request):
+        payloads.append(json.loads(request.content))
+        return httpx.Response(200, headers={"Content-Type": "text/event-stream"}, content=body())
+
+    with respx.mock() as rs:
+        rs.post(OPENAI_URL).mock(side_effect=answer)
+        started = time.monotonic()
+        out = asyncio.run(
+            llm.chat_completion([{"role": "user", "content": "hi"}], max_tokens=500, stop_at_json=True)
+        )
+
+    assert out == '```json\n{"summary": "a {brace}", "structure": "x"}'
+    assert time.monotonic() - started < 2
+    assert closed == [True]
+    assert payloads[0]["stream"] is True and payloads[0]["max_tokens"] == 500
+
+
+def test_stream_without_early_stop_reads_to_done(monkeypatch):
+    monkeypatch.delenv("LLM_FALLBACKS")
+    with respx.mock() as rs:
+        rs.post(OPENAI_URL).respond(
+            200, headers={"Content-Type": "text/event-stream"}, content=_sse("{}", " trailing") + b"data: [DONE]\n\n"
+        )
+        out = asyncio.run(llm.chat_completion([{"role": "user", "content": "hi"}]))
+    assert out == "{} trailing"
+    assert llm.json_answer_max_tokens(sentences=11, items=30) == 1080
@@ -0,0 +1,132 @@
+import json
+import time
+import queue
+import asyncio
+import logging
+import logging.handlers
+
+from fastapi.testclient import TestClient
+
+from app.logs import (
+    REQUEST_ID,
+    DroppingQueueHandler,
+    JsonFormatter,
+    RequestIdMiddleware,
+    SamplingFilter,
+    parse_sample_rates,
+)
+from app.main import app
+from app.profiling import RequestProfile, record_timing
+
+
+def _logger(name: str, handler: logging.Handler) -> logging.Logger:
+    log = logging.getLogger(name)
+    log.handlers = [handler]
+    log.propagate = False
+    log.setLevel(logging.DEBUG)
+    return log
+
+
+def test_records_carry_request_id_and_timings():
+    q = queue.Queue()
+    log = _logger("test.logs.context", DroppingQueueHandler(q))
+
+    token = REQUEST_ID.set("req-1")
+    try:
+        with RequestProfile("/x"):
+            record_timing("download", 0.25)
+            log.info("downloaded %s", "o/r")
+    finally:
+        REQUEST_ID.reset(token)
+
+    line = json.loads(JsonFormatter().format(q.get_nowait()))
+    assert line["msg"] == "downloaded o/r"
+    assert line["request_id"] == "req-1"
+    assert line["timings_ms"] == {"download": 250.0}
+
+
+def test_long_tracebacks_are_truncated():
+    q = queue.Queue()
+    log = _logger("test.logs.traceback", DroppingQueueHandler(q))
+    try:
+        raise ValueError("x" * 10_000)
+    except ValueError:
+        log.exception("boom")
+
+    line = json.loads(JsonFormatter(traceback_max_chars=1000).format(q.get_nowait()))
+    assert len(line["exc_info"]) < 1100
+    assert "chars truncated" in line["exc_info"]
+    assert line["exc_info"].startswith("Traceback")
+
+
+def test_full_queue_drops_info_and_makes_room_for_warnings():
+    q = queue.Queue(maxsize=2)
+    handler = DroppingQueueHandler(q)
+    log = _logger("test.logs.drop", handler)
+
+    for i in range(3):
+        log.info("info %d", i)
+    assert handler.dropped == 1
+    log.warning("disk full")
+    assert handler.dropped == 2
+    assert [q.get_nowait().msg for _ in range(2)] == ["info 1", "disk full"]
+
+
+def test_sampling_only_applies_below_warning(monkeypatch):
+    monkeypatch.setattr("app.logs.random.random", lambda: 0.5)
+    rates = parse_sample_rates("httpx=0.1, app.rag=0.9, bad=x")
+    assert rates == [("app.rag", 0.9), ("httpx", 0.1)]
+    f = SamplingFilter(rates)
+
+    def record(name: str, level: int) -> logging.LogRecord:
+        return logging.LogRecord(name, level, __file__, 1, "msg", None, None)
+
+    assert not f.filter(record("httpx", logging.INFO))
+    assert not f.filter(record("httpx._client", logging.INFO))
+    assert f.filter(record("httpx", logging.WARNING))
+    assert f.filter(record("app.rag", logging.INFO))
+    assert f.filter(record("httpxx", logging.INFO))
+
+
+def test_slow_writer_does_not_block_callers():
+    class SlowHandler(logging.Handler):
+        def emit(self, record):
+            time.sleep(0.05)
+
+    q = queue.Queue(maxsize=100)
+    log = _logger("test.logs.slow", DroppingQueueHandler(q))
+    listener = logging.handlers.QueueListener(q, SlowHandler())
+    listener.start()
+    try:
+        started = time.perf_counter()
+        for i in range(20):
+            log.info("line %d", i)
+        assert time.perf_counter() - started < 0.5  # vs ~1s if written inline
+    finally:
+        listener.stop()
+    assert q.empty()
+
+
+def test_request_id_middleware():
+    seen = []
+
+    async def inner(scope, receive, send):
+        seen.append(REQUEST_ID.get())
+        await send({"type": "http.response.start", "status": 204, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "headers": [(b"x-request-id", b"abc-123")]}
+    asyncio.run(RequestIdMiddleware(inner)(scope, None, send))
+    assert seen == ["abc-123"]
+    assert (b"x-request-id", b"abc-123") in sent[0]["headers"]
+    assert REQUEST_ID.get() is None
+
+    with TestClient(app) as client:
+        assert client.get("/health", headers={"X-Request-Id": "from-lb.7"}).headers["x-request-id"] == "from-lb.7"
+        generated = client.get("/health", headers={"X-Request-Id": "bad id\n"}).headers["x-request-id"]
+        assert len(generated) == 16 and generated != "bad id"
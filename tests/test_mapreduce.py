@@ -0,0 +1,95 @@
+import asyncio
+from pathlib import Path
+
+from app.mapreduce import OTHER_PARTITION, ROOT_PARTITION, partition_index
+from app.planner import plan_retrieval
+from app.profiles import resolve_profile
+from app.selection import index_repo
+from app.summarize import summarize_repo
+
+
+def _monorepo(root: Path) -> None:
+    (root / "README.md").write_text("# Mono\n\nA monorepo.\n", encoding="utf-8")
+    (root / "package.json").write_text('{"name": "mono"}\n', encoding="utf-8")
+    for pkg in ("api", "web", "cli"):
+        for i in range(8):
+            f = root / "packages" / pkg / "src" / f"mod{i}.ts"
+            f.parent.mkdir(parents=True, exist_ok=True)
+            f.write_text(f"export function {pkg}{i}() {{\n" + "  step();\n" * 150 + "}\n", encoding="utf-8")
+    for i in range(4):
+        (root / "docs").mkdir(exist_ok=True)
+        (root / "docs" / f"page{i}.md").write_text(f"# Page {i}\n", encoding="utf-8")
+    (root / "scripts").mkdir()
+    (root / "scripts" / "release.sh").write_text("echo release\n", encoding="utf-8")
+
+
+def test_partition_index_splits_dominant_directory(tmp_path: Path):
+    _monorepo(tmp_path)
+    parts = {p.name: len(p.files) for p in partition_index(index_repo(tmp_path))}
+    # packages/ holds most files, so it is split per package; tiny dirs are merged
+    assert parts == {
+        ROOT_PARTITION: 2,
+        "packages/api": 8,
+        "packages/cli": 8,
+        "packages/web": 8,
+        "docs": 4,
+        OTHER_PARTITION: 1,
+    }
+    capped = partition_index(index_repo(tmp_path), max_partitions=3)
+    assert [p.name for p in capped] == [ROOT_PARTITION, "packages/api", OTHER_PARTITION]
+
+
+def test_planner_picks_mapreduce_for_huge_repos_when_profile_allows(tmp_path: Path, monkeypatch):
+    _monorepo(tmp_path)
+    monkeypatch.setenv("PLANNER_MAPREDUCE_FILES", "10")
+    monkeypatch.setenv("MAPREDUCE_PARTITION_CHARS", "400")
+    index = index_repo(tmp_path)
+
+    plan = plan_retrieval(index, profile=resolve_profile("balanced"))
+    assert plan.mode == "mapreduce"
+    assert plan.est_map_calls == len(plan.partitions) == 6
+    assert "partitions" not in plan.summary()
+
+    assert plan_retrieval(index, profile=resolve_profile("fast")).mode != "mapreduce"
+
+
+def test_summarize_map_reduce_runs_partitions_concurrently_and_caches_them(tmp_path: Path, monkeypatch):
+    _monorepo(tmp_path)
+    monkeypatch.setenv("PLANNER_MAPREDUCE_FILES", "10")
+    monkeypatch.setenv("MAPREDUCE_CONCURRENCY", "2")
+    monkeypatch.setenv("LLM_PROVIDER", "openai")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    running = {"now": 0, "max": 0}
+    map_tiers = []
+    reduce_prompts = []
+
+    async def fake_map(messages, **kwargs):
+        map_tiers.append(kwargs.get("model_tier"))
+        running["now"] += 1
+        running["max"] = max(running["max"], running["now"])
+        await asyncio.sleep(0.01)
+        running["now"] -= 1
+        part = messages[1]["content"].split("Part: ", 1)[1].split(" (", 1)[0]
+        return '{"summary": "Part %s.", "technologies": ["TypeScript"], "role": "library"}' % part
+
+    async def fake_reduce(messages, **kwargs):
+        reduce_prompts.append(messages[1]["content"])
+        return '{"summary": "mono", "technologies": ["TypeScript"], "structure": "packages/*"}'
+
+    monkeypatch.setattr("app.mapreduce.chat_completion", fake_map)
+    monkeypatch.setattr("app.summarize.chat_completion", fake_reduce)
+    profile = resolve_profile("balanced")
+
+    out = asyncio.run(summarize_repo(tmp_path, profile))
+
+    assert out["summary"] == "mono"
+    assert out["meta"]["retrieval_mode"] == "mapreduce-6of6parts"
+    assert len(map_tiers) == 6 and set(map_tiers) == {"fast"}
+    assert running["max"] == 2
+    assert "=== PART: packages/web (8 files" in reduce_prompts[0]
+    assert "Part packages/web." in reduce_prompts[0]
+
+    # unchanged partitions come from the partial cache
+    asyncio.run(summarize_repo(tmp_path, profile))
+    assert len(map_tiers) == 6
+    assert reduce_prompts[1] == reduce_prompts[0]
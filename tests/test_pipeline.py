@@ -0,0 +1,53 @@
+import asyncio
+import time
+
+import pytest
+
+from app.pipeline import PipelineError, Stage, run_stages
+
+
+def test_independent_stages_run_concurrently():
+    async def slow(value):
+        await asyncio.sleep(0.2)
+        return value
+
+    async def a():
+        return await slow(1)
+
+    async def b():
+        return await slow(2)
+
+    timings = {}
+    started = time.monotonic()
+    out = asyncio.run(
+        run_stages(
+            [Stage("a", a), Stage("b", b), Stage("sum", lambda a, b: a + b, deps=("a", "b"))],
+            timings=timings,
+        )
+    )
+    assert out["sum"] == 3
+    assert time.monotonic() - started < 0.35
+    assert set(timings) == {"a", "b", "sum"}
+
+
+def test_optional_stage_failure_yields_none():
+    def boom():
+        raise RuntimeError("embeddings down")
+
+    out = asyncio.run(
+        run_stages([Stage("vecs", boom, optional=True), Stage("use", lambda vecs: vecs is None, deps=("vecs",))])
+    )
+    assert out["use"] is True
+
+
+def test_required_stage_failure_propagates():
+    def boom():
+        raise RuntimeError("disk gone")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(run_stages([Stage("x", boom)]))
+
+
+def test_dependencies_must_be_declared_first():
+    with pytest.raises(PipelineError):
+        asyncio.run(run_stages([Stage("b", lambda a: a, deps=("a",)), Stage("a", lambda: 1)]))
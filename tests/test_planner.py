@@ -0,0 +1,41 @@
+from pathlib import Path
+
+from app.planner import plan_retrieval
+from app.selection import index_repo
+
+
+def test_small_repo_plans_classic(tmp_path: Path):
+    (tmp_path / "README.md").write_text("# demo\n" * 20, encoding="utf-8")
+    (tmp_path / "main.py").write_text("print('hi')\n", encoding="utf-8")
+
+    plan = plan_retrieval(index_repo(tmp_path), embed_model="text-embedding-3-small")
+
+    assert plan.mode == "classic"
+    assert plan.est_embed_inputs == 0
+    assert plan.repo_files == 2
+
+
+def test_larger_repo_plans_rag_with_embedding_estimate(tmp_path: Path):
+    (tmp_path / "README.md").write_text("# demo\n" + "words " * 2000, encoding="utf-8")
+    for i in range(30):
+        (tmp_path / f"mod{i}.py").write_text(f"def f{i}():\n" + "    pass\n" * 400, encoding="utf-8")
+
+    plan = plan_retrieval(index_repo(tmp_path), embed_model="text-embedding-3-small")
+
+    assert plan.mode == "rag"
+    assert plan.est_chunks > 0
+    assert plan.est_embed_inputs > plan.est_chunks // 2
+    assert len(plan.fingerprints) == plan.max_files
+
+
+def test_huge_repo_plans_multistage(tmp_path: Path, monkeypatch):
+    monkeypatch.setenv("PLANNER_LARGE_REPO_FILES", "50")
+    for i in range(120):
+        (tmp_path / f"mod{i}.py").write_text(f"def f{i}():\n" + "    pass\n" * 400, encoding="utf-8")
+
+    plan = plan_retrieval(index_repo(tmp_path), embed_model=None)
+
+    assert plan.mode == "multistage"
+    assert plan.max_files > 28
+    assert plan.prefilter is not None
+    assert plan.est_embed_inputs == 0  # keyword retrieval: nothing to embed
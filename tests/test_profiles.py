@@ -0,0 +1,72 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.profiles import ProfileError, resolve_profile
+from conftest import GITHUB_SHA as SHA
+
+
+
+def test_resolve_profile_overrides_and_keys():
+    fast = resolve_profile("fast")
+    assert fast.use_embeddings is False
+    tuned = resolve_profile("fast", top_k=7, max_files=None)
+    assert tuned.top_k == 7 and tuned.max_files == fast.max_files
+    assert tuned.key() != fast.key()
+    assert resolve_profile().name == "balanced"
+
+    with pytest.raises(ProfileError):
+        resolve_profile("turbo")
+
+
+def test_model_override_requires_allowlist(monkeypatch):
+    monkeypatch.delenv("LLM_ALLOWED_MODELS", raising=False)
+    with pytest.raises(ProfileError):
+        resolve_profile("thorough", model="gpt-4o")
+    monkeypatch.setenv("LLM_ALLOWED_MODELS", "gpt-4o, gpt-4o-mini")
+    assert resolve_profile("thorough", model="gpt-4o").model == "gpt-4o"
+
+
+def test_mode_is_reported_and_part_of_cache_key(monkeypatch, github_api):
+    monkeypatch.setenv("GITHUB_TOKEN", "tok-test")
+    monkeypatch.setenv("LLM_PROVIDER", "openai")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    calls = []
+
+    async def fake_chat_completion(*args, **kwargs):
+        calls.append(kwargs.get("model_tier"))
+        return '{"summary":"demo","technologies":["Python"],"structure":"app/"}'
+
+    monkeypatch.setattr("app.summarize.chat_completion", fake_chat_completion)
+
+    client = TestClient(app)
+    url = "https://github.com/o/r"
+    first = client.post("/summarize", json={"github_url": url, "mode": "fast"}).json()
+    again = client.post("/summarize", json={"github_url": url, "mode": "fast"}).json()
+    thorough = client.post("/summarize", json={"github_url": url, "mode": "thorough"}).json()
+    bad = client.post("/summarize", json={"github_url": url, "mode": "turbo"})
+
+    assert first["meta"]["mode"] == "fast"
+    assert first["meta"]["commit"] == SHA
+    assert first["meta"]["cached"] is False
+    assert again["meta"]["cached"] is True
+    assert thorough["meta"]["mode"] == "thorough" and thorough["meta"]["cached"] is False
+    assert calls == ["fast", "thorough"]
+    assert bad.status_code == 422
+
+
+def test_anonymous_requests_skip_the_commit_lookup(monkeypatch, github_api):
+    monkeypatch.delenv("GITHUB_TOKEN", raising=False)
+    monkeypatch.delenv("GITHUB_TOKENS", raising=False)
+    monkeypatch.setenv("LLM_PROVIDER", "openai")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+
+    async def fake_chat_completion(*args, **kwargs):
+        return '{"summary":"demo","technologies":["Python"],"structure":"app/"}'
+
+    monkeypatch.setattr("app.summarize.chat_completion", fake_chat_completion)
+
+    meta = TestClient(app).post("/summarize", json={"github_url": "https://github.com/o/r"}).json()["meta"]
+
+    assert not github_api["commits"].called
+    assert meta["commit"] is None and meta["cached"] is False
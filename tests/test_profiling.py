@@ -0,0 +1,101 @@
+import time
+import threading
+
+from fastapi.testclient import TestClient
+
+from app import profiling
+from app.main import app
+from app.profiling import RequestProfile, StackSampler, record_timing, server_timing, timed
+
+
+def test_timings_only_recorded_inside_a_request_profile():
+    record_timing("orphan", 1.0)  # no active request: ignored
+
+    with RequestProfile("/x") as prof:
+        with timed("download"):
+            pass
+        record_timing("llm", 0.25)
+        record_timing("llm", 0.25)
+
+    assert set(prof.timings) == {"download", "llm", "total"}
+    assert prof.timings["llm"] == 0.5
+    assert prof.profile_id is None  # not sampled
+    assert server_timing({"llm": 0.5, "rag stage": 0.0012}) == "llm;dur=500.0, rag_stage;dur=1.2"
+
+
+def _busy_loop(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(i * i for i in range(1000))
+
+
+def test_stack_sampler_sees_worker_threads():
+    stop = threading.Event()
+    worker = threading.Thread(target=_busy_loop, args=(stop,), name="busy")
+    sampler = StackSampler(interval_s=0.001)
+    worker.start()
+    sampler.start()
+    time.sleep(0.1)
+    sampler.stop()
+    stop.set()
+    worker.join()
+
+    assert sampler.samples > 0
+    assert any(line.startswith("busy;") and "_busy_loop" in line for line in sampler.folded().splitlines())
+
+
+def test_summarize_profile_on_demand_in_dev(monkeypatch, github_api):
+    monkeypatch.setenv("ENV", "dev")
+    monkeypatch.setenv("DEBUG_TOKEN", "d3bug")
+    monkeypatch.setenv("WARMUP_ENABLED", "0")
+    monkeypatch.setenv("LLM_PROVIDER", "openai")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(profiling, "PROFILES", profiling.ProfileBuffer(2))
+    monkeypatch.setattr("app.main.PROFILES", profiling.PROFILES)
+
+    async def fake_chat_completion(*args, **kwargs):
+        return '{"summary":"demo","technologies":["Python"],"structure":"app/"}'
+
+    monkeypatch.setattr("app.summarize.chat_completion", fake_chat_completion)
+
+    with TestClient(app) as client:
+        resp = client.post(
+            "/summarize", json={"github_url": "https://github.com/o/r"}, headers={"X-Profile": "1"}
+        )
+        assert resp.status_code == 200, resp.text
+        names = [part.split(";")[0] for part in resp.headers["Server-Timing"].split(", ")]
+        assert {"github", "download", "extract", "index", "llm", "total"} <= set(names)
+        assert set(resp.json()["meta"]["timings"]) == set(names)
+
+        profile_id = resp.headers["X-Profile-Id"]
+        assert resp.json()["meta"]["profile_id"] == profile_id
+        debug = {"X-Debug-Token": "d3bug"}
+        listed = client.get("/debug/profiles", headers=debug).json()["profiles"]
+        assert [p["id"] for p in listed] == [profile_id]
+        assert listed[0]["label"] == "o/r"
+
+        assert client.get(f"/debug/profiles/{profile_id}", headers=debug).json()["samples"] >= 0
+        download = client.get(f"/debug/profiles/{profile_id}/download", headers=debug)
+        assert download.status_code == 200
+        assert "attachment" in download.headers["content-disposition"]
+
+        # without the header (and PROFILE_SAMPLE_RATE unset) nothing is captured
+        resp = client.post("/summarize", json={"github_url": "https://github.com/o/r"})
+        assert "X-Profile-Id" not in resp.headers
+        assert "Server-Timing" in resp.headers
+        assert len(client.get("/debug/profiles", headers=debug).json()["profiles"]) == 1
+
+
+def test_debug_profiles_need_a_token(monkeypatch):
+    monkeypatch.setenv("ENV", "prod")
+    monkeypatch.setenv("WARMUP_ENABLED", "0")
+    monkeypatch.delenv("PROFILE_SAMPLE_RATE", raising=False)
+    monkeypatch.delenv("DEBUG_TOKEN", raising=False)
+    assert not profiling.should_sample({"x-profile": "1"})
+    routes = ["/debug/profiles", "/debug/profiles/abc", "/debug/profiles/abc/download"]
+    with TestClient(app) as client:
+        assert [client.get(r).status_code for r in routes] == [404, 404, 404]
+        monkeypatch.setenv("ENV", "dev")  # dev alone no longer opens them
+        assert [client.get(r).status_code for r in routes] == [404, 404, 404]
+        monkeypatch.setenv("DEBUG_TOKEN", "d3bug")
+        assert [client.get(r, headers={"X-Debug-Token": "nope"}).status_code for r in routes] == [401, 401, 401]
+        assert client.get(routes[0], headers={"X-Debug-Token": "d3bug"}).status_code == 200
@@ -1,5 +1,5 @@
 from pathlib import Path
-from app.selection import select_files
+from app.selection import select_files, safe_read_text, sniff_file
 
 
 def test_select_files_prefers_docs_and_configs(tmp_path: Path):
@@ -13,4 +13,47 @@ def test_select_files_prefers_docs_and_configs(tmp_path: Path):
 
     assert "README.md" in rels
     assert "pyproject.toml" in rels
-    assert all(not r.startswith("node_modules") for r in rels)
\ No newline at end of file
+    assert all(not r.startswith("node_modules") for r in rels)
+
+def test_select_files_skips_binary_and_demotes_minified(tmp_path: Path):
+    (tmp_path / "README.md").write_text("# hi", encoding="utf-8")
+    (tmp_path / "module.wasm2").write_bytes(b"\x00asm\x01\x00\x00\x00" * 100)
+    (tmp_path / "app.py").write_text("print('hi')\n", encoding="utf-8")
+    (tmp_path / "main.py").write_text("var a=1;" * 400, encoding="utf-8")
+
+    selected = select_files(tmp_path, max_files=10)
+    rels = [str(s.path.relative_to(tmp_path)) for s in selected]
+
+    assert "module.wasm2" not in rels
+    # main.py gets a name bonus but is one 3200-char line, so it drops below app.py
+    assert rels.index("app.py") < rels.index("main.py")
+
+
+def test_long_prose_lines_are_not_minified(tmp_path: Path):
+    paragraph = "This project summarizes repositories and explains how to run them. " * 20
+    (tmp_path / "GUIDE.md").write_text(paragraph + "\n", encoding="utf-8")
+    (tmp_path / "bundle.js").write_text("var a=1;" * 200, encoding="utf-8")
+
+    assert not sniff_file(tmp_path / "GUIDE.md").minified
+    assert sniff_file(tmp_path / "bundle.js").minified
+
+
+def test_safe_read_text_is_bounded(tmp_path: Path):
+    p = tmp_path / "big.txt"
+    p.write_text("é" * 200_000, encoding="utf-8")
+    text = safe_read_text(p, max_chars=100)
+    assert text.startswith("é" * 100)
+    assert text.endswith("(truncated)")
+
+    latin = tmp_path / "latin.txt"
+    latin.write_bytes("caf\xe9\n".encode("latin-1"))
+    assert safe_read_text(latin, max_chars=100) == "café\n"
+
+    # one invalid byte past the kept prefix must not turn valid UTF-8 into mojibake
+    late = tmp_path / "late.md"
+    late.write_bytes("# Café — naïve\n".encode("utf-8") + b"x" * 30000 + b"\xff")
+    assert safe_read_text(late, max_chars=100).startswith("# Café — naïve\n")
+
+    binary = tmp_path / "blob.dat"
+    binary.write_bytes(b"\x00\x01\x02" * 50)
+    assert safe_read_text(binary, max_chars=100) == ""
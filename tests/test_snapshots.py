@@ -0,0 +1,73 @@
+import asyncio
+
+from app.snapshots import SnapshotStore
+
+
+def _populator(calls, size=1000):
+    async def populate(dest):
+        calls.append(dest)
+        await asyncio.sleep(0.01)
+        top = dest / "owner-repo-abc1234"
+        top.mkdir()
+        (top / "README.md").write_bytes(b"x" * size)
+
+    return populate
+
+
+def test_concurrent_misses_share_one_population(tmp_path):
+    store = SnapshotStore(tmp_path / "snaps", max_bytes=10_000)
+    calls = []
+
+    async def main():
+        return await asyncio.gather(*[store.acquire("k1", _populator(calls)) for _ in range(5)])
+
+    snaps = asyncio.run(main())
+    assert len(calls) == 1
+    assert all(s.repo_root.name == "owner-repo-abc1234" for s in snaps)
+    assert (snaps[0].repo_root / "README.md").exists()
+    for s in snaps:
+        s.release()
+
+    # survives a restart
+    again = SnapshotStore(tmp_path / "snaps", max_bytes=10_000)
+    assert again.total_bytes == 1000
+
+
+def test_lru_eviction_skips_pinned_snapshots(tmp_path):
+    store = SnapshotStore(tmp_path / "snaps", max_bytes=2500)
+    calls = []
+
+    async def main():
+        a = await store.acquire("a", _populator(calls))
+        b = await store.acquire("b", _populator(calls))
+        b.release()
+        # "a" is still pinned; adding "c" must evict "b", the only unpinned entry
+        c = await store.acquire("c", _populator(calls))
+        c.release()
+        return a
+
+    a = asyncio.run(main())
+    store.drain()
+    names = sorted(p.name for p in (tmp_path / "snaps").iterdir())
+    assert names == ["a", "c"]
+    assert (a.repo_root / "README.md").exists()
+    a.release()
+    assert store.total_bytes == 2000
+
+
+def test_failed_population_leaves_nothing_behind(tmp_path):
+    store = SnapshotStore(tmp_path / "snaps", max_bytes=10_000)
+
+    async def broken(dest):
+        (dest / "partial").write_text("x")
+        raise RuntimeError("download failed")
+
+    async def main():
+        try:
+            await store.acquire("k", broken)
+        except RuntimeError:
+            pass
+
+    asyncio.run(main())
+    store.drain()
+    assert list((tmp_path / "snaps").iterdir()) == []
@@ -1,4 +1,54 @@
+import io
+import zipfile
 
-def test_urls_placeholder():
-    # URL parsing/validation tests should be added once the URL helper is exposed.
-    assert True
+import pytest
+
+from app.github import GitHubBadUrl, GitHubNotFound, RepoRef, extract_zip_to_dir, parse_github_repo_url
+
+
+@pytest.mark.parametrize(
+    "url, expected",
+    [
+        ("https://github.com/o/r", RepoRef("o", "r")),
+        ("https://github.com/o/r.git", RepoRef("o", "r")),
+        ("https://github.com/o/r/issues", RepoRef("o", "r")),
+        ("https://github.com/o/r/tree/v2", RepoRef("o", "r", ref="v2")),
+        ("https://github.com/o/r/tree/v2/services/billing/", RepoRef("o", "r", ref="v2", subpath="services/billing")),
+        ("https://github.com/o/r/tree/main/my%20app?x=1", RepoRef("o", "r", ref="main", subpath="my app")),
+        ("https://github.com/o/r/blob/v2/services/billing/main.py", RepoRef("o", "r", ref="v2", subpath="services/billing")),
+        ("https://github.com/o/r/blob/v2/README.md#usage", RepoRef("o", "r", ref="v2")),
+    ],
+)
+def test_parse_github_repo_url(url, expected):
+    assert parse_github_repo_url(url) == expected
+
+
+def test_parse_rejects_bad_urls():
+    for url in ("https://gitlab.com/o/r", "https://github.com/o", "https://github.com/o/r/tree/main/../secrets"):
+        with pytest.raises(GitHubBadUrl):
+            parse_github_repo_url(url)
+    assert RepoRef("o", "r", ref="v2", subpath="svc/a").slug == "o/r@v2:svc/a"
+
+
+def _zipball() -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as z:
+        z.writestr("o-r-abc/README.md", "# root\n")
+        z.writestr("o-r-abc/services/billing/main.py", "print('billing')\n")
+        z.writestr("o-r-abc/services/billing-old/main.py", "print('old')\n")
+        z.writestr("o-r-abc/services/search/main.py", "print('search')\n")
+    return buf.getvalue()
+
+
+def test_extract_only_the_subpath(tmp_path):
+    root = extract_zip_to_dir(_zipball(), tmp_path, "services/billing")
+
+    assert root == tmp_path / "o-r-abc" / "services" / "billing"
+    assert (root / "main.py").read_text() == "print('billing')\n"
+    written = sorted(p.relative_to(tmp_path).as_posix() for p in tmp_path.rglob("*") if p.is_file())
+    assert written == ["o-r-abc/services/billing/main.py"]
+
+    with pytest.raises(GitHubNotFound):
+        extract_zip_to_dir(_zipball(), tmp_path / "other", "services/missing")
+    with pytest.raises(GitHubBadUrl):
+        extract_zip_to_dir(_zipball(), tmp_path / "file", "services/billing/main.py")
@@ -0,0 +1,208 @@
+import asyncio
+import time
+
+import httpx
+import respx
+from fastapi.testclient import TestClient
+
+from app import main, warming
+from app.cache import get_result_cache
+from app.github import RepoRef
+from app.main import app
+from app.profiles import resolve_profile
+from app.summarize import result_key
+from app.warming import Warmer
+
+SHA = "a" * 40
+COMMIT_URL = "https://api.github.com/repos/o/r/commits/main"
+
+
+def _commit_answer(request: httpx.Request) -> httpx.Response:
+    if request.headers.get("If-None-Match") == '"v1"':
+        return httpx.Response(304)
+    return httpx.Response(200, text=SHA, headers={"ETag": '"v1"'})
+
+
+def test_popularity_ranking_and_named_profiles_only():
+    warmer = Warmer(summarize=None)
+    hot, cold = RepoRef("o", "hot"), RepoRef("o", "cold")
+    for _ in range(3):
+        warmer.record(hot, resolve_profile("balanced"))
+    warmer.record(cold, resolve_profile("fast"))
+    warmer.record(cold, resolve_profile("balanced", top_k=3))  # overridden: not tracked
+
+    top = warmer.top(5)
+    assert [(t.ref.repo, t.profile.name) for t in top] == [("hot", "balanced"), ("cold", "fast")]
+    assert 2.9 < top[0].score <= 3.0
+
+
+def test_unchanged_repo_is_not_resummarized(monkeypatch, sample_repo_zip_bytes):
+    monkeypatch.setattr(warming, "LOAD", warming.InteractiveLoad())
+    monkeypatch.delenv("GITHUB_TOKEN", raising=False)
+    monkeypatch.delenv("GITHUB_TOKENS", raising=False)
+    calls = []
+
+    async def fake_chat_completion(*args, **kwargs):
+        calls.append(kwargs.get("model_tier"))
+        return '{"summary":"demo","technologies":["Python"],"structure":"app/"}'
+
+    monkeypatch.setattr("app.summarize.chat_completion", fake_chat_completion)
+    warmer = Warmer(main._refresh)  # the real refresh path, anonymous GitHub access
+    warmer.record(RepoRef("o", "r"), resolve_profile("balanced"))
+
+    with respx.mock(assert_all_called=False) as rs:
+        rs.get("https://api.github.com/repos/o/r").respond(200, json={"default_branch": "main"})
+        commits = rs.get(COMMIT_URL).mock(side_effect=_commit_answer)
+        zipball = rs.get(f"https://api.github.com/repos/o/r/zipball/{SHA}").respond(200, content=sample_repo_zip_bytes)
+
+        assert asyncio.run(warmer.tick()) == 1  # nothing cached yet
+        assert asyncio.run(warmer.tick()) == 0  # 304, and cached under the sha the warmer checked
+        assert asyncio.run(warmer.tick()) == 0
+
+    assert len(calls) == 1 and zipball.call_count == 1
+    assert get_result_cache().age(result_key("o", "r", SHA, resolve_profile("balanced"))) is not None
+    assert commits.calls[-1].request.headers["If-None-Match"] == '"v1"'
+
+
+def test_missing_repo_is_dropped_and_warming_needs_a_token(monkeypatch):
+    warmer = Warmer(summarize=None)
+    warmer.record(RepoRef("o", "gone"), resolve_profile("balanced"))
+
+    with respx.mock as rs:
+        rs.get("https://api.github.com/repos/o/gone").respond(404)
+        assert asyncio.run(warmer.tick()) == 0
+    assert warmer.top(5) == []
+
+    monkeypatch.setenv("WARM_ENABLED", "1")
+    monkeypatch.delenv("GITHUB_TOKEN", raising=False)
+    monkeypatch.delenv("GITHUB_TOKENS", raising=False)
+    assert not warming.warming_enabled()
+    monkeypatch.setenv("GITHUB_TOKEN", "tok-test")
+    assert warming.warming_enabled()
+
+
+def test_first_check_of_a_freshly_cached_repo_does_nothing():
+    calls = []
+
+    async def summarize(ref, profile, sha):
+        calls.append(ref)
+
+    warmer = Warmer(summarize)
+    ref, profile = RepoRef("o", "r"), resolve_profile("balanced")
+    warmer.record(ref, profile)
+    get_result_cache().put(result_key("o", "r", SHA, profile), {"meta": {}})  # the user's request just ran
+
+    with respx.mock(assert_all_called=False) as rs:
+        rs.get("https://api.github.com/repos/o/r").respond(200, json={"default_branch": "main"})
+        rs.get(COMMIT_URL).mock(side_effect=_commit_answer)
+        assert asyncio.run(warmer.tick()) == 0
+
+    assert calls == []
+    assert warmer.top(1)[0].sha == SHA
+
+
+def test_stale_or_moved_repo_is_resummarized(monkeypatch):
+    monkeypatch.setenv("RESULT_CACHE_TTL_S", "100")
+    calls = []
+
+    async def summarize(ref, profile, sha):
+        calls.append(sha)
+
+    warmer = Warmer(summarize)
+    ref, profile = RepoRef("o", "r"), resolve_profile("balanced")
+    warmer.record(ref, profile)
+    item = warmer.top(1)[0]
+    item.branch, item.sha, item.etag = "main", SHA, '"v1"'
+    results = get_result_cache()
+    results.put(result_key("o", "r", SHA, profile), {"meta": {}})
+    results._items[result_key("o", "r", SHA, profile)] = (time.time() - 90, {"meta": {}})  # 90% of the TTL
+
+    with respx.mock as rs:
+        rs.get(COMMIT_URL).mock(side_effect=_commit_answer)
+        assert asyncio.run(warmer.tick()) == 1
+
+    item.etag = '"old"'  # the branch moved since the last lookup
+    item.sha = "b" * 40
+    with respx.mock as rs:
+        rs.get(COMMIT_URL).mock(side_effect=_commit_answer)
+        assert asyncio.run(warmer.tick()) == 1
+    assert item.sha == SHA
+    assert calls == [SHA, SHA]
+
+
+def test_refresh_endpoint_requires_token_and_queues(monkeypatch):
+    monkeypatch.setenv("WARMUP_ENABLED", "0")
+    monkeypatch.setenv("REFRESH_TOKEN", "s3cret")
+    monkeypatch.setenv("GITHUB_TOKEN", "tok-test")
+    queued = []
+    warmer = Warmer(summarize=None)
+    warmer.request_refresh = lambda ref, profile: queued.append((ref.repo, profile.name))
+    monkeypatch.setattr("app.main.WARMER", warmer)
+
+    with TestClient(app) as client:
+        body = {"github_url": "https://github.com/o/r"}
+        monkeypatch.delenv("REFRESH_TOKEN")
+        assert client.post("/refresh", json=body, headers={"X-Refresh-Token": ""}).status_code == 404
+        monkeypatch.setenv("REFRESH_TOKEN", "s3cret")
+        assert client.post("/refresh", json=body).status_code == 401
+        assert client.post("/refresh", json=body, headers={"X-Refresh-Token": "nope"}).status_code == 401
+        monkeypatch.delenv("GITHUB_TOKEN")
+        assert client.post("/refresh", json=body, headers={"X-Refresh-Token": "s3cret"}).status_code == 503
+        monkeypatch.setenv("GITHUB_TOKEN", "tok-test")
+
+        resp = client.post("/refresh", json={**body, "mode": "fast"}, headers={"X-Refresh-Token": "s3cret"})
+        assert resp.status_code == 202
+        assert resp.json() == {"owner": "o", "repo": "r", "modes": ["fast"]}
+
+        resp = client.post("/refresh", json=body, headers={"X-Refresh-Token": "s3cret"})
+        assert resp.json()["modes"] == ["balanced"]  # nothing tracked yet
+
+        warmer.record(RepoRef("o", "r"), resolve_profile("thorough"))
+        resp = client.post("/refresh", json=body, headers={"X-Refresh-Token": "s3cret"})
+        assert resp.json()["modes"] == ["thorough"]
+
+    assert queued == [("r", "fast"), ("r", "balanced"), ("r", "thorough")]
+
+
+def test_queued_refreshes_are_capped_and_drained(monkeypatch):
+    monkeypatch.setenv("WARM_TRACK_MAX", "2")
+    done = []
+
+    async def summarize(ref, profile, sha):
+        done.append(ref.repo)
+        if ref.repo == "a":
+            # queued while the one-off pass is busy: must not be lost
+            warmer.request_refresh(RepoRef("o", "c"), profile)
+        await asyncio.sleep(0)
+
+    warmer = Warmer(summarize)
+    profile = resolve_profile("balanced")
+
+    async def fake_check(item, forced=False):
+        assert forced
+        await warmer.summarize(item.ref, item.profile, None)
+        return True
+
+    warmer._check = fake_check
+
+    async def run():
+        warmer.request_refresh(RepoRef("o", "a"), profile)
+        warmer.request_refresh(RepoRef("o", "b"), profile)
+        await warmer._oneoff
+
+    asyncio.run(run())
+    assert sorted(done) == ["a", "b", "c"]
+    assert len(warmer.top(10)) == 2  # WARM_TRACK_MAX applies to queued refreshes too
+    assert not any(t.dirty for t in warmer.top(10))
+
+
+def test_failed_requests_do_not_count_as_popular(monkeypatch):
+    monkeypatch.setenv("WARMUP_ENABLED", "0")
+    warmer = Warmer(summarize=None)
+    monkeypatch.setattr("app.main.WARMER", warmer)
+
+    with respx.mock(assert_all_called=False) as rs, TestClient(app) as client:
+        rs.get("https://api.github.com/repos/o/nope").respond(404)
+        assert client.post("/summarize", json={"github_url": "https://github.com/o/nope"}).status_code == 404
+
+    assert warmer.top(5) == []
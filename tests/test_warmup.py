@@ -0,0 +1,52 @@
+import time
+
+import respx
+from fastapi.testclient import TestClient
+
+from app import rag
+from app.main import app
+from app.warmup import READINESS
+
+
+def test_ready_is_503_before_warmup():
+    READINESS.reset()
+    client = TestClient(app)  # no lifespan: warm-up never ran
+    resp = client.get("/health/ready")
+    assert resp.status_code == 503
+    assert resp.json()["status"] == "starting"
+
+
+def test_warmup_gates_readiness(monkeypatch, tmp_path):
+    READINESS.reset()
+    cache_path = tmp_path / "embeddings.json"
+    monkeypatch.setenv("WARMUP_ENABLED", "1")
+    monkeypatch.setenv("LLM_PROVIDER", "openai")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("EMBED_CACHE_PATH", str(cache_path))
+    rag._EMBED_CACHE.clear()
+
+    with respx.mock(assert_all_called=False) as rs:
+        rs.get("https://api.github.com/rate_limit").respond(200, json={})
+        rs.get("https://api.openai.com/v1/models").respond(200, json={"data": []})
+        embeddings = rs.post("https://api.openai.com/v1/embeddings").respond(
+            200,
+            json={"data": [{"index": i, "embedding": [float(i), 1.0]} for i in range(len(rag.RAG_QUERIES))]},
+        )
+
+        with TestClient(app) as client:
+            deadline = time.monotonic() + 5
+            resp = client.get("/health/ready")
+            while resp.status_code != 200 and time.monotonic() < deadline:
+                time.sleep(0.02)
+                resp = client.get("/health/ready")
+
+        assert resp.status_code == 200
+        body = resp.json()
+        assert body["status"] == "ready"
+        assert body["components"] == {"github": "ok", "llm": "ok", "embeddings": "ok"}
+        assert embeddings.call_count == 1
+
+    # query vectors were persisted on shutdown and are reloaded without a network call
+    assert cache_path.exists()
+    rag._EMBED_CACHE.clear()
+    assert rag.load_embed_cache(str(cache_path)) == len(rag.RAG_QUERIES)
@@ -1,17 +1,165 @@
-import os, json, requests, streamlit as st
+import os, json, time, threading, requests, streamlit as st
+from collections import OrderedDict
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 st.set_page_config(page_title="Repo Summarizer", page_icon="🧠", layout="centered")
 
 API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000").rstrip("/")
 DEFAULT_REPO = "https://github.com/psf/requests"
 
+CACHE_TTL_S = float(os.getenv("UI_CACHE_TTL_S", "3600"))
+CACHE_MAX_ENTRIES = int(os.getenv("UI_CACHE_MAX_ENTRIES", "200"))
+POLL_INTERVAL_S = float(os.getenv("UI_POLL_INTERVAL_S", "1.0"))
+# Used only when the API reports no job deadline; otherwise the UI waits as long as the job may run.
+JOB_TIMEOUT_S = float(os.getenv("UI_JOB_TIMEOUT_S", "900"))
+
+
+class ResultCache:
+    """Process-wide summaries keyed by (repo URL, commit, mode), with TTL and LRU bound.
+
+    Shared by all browser sessions of this Streamlit server: re-renders and the
+    "Recent summaries" sidebar are served from here. New clicks always go to the API,
+    whose own result cache answers repeats (the UI does not spend GitHub quota on a
+    commit lookup of its own).
+    """
+
+    def __init__(self, ttl_s: float, max_entries: int):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (stored_at, data)
+
+    def get(self, key: tuple):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            if time.time() - item[0] > self.ttl_s:
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return item[1]
+
+    def put(self, key: tuple, data: dict) -> None:
+        with self._lock:
+            self._items[key] = (time.time(), data)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def recent(self, n: int = 10) -> list:
+        now = time.time()
+        with self._lock:
+            live = [(k, v) for k, v in self._items.items() if now - v[0] <= self.ttl_s]
+        return list(reversed(live))[:n]
+
+
+@st.cache_resource
+def http_session() -> requests.Session:
+    """One pooled session per Streamlit server: keep-alive connections to the API."""
+    s = requests.Session()
+    retry = Retry(total=2, backoff_factor=0.3, status_forcelist=(502, 503, 504), allowed_methods=("GET",))
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    return s
+
+
+@st.cache_resource
+def result_cache() -> ResultCache:
+    return ResultCache(CACHE_TTL_S, CACHE_MAX_ENTRIES)
+
+
+def error_message(resp) -> str:
+    try:
+        err = resp.json()
+    except Exception:
+        err = {"status": "error", "message": resp.text}
+    return f"Error {resp.status_code}: {err.get('message') or err.get('detail') or resp.text}"
+
+
+def run_job(url: str, mode: str, status):
+    """Submit a background job and poll it; returns (data, error)."""
+    session = http_session()
+    try:
+        resp = session.post(f"{API_BASE_URL}/jobs", json={"github_url": url, "mode": mode}, timeout=15)
+    except Exception as e:
+        return None, f"Request failed: {e}"
+    if resp.status_code >= 400:
+        return None, error_message(resp)
+
+    accepted = resp.json()
+    job_id = accepted["job_id"]
+    # the server gives up at its job deadline; waiting less would abandon a running job
+    timeout_s = accepted["deadline_s"] + 10 if accepted.get("deadline_s") else JOB_TIMEOUT_S
+    started = time.time()
+    while time.time() - started < timeout_s:
+        try:
+            r = session.get(f"{API_BASE_URL}/jobs/{job_id}", timeout=10)
+        except Exception as e:
+            return None, f"Polling failed: {e}"
+        if r.status_code >= 400:
+            return None, error_message(r)
+        job = r.json()
+        if job["status"] == "done":
+            return job["result"], None
+        if job["status"] == "error":
+            err = job.get("error") or {}
+            return None, f"Error {err.get('status_code', 500)}: {err.get('message', 'Summarization failed.')}"
+        status.update(label=f"Summarizing… {job['stage']} ({int(time.time() - started)}s)")
+        time.sleep(POLL_INTERVAL_S)
+    return None, f"Timed out after {int(timeout_s)}s waiting for the summary."
+
+
+def render(data: dict, caption: str = "") -> None:
+    if caption:
+        st.caption(caption)
+
+    st.subheader("Summary")
+    st.write(data.get("summary", ""))
+
+    st.subheader("Technologies")
+    tech = data.get("technologies", []) or []
+    st.write(", ".join(tech) if tech else "—")
+
+    st.subheader("Structure")
+    st.write(data.get("structure", ""))
+
+    timings = (data.get("meta") or {}).get("timings") or {}
+    if timings:
+        with st.expander(f"Timings ({timings.get('total', 0) / 1000:.1f}s)"):
+            st.bar_chart({"ms": {k: v for k, v in timings.items() if k != "total"}}, horizontal=True)
+
+    with st.expander("Raw JSON"):
+        st.code(json.dumps(data, indent=2), language="json")
+
+
 st.title("🧠 GitHub Repo Summarizer")
-st.caption("Enter a public GitHub repository URL. The UI calls the FastAPI backend and shows the LLM-generated summary.")
+st.caption("Enter a public GitHub repository URL (or a `/tree/<ref>/<path>` URL to summarize one directory). The UI calls the FastAPI backend and shows the LLM-generated summary.")
+
+with st.sidebar:
+    st.subheader("Recent summaries")
+    recent = result_cache().recent()
+    if not recent:
+        st.caption("Nothing cached yet.")
+    for (url, commit, mode), _ in recent:
+        label = url.replace("https://github.com/", "") + (f" @ {commit[:7]}" if commit else "") + f" ({mode})"
+        if st.button(label, key=f"recent-{url}-{commit}-{mode}"):
+            st.session_state["show"] = (url, commit, mode)
 
 repo_url = st.text_input(
     "GitHub repository URL",
     value=DEFAULT_REPO,
-    placeholder="https://github.com/<owner>/<repo>",
+    placeholder="https://github.com/<owner>/<repo>[/tree/<ref>/<path>]",
+)
+
+mode = st.radio(
+    "Mode",
+    options=["fast", "balanced", "thorough"],
+    index=1,
+    horizontal=True,
+    help="fast: answer in seconds (no embeddings, smaller model) · thorough: widest retrieval, slowest",
 )
 
 col1, col2 = st.columns([1, 1])
@@ -22,46 +170,35 @@ with col2:
 
 if ping:
     try:
-        r = requests.get(f"{API_BASE_URL}/health", timeout=10)
+        r = http_session().get(f"{API_BASE_URL}/health", timeout=10)
         st.success(f"API OK: {r.status_code} {r.text}")
     except Exception as e:
         st.error(f"API not reachable: {e}")
 
 if run:
-    if not repo_url.strip():
+    url = repo_url.strip().rstrip("/")
+    if not url:
         st.warning("Please enter a GitHub repository URL.")
         st.stop()
 
-    with st.spinner("Summarizing…"):
-        try:
-            resp = requests.post(
-                f"{API_BASE_URL}/summarize",
-                json={"github_url": repo_url.strip()},
-                timeout=180,
-            )
-        except Exception as e:
-            st.error(f"Request failed: {e}")
-            st.stop()
-
-    if resp.status_code >= 400:
-        try:
-            err = resp.json()
-        except Exception:
-            err = {"status": "error", "message": resp.text}
-        st.error(f"Error {resp.status_code}: {err.get('message', resp.text)}")
+    with st.status("Summarizing…", expanded=False) as status:
+        data, err = run_job(url, mode, status)
+        if err:
+            status.update(label="Failed", state="error")
+        else:
+            status.update(label="Done", state="complete")
+    if err:
+        st.error(err)
         st.stop()
+    # the commit the API summarized (None when it runs without a GitHub token)
+    key = (url, (data.get("meta") or {}).get("commit"), mode)
+    result_cache().put(key, data)
 
-    data = resp.json()
-
-    st.subheader("Summary")
-    st.write(data.get("summary", ""))
-
-    st.subheader("Technologies")
-    tech = data.get("technologies", []) or []
-    st.write(", ".join(tech) if tech else "—")
+    st.session_state["show"] = key
 
-    st.subheader("Structure")
-    st.write(data.get("structure", ""))
-
-    with st.expander("Raw JSON"):
-        st.code(json.dumps(data, indent=2), language="json")
\ No newline at end of file
+shown = st.session_state.get("show")
+if shown:
+    data = result_cache().get(tuple(shown))
+    if data is not None:
+        url, commit, shown_mode = shown
+        render(data, caption=f"{url}" + (f" @ {commit[:7]}" if commit else "") + f" · {shown_mode} mode")